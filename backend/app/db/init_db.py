@@ -1,9 +1,30 @@
 from app.db.models.models import Model
 from app.db.models.providers import Provider
 from app.db.models.video_tasks import VideoTask
+from app.db.models.llm_usage import LLMUsage
+from sqlalchemy import inspect, text
+
 from app.db.engine import get_engine, Base
 
 def init_db():
     engine = get_engine()
 
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns(engine)
+
+
+def _add_missing_columns(engine):
+    """
+    create_all 不会给已有表补列，这里为旧数据库补上新增的可空列
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
\ No newline at end of file
@@ -0,0 +1,108 @@
+from typing import List, Optional
+
+from sqlalchemy import case, func
+
+from app.db.models.llm_usage import LLMUsage
+from app.db.engine import get_db
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 批量写入用量记录
+def insert_llm_usage(records: List[dict], kind: str, task_id: Optional[str] = None):
+    if not records:
+        return
+    db = next(get_db())
+    try:
+        for record in records:
+            db.add(LLMUsage(
+                task_id=task_id,
+                kind=kind,
+                provider_id=record.get("provider_id"),
+                model_name=record.get("model_name") or "",
+                prompt_tokens=record.get("prompt_tokens") or 0,
+                completion_tokens=record.get("completion_tokens") or 0,
+                cached_tokens=record.get("cached_tokens") or 0,
+                wall_time=record.get("wall_time") or 0,
+                payload_bytes=record.get("payload_bytes") or 0,
+                outcome=record.get("outcome", "ok"),
+                attempt=record.get("attempt") or 0,
+            ))
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to insert llm usage: {e}")
+    finally:
+        db.close()
+
+
+# 按供应商 / 模型汇总用量
+def get_usage_summary(provider_id: Optional[str] = None, model_name: Optional[str] = None) -> List[dict]:
+    db = next(get_db())
+    try:
+        query = db.query(
+            LLMUsage.provider_id,
+            LLMUsage.model_name,
+            func.count(LLMUsage.id),
+            func.sum(LLMUsage.prompt_tokens),
+            func.sum(LLMUsage.completion_tokens),
+            func.sum(LLMUsage.cached_tokens),
+            func.sum(LLMUsage.wall_time),
+            func.avg(LLMUsage.wall_time),
+            func.sum(LLMUsage.payload_bytes),
+            # 旧记录没有 outcome，视为成功
+            func.sum(case((func.coalesce(LLMUsage.outcome, "ok") != "ok", 1), else_=0)),
+        )
+        if provider_id:
+            query = query.filter(LLMUsage.provider_id == provider_id)
+        if model_name:
+            query = query.filter(LLMUsage.model_name == model_name)
+        rows = query.group_by(LLMUsage.provider_id, LLMUsage.model_name).all()
+        return [
+            {
+                "provider_id": row[0],
+                "model_name": row[1],
+                "calls": row[2],
+                "prompt_tokens": row[3] or 0,
+                "completion_tokens": row[4] or 0,
+                "cached_tokens": row[5] or 0,
+                "wall_time": round(row[6] or 0, 3),
+                "avg_wall_time": round(row[7] or 0, 3),
+                "payload_bytes": row[8] or 0,
+                "failed_calls": row[9] or 0,
+            }
+            for row in rows
+        ]
+    except Exception as e:
+        logger.error(f"Failed to get llm usage summary: {e}")
+        return []
+    finally:
+        db.close()
+
+
+# 查询某个任务的用量明细
+def get_usage_by_task(task_id: str) -> List[dict]:
+    db = next(get_db())
+    try:
+        rows = db.query(LLMUsage).filter_by(task_id=task_id).order_by(LLMUsage.id).all()
+        return [
+            {
+                "kind": row.kind,
+                "provider_id": row.provider_id,
+                "model_name": row.model_name,
+                "prompt_tokens": row.prompt_tokens,
+                "completion_tokens": row.completion_tokens,
+                "cached_tokens": row.cached_tokens,
+                "wall_time": row.wall_time,
+                "payload_bytes": row.payload_bytes,
+                "outcome": row.outcome or "ok",
+                "attempt": row.attempt or 0,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows
+        ]
+    except Exception as e:
+        logger.error(f"Failed to get llm usage by task: {e}")
+        return []
+    finally:
+        db.close()
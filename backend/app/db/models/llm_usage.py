@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, func
+
+from app.db.engine import Base
+
+
+class LLMUsage(Base):
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(String, nullable=True, index=True)
+    kind = Column(String, nullable=False)          # note / text_note / chat
+    provider_id = Column(String, nullable=True)
+    model_name = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    wall_time = Column(Float, default=0)           # 秒，含限流等待
+    payload_bytes = Column(Integer, default=0)
+    outcome = Column(String, nullable=True)        # ok / cancelled / 异常类名，每次重试单独一条
+    attempt = Column(Integer, nullable=True)       # 同一次调用内的第几次尝试，从 0 开始
+    created_at = Column(DateTime, server_default=func.now())
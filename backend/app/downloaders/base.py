@@ -38,6 +38,19 @@ class Downloader(ABC):
                        output_dir: Union[str, None] = None) -> str:
         pass
 
+    def audio_from_video(self, video_url: str, video_path: str, output_dir: str = None,
+                         copy: bool = True) -> Optional[AudioDownloadResult]:
+        '''
+        从已下载的本地视频中取出音轨，代替再次下载音频
+
+        :param video_url: 视频链接（用于获取标题、时长等元信息）
+        :param video_path: download_video 返回的本地视频路径
+        :param output_dir: 输出路径
+        :param copy: 是否允许输出 mp3 以外的容器，见 app.utils.audio_extract
+        :return: AudioDownloadResult 或 None（平台不支持或视频不含音轨时，调用方退回 download）
+        '''
+        return None
+
     def download_subtitles(self, video_url: str, output_dir: str = None,
                            langs: list = None) -> Optional[TranscriptResult]:
         '''
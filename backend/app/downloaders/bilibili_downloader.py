@@ -8,8 +8,12 @@ from pathlib import Path
 import yt_dlp
 
 from app.downloaders.base import Downloader, DownloadQuality, QUALITY_MAP
+from app.downloaders.info_cache import extract_info
+from app.downloaders.video_fetch import fetch_video, find_cached_video
 from app.models.notes_model import AudioDownloadResult
 from app.models.transcriber_model import TranscriptResult, TranscriptSegment
+from app.utils.audio_extract import extract_audio
+from app.utils.media_info import get_duration
 from app.utils.path_helper import get_data_dir
 from app.utils.url_parser import extract_video_id
 
@@ -23,6 +27,24 @@ class BilibiliDownloader(Downloader, ABC):
     def __init__(self):
         super().__init__()
 
+    @staticmethod
+    def _cookie_opts(warn: bool = False) -> dict:
+        """
+        B站 cookies 参数。音频、视频、字幕统一带上同一份 cookies，才能共用一次元信息提取
+        """
+        cookies_path = Path(BILIBILI_COOKIES_FILE)
+        if not cookies_path.is_absolute():
+            # 相对于 backend 目录
+            cookies_path = Path(__file__).parent.parent.parent / BILIBILI_COOKIES_FILE
+
+        if cookies_path.exists():
+            if warn:
+                logger.info(f"使用 cookies 文件: {cookies_path}")
+            return {'cookiefile': str(cookies_path)}
+        if warn:
+            logger.warning(f"B站 cookies 文件不存在: {cookies_path}，字幕获取可能失败")
+        return {}
+
     def download(
         self,
         video_url: str,
@@ -50,15 +72,15 @@ class BilibiliDownloader(Downloader, ABC):
             ],
             'noplaylist': True,
             'quiet': False,
+            **self._cookie_opts(),
         }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=True)
-            video_id = info.get("id")
-            title = info.get("title")
-            duration = info.get("duration", 0)
-            cover_url = info.get("thumbnail")
-            audio_path = os.path.join(output_dir, f"{video_id}.mp3")
+        info = extract_info(video_url, ydl_opts, download=True)
+        video_id = info.get("id")
+        title = info.get("title")
+        duration = info.get("duration", 0)
+        cover_url = info.get("thumbnail")
+        audio_path = os.path.join(output_dir, f"{video_id}.mp3")
 
         return AudioDownloadResult(
             file_path=audio_path,
@@ -77,7 +99,7 @@ class BilibiliDownloader(Downloader, ABC):
         output_dir: Union[str, None] = None,
     ) -> str:
         """
-        下载视频，返回视频文件路径
+        下载视频，返回视频文件路径（默认只下载 720p 以内的纯视频流，见 video_fetch）
         """
 
         if output_dir is None:
@@ -85,32 +107,39 @@ class BilibiliDownloader(Downloader, ABC):
         os.makedirs(output_dir, exist_ok=True)
         print("video_url",video_url)
         video_id=extract_video_id(video_url, "bilibili")
-        video_path = os.path.join(output_dir, f"{video_id}.mp4")
-        if os.path.exists(video_path):
-            return video_path
-
         # 检查是否已经存在
+        video_path = find_cached_video(output_dir, video_id)
+        if video_path:
+            return video_path
 
+        return fetch_video(video_url, output_dir, full_format='bv*[ext=mp4]/bestvideo+bestaudio/best',
+                           extra_opts=self._cookie_opts())
 
-        output_path = os.path.join(output_dir, "%(id)s.%(ext)s")
-
-        ydl_opts = {
-            'format': 'bv*[ext=mp4]/bestvideo+bestaudio/best',
-            'outtmpl': output_path,
-            'noplaylist': True,
-            'quiet': False,
-            'merge_output_format': 'mp4',  # 确保合并成 mp4
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=True)
-            video_id = info.get("id")
-            video_path = os.path.join(output_dir, f"{video_id}.mp4")
-
-        if not os.path.exists(video_path):
-            raise FileNotFoundError(f"视频文件未找到: {video_path}")
+    def audio_from_video(self, video_url: str, video_path: str, output_dir: str = None,
+                         copy: bool = True) -> Optional[AudioDownloadResult]:
+        """
+        从已下载的视频中取出音轨；元信息来自 info_cache，不再请求平台
+        """
+        if output_dir is None:
+            output_dir = get_data_dir()
+        if not output_dir:
+            output_dir = self.cache_data
+        info = extract_info(video_url, {'noplaylist': True, 'quiet': True, **self._cookie_opts()}, download=False)
+        video_id = info.get("id")
+        audio_path = extract_audio(video_path, output_dir, video_id, copy=copy)
+        if not audio_path:
+            return None
 
-        return video_path
+        return AudioDownloadResult(
+            file_path=audio_path,
+            title=info.get("title"),
+            duration=info.get("duration") or get_duration(audio_path),
+            cover_url=info.get("thumbnail"),
+            platform="bilibili",
+            video_id=video_id,
+            raw_info=info,
+            video_path=video_path
+        )
 
     def delete_video(self, video_path: str) -> str:
         """
@@ -151,70 +180,59 @@ class BilibiliDownloader(Downloader, ABC):
             'skip_download': True,
             'outtmpl': os.path.join(output_dir, f'{video_id}.%(ext)s'),
             'quiet': True,
+            # 添加 cookies 支持
+            **self._cookie_opts(warn=True),
         }
 
-        # 添加 cookies 支持
-        cookies_path = Path(BILIBILI_COOKIES_FILE)
-        if not cookies_path.is_absolute():
-            # 相对于 backend 目录
-            cookies_path = Path(__file__).parent.parent.parent / BILIBILI_COOKIES_FILE
+        try:
+            info = extract_info(video_url, ydl_opts, download=True)
 
-        if cookies_path.exists():
-            ydl_opts['cookiefile'] = str(cookies_path)
-            logger.info(f"使用 cookies 文件: {cookies_path}")
-        else:
-            logger.warning(f"B站 cookies 文件不存在: {cookies_path}，字幕获取可能失败")
+            # 查找下载的字幕文件
+            subtitles = info.get('requested_subtitles') or {}
+            if not subtitles:
+                logger.info(f"B站视频 {video_id} 没有可用字幕")
+                return None
 
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=True)
-
-                # 查找下载的字幕文件
-                subtitles = info.get('requested_subtitles') or {}
-                if not subtitles:
-                    logger.info(f"B站视频 {video_id} 没有可用字幕")
-                    return None
-
-                # 按优先级查找字幕
-                detected_lang = None
-                sub_info = None
-                for lang in langs:
-                    if lang in subtitles:
+            # 按优先级查找字幕
+            detected_lang = None
+            sub_info = None
+            for lang in langs:
+                if lang in subtitles:
+                    detected_lang = lang
+                    sub_info = subtitles[lang]
+                    break
+
+            # 如果按优先级没找到，取第一个可用的（排除弹幕）
+            if not detected_lang:
+                for lang, info_item in subtitles.items():
+                    if lang != 'danmaku':  # 排除弹幕
                         detected_lang = lang
-                        sub_info = subtitles[lang]
+                        sub_info = info_item
                         break
 
-                # 如果按优先级没找到，取第一个可用的（排除弹幕）
-                if not detected_lang:
-                    for lang, info_item in subtitles.items():
-                        if lang != 'danmaku':  # 排除弹幕
-                            detected_lang = lang
-                            sub_info = info_item
-                            break
-
-                if not sub_info:
-                    logger.info(f"B站视频 {video_id} 没有可用字幕（排除弹幕）")
-                    return None
-
-                # 检查是否有内嵌数据（yt-dlp 有时直接返回字幕内容）
-                if 'data' in sub_info and sub_info['data']:
-                    logger.info(f"直接从返回数据解析字幕: {detected_lang}")
-                    return self._parse_srt_content(sub_info['data'], detected_lang)
-
-                # 查找字幕文件
-                ext = sub_info.get('ext', 'srt')
-                subtitle_file = os.path.join(output_dir, f"{video_id}.{detected_lang}.{ext}")
-
-                if not os.path.exists(subtitle_file):
-                    logger.info(f"字幕文件不存在: {subtitle_file}")
-                    return None
-
-                # 根据格式解析字幕文件
-                if ext == 'json3':
-                    return self._parse_json3_subtitle(subtitle_file, detected_lang)
-                else:
-                    with open(subtitle_file, 'r', encoding='utf-8') as f:
-                        return self._parse_srt_content(f.read(), detected_lang)
+            if not sub_info:
+                logger.info(f"B站视频 {video_id} 没有可用字幕（排除弹幕）")
+                return None
+
+            # 检查是否有内嵌数据（yt-dlp 有时直接返回字幕内容）
+            if 'data' in sub_info and sub_info['data']:
+                logger.info(f"直接从返回数据解析字幕: {detected_lang}")
+                return self._parse_srt_content(sub_info['data'], detected_lang)
+
+            # 查找字幕文件
+            ext = sub_info.get('ext', 'srt')
+            subtitle_file = os.path.join(output_dir, f"{video_id}.{detected_lang}.{ext}")
+
+            if not os.path.exists(subtitle_file):
+                logger.info(f"字幕文件不存在: {subtitle_file}")
+                return None
+
+            # 根据格式解析字幕文件
+            if ext == 'json3':
+                return self._parse_json3_subtitle(subtitle_file, detected_lang)
+            else:
+                with open(subtitle_file, 'r', encoding='utf-8') as f:
+                    return self._parse_srt_content(f.read(), detected_lang)
 
         except Exception as e:
             logger.warning(f"获取B站字幕失败: {e}")
@@ -0,0 +1,104 @@
+"""
+info_cache.py — yt-dlp 元信息缓存
+
+同一任务里下载音频、下载视频、获取字幕各自调用一次 extract_info，每次都要重新请求
+平台接口、解析全部格式。这里把未处理的提取结果（extract_info(process=False)）按
+(链接, cookies, 代理) 缓存一小段时间，后续调用只需用各自的参数 process_ie_result，
+完成选流、下载与字幕写出，不再重复请求平台。
+提取时总是打开字幕选项：yt-dlp 只在 writesubtitles / writeautomaticsub 为真时才提取字幕
+列表，若缓存来自下载音视频的调用，之后的字幕调用会拿到空字幕。是否写出字幕仍由各调用的
+参数决定。
+可通过环境变量配置：
+- YTDLP_INFO_TTL：缓存有效期，秒（默认 300；平台返回的媒体地址有时效，不宜过长）
+"""
+import copy
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+import yt_dlp
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_cache: Dict[Tuple, Tuple[float, dict]] = {}
+_lock = threading.Lock()
+# 同一链接并发提取时只让一个线程真正请求平台
+_key_locks: Dict[Tuple, threading.Lock] = {}
+
+# 提取元信息时固定打开的参数，保证缓存结果里带有字幕与自动字幕列表
+_EXTRACT_OPTS = {
+    "writesubtitles": True,
+    "writeautomaticsub": True,
+}
+
+
+def _ttl() -> float:
+    return float(os.getenv("YTDLP_INFO_TTL", 300))
+
+
+def _cache_key(video_url: str, ydl_opts: dict) -> Tuple:
+    return video_url, ydl_opts.get("cookiefile"), ydl_opts.get("proxy")
+
+
+def _get_raw_info(ydl_opts: dict, video_url: str, key: Tuple) -> Tuple[dict, bool]:
+    """
+    :return: (未处理的提取结果, 是否来自缓存)
+    """
+    now = time.time()
+    with _lock:
+        # 顺手清理过期条目
+        for stale in [k for k, (fetched_at, _) in _cache.items() if now - fetched_at > _ttl()]:
+            _cache.pop(stale, None)
+            _key_locks.pop(stale, None)
+        entry = _cache.get(key)
+        if entry is not None:
+            return entry[1], True
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _lock:
+            entry = _cache.get(key)
+        if entry is not None:
+            return entry[1], True
+        with yt_dlp.YoutubeDL({**ydl_opts, **_EXTRACT_OPTS}) as extractor:
+            raw = extractor.extract_info(video_url, download=False, process=False)
+        with _lock:
+            _cache[key] = (time.time(), raw)
+        return raw, False
+
+
+def extract_info(video_url: str, ydl_opts: dict, download: bool = True) -> dict:
+    """
+    与 YoutubeDL(ydl_opts).extract_info(video_url, download) 等价，但元信息只提取一次
+
+    :param video_url: 视频链接
+    :param ydl_opts: 本次调用的 yt-dlp 参数（格式、输出模板、字幕等）
+    :param download: 是否下载
+    :return: 处理后的 info 字典
+    """
+    key = _cache_key(video_url, ydl_opts)
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        raw, cached = _get_raw_info(ydl_opts, video_url, key)
+        try:
+            # process_ie_result 会改写传入的字典，每次使用副本
+            return ydl.process_ie_result(copy.deepcopy(raw), download=download)
+        except yt_dlp.utils.DownloadError as e:
+            if not cached:
+                raise
+            # 缓存中的媒体地址可能已过期，重新提取一次
+            logger.warning(f"使用缓存的元信息下载失败，重新提取：{e}")
+            invalidate(video_url)
+            raw, _ = _get_raw_info(ydl_opts, video_url, key)
+            return ydl.process_ie_result(copy.deepcopy(raw), download=download)
+
+
+def invalidate(video_url: str) -> None:
+    """
+    媒体地址失效（如 403）时清除该链接的缓存
+    """
+    with _lock:
+        for key in [k for k in _cache if k[0] == video_url]:
+            _cache.pop(key, None)
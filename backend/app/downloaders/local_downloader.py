@@ -9,8 +9,12 @@ from app.models.audio_model import AudioDownloadResult
 import os
 import subprocess
 
+from app.utils.logger import get_logger
+from app.utils.media_info import get_duration
 from app.utils.video_helper import save_cover_to_static
 
+logger = get_logger(__name__)
+
 
 class LocalDownloader(Downloader, ABC):
     def __init__(self):
@@ -97,6 +101,17 @@ class LocalDownloader(Downloader, ABC):
         if not os.path.exists(video_url):
             raise FileNotFoundError()
         return video_url
+    @staticmethod
+    def probe_duration(path: str) -> float:
+        """
+        读取本地媒体时长（走媒体信息缓存），失败时返回 0
+        """
+        try:
+            return get_duration(path)
+        except Exception as e:
+            logger.warning(f"读取媒体时长失败: {path}，{e}")
+            return 0
+
     def download(
             self,
             video_url: str,
@@ -129,7 +144,7 @@ class LocalDownloader(Downloader, ABC):
             return AudioDownloadResult(
                 file_path=video_url,
                 title=title,
-                duration=0,
+                duration=self.probe_duration(video_url),
                 cover_url="",
                 platform="local",
                 video_id=title,
@@ -147,7 +162,7 @@ class LocalDownloader(Downloader, ABC):
             return AudioDownloadResult(
                 file_path=file_path,
                 title=title,
-                duration=0,
+                duration=self.probe_duration(video_url),
                 cover_url=cover_url,
                 platform="local",
                 video_id=title,
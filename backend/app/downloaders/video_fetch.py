@@ -0,0 +1,95 @@
+"""
+video_fetch.py — 截图 / 视频理解用的视频下载
+
+截图和视频理解只需要若干 1280x720 以内的画面，不需要原画质，也不需要音轨。
+低清模式下只下载不高于 VIDEO_MAX_HEIGHT 的纯视频流（同分辨率取体积最小的），不合并音频；
+没有纯视频流的站点退回到满足分辨率的音视频合一流。
+可通过环境变量配置：
+- VIDEO_FETCH_MODE：lowres（默认）或 full（原画质音视频合并，旧行为）
+- VIDEO_MAX_HEIGHT：低清模式的目标高度（默认 720）
+"""
+import glob
+import os
+from typing import Optional
+
+import yt_dlp
+
+from app.downloaders.info_cache import extract_info
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def lowres_enabled() -> bool:
+    return os.getenv("VIDEO_FETCH_MODE", "lowres").lower() != "full"
+
+
+def max_height() -> int:
+    return int(os.getenv("VIDEO_MAX_HEIGHT", 720))
+
+
+def lowres_format_opts(height: int) -> dict:
+    """
+    yt-dlp 选流参数：优先纯视频流，按“不高于目标分辨率中最清晰、同分辨率体积最小”排序
+    """
+    return {
+        "format": "bv*/b",
+        "format_sort": [f"res:{height}", "+size", "+br", "ext:mp4:m4a"],
+    }
+
+
+def find_cached_video(output_dir: str, video_id: str) -> Optional[str]:
+    """
+    查找已下载的视频：原画质文件或任意分辨率的低清文件都可直接复用
+    """
+    full_path = os.path.join(output_dir, f"{video_id}.mp4")
+    if os.path.exists(full_path):
+        return full_path
+    if lowres_enabled():
+        matches = sorted(glob.glob(os.path.join(glob.escape(output_dir), f"{glob.escape(video_id)}_{max_height()}p.*")))
+        matches = [m for m in matches if not m.endswith((".part", ".ytdl"))]
+        if matches:
+            return matches[0]
+    return None
+
+
+def fetch_video(video_url: str, output_dir: str, full_format: str, extra_opts: Optional[dict] = None) -> str:
+    """
+    下载视频并返回本地路径
+
+    :param video_url: 视频链接
+    :param output_dir: 输出目录
+    :param full_format: full 模式下使用的 yt-dlp format（各平台原有的音视频合并格式）
+    :param extra_opts: 平台相关的额外参数（代理、cookies 等）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ydl_opts = {
+        "noplaylist": True,
+        "quiet": False,
+        **(extra_opts or {}),
+    }
+    if lowres_enabled():
+        height = max_height()
+        ydl_opts.update(lowres_format_opts(height))
+        ydl_opts["outtmpl"] = os.path.join(output_dir, f"%(id)s_{height}p.%(ext)s")
+    else:
+        ydl_opts.update({
+            "format": full_format,
+            "outtmpl": os.path.join(output_dir, "%(id)s.%(ext)s"),
+            "merge_output_format": "mp4",
+        })
+
+    info = extract_info(video_url, ydl_opts, download=True)
+    downloads = info.get("requested_downloads") or []
+    video_path = downloads[0].get("filepath") if downloads else None
+    if not video_path:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            video_path = ydl.prepare_filename(info)
+
+    if not video_path or not os.path.exists(video_path):
+        raise FileNotFoundError(f"视频文件未找到: {video_path}")
+    logger.info(
+        f"视频下载完成：{video_path}（{info.get('format_id')}，{info.get('width')}x{info.get('height')}，"
+        f"{os.path.getsize(video_path) / 1024 / 1024:.1f}MB）"
+    )
+    return video_path
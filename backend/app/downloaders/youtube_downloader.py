@@ -7,8 +7,12 @@ from typing import Union, Optional, List
 import yt_dlp
 
 from app.downloaders.base import Downloader, DownloadQuality
+from app.downloaders.info_cache import extract_info
+from app.downloaders.video_fetch import fetch_video, find_cached_video
 from app.models.notes_model import AudioDownloadResult
 from app.models.transcriber_model import TranscriptResult, TranscriptSegment
+from app.utils.audio_extract import extract_audio
+from app.utils.media_info import get_duration
 from app.utils.path_helper import get_data_dir
 from app.utils.url_parser import extract_video_id
 
@@ -57,14 +61,13 @@ class YoutubeDownloader(Downloader, ABC):
             logger.info(f"YouTube 下载使用代理: {proxy}")
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=True)
-                video_id = info.get("id")
-                title = info.get("title")
-                duration = info.get("duration", 0)
-                cover_url = info.get("thumbnail")
-                ext = "mp3"
-                audio_path = os.path.join(output_dir, f"{video_id}.{ext}")
+            info = extract_info(video_url, ydl_opts, download=True)
+            video_id = info.get("id")
+            title = info.get("title")
+            duration = info.get("duration", 0)
+            cover_url = info.get("thumbnail")
+            ext = "mp3"
+            audio_path = os.path.join(output_dir, f"{video_id}.{ext}")
         except yt_dlp.utils.DownloadError as e:
             err_msg = str(e)
             if "403" in err_msg or "format is not available" in err_msg.lower():
@@ -102,37 +105,55 @@ class YoutubeDownloader(Downloader, ABC):
         output_dir: Union[str, None] = None,
     ) -> str:
         """
-        下载视频，返回视频文件路径
+        下载视频，返回视频文件路径（默认只下载 720p 以内的纯视频流，见 video_fetch）
         """
         if output_dir is None:
             output_dir = get_data_dir()
         video_id = extract_video_id(video_url, "youtube")
-        video_path = os.path.join(output_dir, f"{video_id}.mp4")
-        if os.path.exists(video_path):
+        video_path = find_cached_video(output_dir, video_id)
+        if video_path:
             return video_path
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, "%(id)s.%(ext)s")
 
-        ydl_opts = {
-            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-            'outtmpl': output_path,
-            'noplaylist': True,
-            'quiet': False,
-            'merge_output_format': 'mp4',
-        }
+        extra_opts = {}
         proxy = self._get_proxy()
         if proxy:
-            ydl_opts['proxy'] = proxy
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=True)
-            video_id = info.get("id")
-            video_path = os.path.join(output_dir, f"{video_id}.mp4")
+            extra_opts['proxy'] = proxy
+        return fetch_video(
+            video_url,
+            output_dir,
+            full_format='bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+            extra_opts=extra_opts,
+        )
 
-        if not os.path.exists(video_path):
-            raise FileNotFoundError(f"视频文件未找到: {video_path}")
+    def audio_from_video(self, video_url: str, video_path: str, output_dir: str = None,
+                         copy: bool = True) -> Optional[AudioDownloadResult]:
+        """
+        从已下载的视频中取出音轨；元信息来自 info_cache，不再请求平台
+        """
+        if output_dir is None:
+            output_dir = get_data_dir()
+        if not output_dir:
+            output_dir = self.cache_data
+        ydl_opts = {'noplaylist': True, 'quiet': True}
+        proxy = self._get_proxy()
+        if proxy:
+            ydl_opts['proxy'] = proxy
+        info = extract_info(video_url, ydl_opts, download=False)
+        video_id = info.get("id")
+        audio_path = extract_audio(video_path, output_dir, video_id, copy=copy)
+        if not audio_path:
+            return None
 
-        return video_path
+        return AudioDownloadResult(
+            file_path=audio_path,
+            title=info.get("title"),
+            duration=info.get("duration") or get_duration(audio_path),
+            cover_url=info.get("thumbnail"),
+            platform="youtube",
+            video_id=video_id,
+            raw_info={'tags': info.get('tags')},
+            video_path=video_path
+        )
 
     def download_subtitles(self, video_url: str, output_dir: str = None,
                            langs: List[str] = None) -> Optional[TranscriptResult]:
@@ -169,37 +190,36 @@ class YoutubeDownloader(Downloader, ABC):
             ydl_opts['proxy'] = proxy
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=True)
-
-                # 查找下载的字幕文件
-                subtitles = info.get('requested_subtitles') or {}
-                if not subtitles:
-                    logger.info(f"YouTube视频 {video_id} 没有可用字幕")
-                    return None
-
-                # 按优先级查找字幕文件
-                subtitle_file = None
-                detected_lang = None
-                for lang in langs:
-                    if lang in subtitles:
-                        subtitle_file = os.path.join(output_dir, f"{video_id}.{lang}.json3")
-                        detected_lang = lang
-                        break
-
-                # 如果按优先级没找到，取第一个可用的
-                if not subtitle_file:
-                    for lang, sub_info in subtitles.items():
-                        subtitle_file = os.path.join(output_dir, f"{video_id}.{lang}.json3")
-                        detected_lang = lang
-                        break
-
-                if not subtitle_file or not os.path.exists(subtitle_file):
-                    logger.info(f"字幕文件不存在: {subtitle_file}")
-                    return None
-
-                # 解析字幕文件
-                return self._parse_json3_subtitle(subtitle_file, detected_lang)
+            info = extract_info(video_url, ydl_opts, download=True)
+
+            # 查找下载的字幕文件
+            subtitles = info.get('requested_subtitles') or {}
+            if not subtitles:
+                logger.info(f"YouTube视频 {video_id} 没有可用字幕")
+                return None
+
+            # 按优先级查找字幕文件
+            subtitle_file = None
+            detected_lang = None
+            for lang in langs:
+                if lang in subtitles:
+                    subtitle_file = os.path.join(output_dir, f"{video_id}.{lang}.json3")
+                    detected_lang = lang
+                    break
+
+            # 如果按优先级没找到，取第一个可用的
+            if not subtitle_file:
+                for lang, sub_info in subtitles.items():
+                    subtitle_file = os.path.join(output_dir, f"{video_id}.{lang}.json3")
+                    detected_lang = lang
+                    break
+
+            if not subtitle_file or not os.path.exists(subtitle_file):
+                logger.info(f"字幕文件不存在: {subtitle_file}")
+                return None
+
+            # 解析字幕文件
+            return self._parse_json3_subtitle(subtitle_file, detected_lang)
 
         except Exception as e:
             logger.warning(f"获取YouTube字幕失败: {e}")
@@ -11,6 +11,22 @@ class GPT(ABC):
         :return:
         '''
         pass
+    async def asummarize(self, source:GPTSource )->str:
+        '''
+        summarize 的异步版本，等待 LLM 响应时不占用线程
+        :param source:
+        :return:
+        '''
+        pass
+    def chat(self, messages:list, **kwargs)->str:
+        pass
+    async def achat(self, messages:list, **kwargs)->str:
+        pass
+    async def astream_chat(self, messages:list, **kwargs):
+        '''
+        流式对话，逐段 yield 文本增量；默认实现一次性返回完整回复
+        '''
+        yield await self.achat(messages, **kwargs)
     def create_messages(self, segments:list,**kwargs)->list:
         pass
     def list_models(self):
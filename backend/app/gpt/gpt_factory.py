@@ -1,6 +1,7 @@
 from openai import OpenAI
 
 from app.gpt.base import GPT
+from app.gpt.rate_limiter import get_limiter
 from app.gpt.provider.OpenAI_compatible_provider import OpenAICompatibleProvider
 from app.gpt.universal_gpt import UniversalGPT
 from app.models.model_config import ModelConfig
@@ -9,5 +10,19 @@ from app.models.model_config import ModelConfig
 class GPTFactory:
     @staticmethod
     def from_config(config: ModelConfig) -> GPT:
-        client = OpenAICompatibleProvider(api_key=config.api_key, base_url=config.base_url).get_client
-        return UniversalGPT(client=client, model=config.model_name)
\ No newline at end of file
+        provider = OpenAICompatibleProvider(api_key=config.api_key, base_url=config.base_url)
+        limiter = None
+        if config.provider_id:
+            limiter = get_limiter(
+                config.provider_id,
+                rpm=config.rpm,
+                tpm=config.tpm,
+                max_concurrency=config.max_concurrency,
+            )
+        return UniversalGPT(
+            client=provider.get_client,
+            model=config.model_name,
+            async_client_factory=lambda: provider.get_async_client,
+            limiter=limiter,
+            provider_id=config.provider_id,
+        )
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+llm_router.py — 多供应商故障转移与延迟感知路由
+
+- LatencyTracker：按 (provider_id, model) 记录最近 N 次调用的耗时与成败，给出 p50 / p95 / 错误率；
+  latency_tracker 记录完整调用耗时，ttft_tracker 记录流式调用的首 token 延迟
+- RoutedGPT：主供应商 + 有序备用列表，调用失败时自动切换到下一个；单个供应商内只做少量重试
+  （LLM_ROUTED_MAX_RETRIES），不等退避重试耗尽再切换；
+  开启对冲（hedge）后，当前请求超过阈值仍未返回时并发发起下一个，先成功者胜出，其余取消
+"""
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.gpt import rate_limiter
+from app.gpt.base import GPT
+from app.models.gpt_model import GPTSource
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 滚动窗口大小
+_WINDOW = 100
+# 错误率超过该值（且样本足够）时，将目标降级到列表末尾
+_UNHEALTHY_ERROR_RATE = 0.5
+_MIN_SAMPLES = 5
+
+
+class LatencyTracker:
+    def __init__(self, window: int = _WINDOW):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider_id: str, model: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            samples = self._samples.setdefault((provider_id, model), deque(maxlen=self.window))
+            samples.append((latency, ok))
+
+    def stats(self, provider_id: str, model: str) -> Optional[dict]:
+        with self._lock:
+            samples = list(self._samples.get((provider_id, model), []))
+        if not samples:
+            return None
+        latencies = sorted(latency for latency, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "provider_id": provider_id,
+            "model": model,
+            "count": len(samples),
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "error_rate": round(errors / len(samples), 4),
+        }
+
+    def all_stats(self) -> List[dict]:
+        with self._lock:
+            keys = list(self._samples.keys())
+        return [self.stats(provider_id, model) for provider_id, model in keys]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return round(values[index], 3)
+
+
+latency_tracker = LatencyTracker()
+# 流式调用的首 token 延迟（time-to-first-token）
+ttft_tracker = LatencyTracker()
+
+
+@dataclass
+class RouteTarget:
+    provider_id: str
+    model_name: str
+    gpt: GPT
+
+    @property
+    def info(self) -> dict:
+        return {"provider_id": self.provider_id, "model_name": self.model_name}
+
+
+class RoutedGPT(GPT):
+    """
+    按路由策略在多个 GPT 实例之间切换的 GPT，对外接口与 UniversalGPT 一致
+    """
+
+    def __init__(self, targets: List[RouteTarget], hedge_after: Optional[float] = None):
+        """
+        :param targets: 主供应商在前、备用供应商按顺序在后
+        :param hedge_after: 对冲阈值（秒）；None 或负数关闭对冲，0 表示使用当前目标的历史 p95
+        """
+        if not targets:
+            raise ValueError("路由目标不能为空")
+        self.targets = targets
+        self.hedge_after = hedge_after
+        self.served_by: Optional[dict] = None
+        # 重试与切换由路由负责，各供应商内部只保留很短的重试预算
+        for target in targets:
+            if hasattr(target.gpt, "max_retries"):
+                target.gpt.max_retries = rate_limiter.routed_max_retries()
+
+    @property
+    def model(self) -> str:
+        return self.targets[0].model_name
+
+    @property
+    def usage_log(self) -> List[dict]:
+        return [record for target in self.targets for record in getattr(target.gpt, "usage_log", [])]
+
+    def _ordered_targets(self) -> List[RouteTarget]:
+        healthy, unhealthy = [], []
+        for target in self.targets:
+            stats = latency_tracker.stats(target.provider_id, target.model_name)
+            if stats and stats["count"] >= _MIN_SAMPLES and stats["error_rate"] >= _UNHEALTHY_ERROR_RATE:
+                unhealthy.append(target)
+            else:
+                healthy.append(target)
+        if unhealthy:
+            logger.info(f"降级不健康的供应商：{[t.info for t in unhealthy]}")
+        return healthy + unhealthy
+
+    def _hedge_delay(self, target: RouteTarget) -> Optional[float]:
+        if self.hedge_after is None or self.hedge_after < 0:
+            return None
+        if self.hedge_after > 0:
+            return self.hedge_after
+        stats = latency_tracker.stats(target.provider_id, target.model_name)
+        return stats["p95"] if stats and stats["p95"] else None
+
+    async def _aroute(self, call: Callable):
+        targets = self._ordered_targets()
+        tasks: Dict[asyncio.Task, RouteTarget] = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+
+        def launch() -> RouteTarget:
+            nonlocal next_index
+            target = targets[next_index]
+            next_index += 1
+            tasks[asyncio.create_task(call(target.gpt))] = target
+            return target
+
+        current = launch()
+        try:
+            while tasks:
+                timeout = self._hedge_delay(current) if next_index < len(targets) else None
+                done, _ = await asyncio.wait(tasks.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"{current.info} 超过 {timeout:.1f}s 未返回，对冲请求下一个供应商")
+                    current = launch()
+                    continue
+                for task in done:
+                    target = tasks.pop(task)
+                    if task.exception() is None:
+                        self.served_by = target.info
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"供应商 {target.info} 调用失败：{last_error}")
+                if not tasks and next_index < len(targets):
+                    current = launch()
+                    logger.info(f"故障转移到 {current.info}")
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise last_error
+
+    def _route(self, call: Callable):
+        last_error: Optional[Exception] = None
+        for target in self._ordered_targets():
+            try:
+                result = call(target.gpt)
+                self.served_by = target.info
+                return result
+            except Exception as e:
+                last_error = e
+                logger.warning(f"供应商 {target.info} 调用失败，尝试下一个：{e}")
+        raise last_error
+
+    def summarize(self, source: GPTSource) -> str:
+        return self._route(lambda gpt: gpt.summarize(source))
+
+    async def asummarize(self, source: GPTSource) -> str:
+        return await self._aroute(lambda gpt: gpt.asummarize(source))
+
+    def chat(self, messages: list, **kwargs) -> str:
+        return self._route(lambda gpt: gpt.chat(messages, **kwargs))
+
+    async def achat(self, messages: list, **kwargs) -> str:
+        return await self._aroute(lambda gpt: gpt.achat(messages, **kwargs))
+
+    def list_models(self):
+        return self.targets[0].gpt.list_models()
@@ -1,4 +1,6 @@
-from app.gpt.prompt import BASE_PROMPT
+import os
+
+from app.gpt.prompt import BASE_PROMPT, CONSOLIDATE_PROMPT, SYSTEM_PROMPT, USER_PROMPT
 
 note_formats = [
     {'label': '目录', 'value': 'toc'},
@@ -30,18 +32,57 @@ def generate_base_prompt(title, segment_text, tags, _format=None, style=None, ex
         tags=tags
     )
 
+    return prompt + build_instructions(_format, style, extras)
+
+
+def build_instructions(_format=None, style=None, extras=None) -> str:
+    instructions = ""
     # 添加用户选择的格式
     if _format:
-        prompt += "\n" + "\n".join([get_format_function(f) for f in _format])
+        instructions += "\n" + "\n".join([get_format_function(f) for f in _format])
 
     # 根据用户选择的笔记风格添加描述
     if style:
-        prompt += "\n" + get_style_format(style)
+        instructions += "\n" + get_style_format(style)
 
     # 添加额外内容
     if extras:
-        prompt += f"\n{extras}"
-    return prompt
+        instructions += f"\n{extras}"
+    return instructions
+
+
+def use_prefix_layout() -> bool:
+    """
+    PROMPT_LAYOUT=prefix（默认）：静态指令在前的缓存友好布局；legacy：沿用 BASE_PROMPT 单条消息
+    """
+    return os.getenv("PROMPT_LAYOUT", "prefix").lower() != "legacy"
+
+
+def generate_prefix_prompt(title, segment_text, tags, _format=None, style=None, extras=None, summary_level=None):
+    """
+    生成前缀缓存友好的提示词，返回 (system, user)：
+    system 只包含规则、格式、风格、额外要求等静态指令，同样的选项在不同任务间逐字节一致；
+    user 放视频标题、标签与转写，变化的内容全部位于末尾；总结程度按任务而定，也放在 user 中
+    """
+    system = SYSTEM_PROMPT + build_instructions(_format, style, extras)
+    user = USER_PROMPT.format(video_title=title, segment_text=segment_text, tags=tags)
+    level = get_summary_level_format(summary_level)
+    if level:
+        user += f"\n{level}\n"
+    return system, user
+
+
+def generate_consolidate_messages(title, drafts, _format=None, style=None, extras=None) -> list:
+    """
+    生成渐进式笔记最终整合的消息：drafts 为 [(起始时间文本, 草稿 Markdown), ...]
+    """
+    system = CONSOLIDATE_PROMPT + build_instructions(_format, style, extras)
+    parts = [f"## 草稿 {i}（自 {start} 起）\n\n{draft}" for i, (start, draft) in enumerate(drafts, 1)]
+    user = f"视频标题：\n{title}\n\n" + "\n\n---\n\n".join(parts)
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
 
 
 # 获取格式函数
@@ -103,6 +144,15 @@ def get_style_format(style):
     return style_map.get(style, '')
 
 
+# 总结程度（仅前缀缓存布局使用，legacy 布局保持原有提示词不变）：medium 为默认程度，不额外追加要求
+def get_summary_level_format(summary_level):
+    level_map = {
+        'simple': '**总结程度**: 简要总结，只保留核心观点与结论，篇幅尽量精简。',
+        'detailed': '**总结程度**: 详尽总结，保留每个部分的细节、示例与论证过程。',
+    }
+    return level_map.get(summary_level, '')
+
+
 # 格式化输出内容
 def get_toc_format():
     return '''
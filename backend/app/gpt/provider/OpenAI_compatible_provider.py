@@ -1,23 +1,30 @@
 from typing import Optional, Union
 
-from openai import OpenAI
-
+from app.gpt.provider import client_cache
 from app.utils.logger import get_logger
 
 logging= get_logger(__name__)
 class OpenAICompatibleProvider:
     def __init__(self, api_key: str, base_url: str, model: Union[str, None]=None):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        # 复用进程级共享客户端（连接池 keep-alive）
+        self.client = client_cache.get_client(api_key=api_key, base_url=base_url)
+        self.api_key = api_key
+        self.base_url = base_url
         self.model = model
 
     @property
     def get_client(self):
         return self.client
 
+    @property
+    def get_async_client(self):
+        # AsyncOpenAI 绑定事件循环，只能在协程内按需获取
+        return client_cache.get_async_client(api_key=self.api_key, base_url=self.base_url)
+
     @staticmethod
     def test_connection(api_key: str, base_url: str) -> bool:
         try:
-            client = OpenAI(api_key=api_key, base_url=base_url)
+            client = client_cache.get_client(api_key=api_key, base_url=base_url)
             model = client.models.list()
             # for segment in model:
             #     print(segment)
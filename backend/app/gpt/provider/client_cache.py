@@ -0,0 +1,158 @@
+"""
+client_cache.py — 进程级 OpenAI 客户端缓存
+
+按 (base_url, api_key 哈希) 复用 OpenAI / AsyncOpenAI 客户端及其 httpx 连接池，
+避免每个任务 / 每条对话消息都重新建立 TLS 连接。
+连接池参数可通过环境变量配置：
+- LLM_MAX_CONNECTIONS：单个客户端最大连接数（默认 20）
+- LLM_MAX_KEEPALIVE：最大保活连接数（默认 10）
+- LLM_KEEPALIVE_EXPIRY：保活连接过期时间，秒（默认 60）
+- LLM_TIMEOUT：请求超时，秒（默认 600）
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_clients: Dict[Tuple[str, str], OpenAI] = {}
+# 异步客户端绑定创建时的事件循环，记录下来以便跨线程关闭
+_async_clients: Dict[Tuple[str, str], Tuple[AsyncOpenAI, asyncio.AbstractEventLoop]] = {}
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+    )
+
+
+def _timeout() -> float:
+    return float(os.getenv("LLM_TIMEOUT", 600))
+
+
+def _cache_key(api_key: Optional[str], base_url: Optional[str]) -> Tuple[str, str]:
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    return (base_url or "").rstrip("/"), key_hash
+
+
+def get_client(api_key: str, base_url: str) -> OpenAI:
+    """
+    获取（或创建）与凭据对应的共享 OpenAI 客户端
+    """
+    key = _cache_key(api_key, base_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+            # 重试由 rate_limiter 统一处理，关闭 SDK 内置重试
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            _clients[key] = client
+            logger.info(f"创建共享 LLM 客户端：{key[0]}")
+    return client
+
+
+def get_async_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """
+    获取（或创建）与凭据对应的共享 AsyncOpenAI 客户端，需在事件循环内调用
+    """
+    key = _cache_key(api_key, base_url)
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(key)
+    if entry is not None and entry[1] is loop:
+        return entry[0]
+
+    with _lock:
+        entry = _async_clients.get(key)
+        if entry is None or entry[1] is not loop:
+            http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            _async_clients[key] = (client, loop)
+            logger.info(f"创建共享异步 LLM 客户端：{key[0]}")
+            if entry is not None:
+                _close_async(*entry)
+            return client
+    return entry[0]
+
+
+def _close_async(client: AsyncOpenAI, loop: asyncio.AbstractEventLoop) -> None:
+    if loop.is_closed():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    try:
+        if running is loop:
+            loop.create_task(client.close())
+        else:
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+    except Exception as e:
+        logger.warning(f"关闭异步 LLM 客户端失败：{e}")
+
+
+def invalidate(api_key: Optional[str], base_url: Optional[str]) -> None:
+    """
+    移除并关闭某组凭据对应的客户端（供应商凭据变更或删除时调用）
+    """
+    key = _cache_key(api_key, base_url)
+    with _lock:
+        client = _clients.pop(key, None)
+        async_entry = _async_clients.pop(key, None)
+    if client is not None:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"关闭 LLM 客户端失败：{e}")
+    if async_entry is not None:
+        _close_async(*async_entry)
+    if client is not None or async_entry is not None:
+        logger.info(f"已移除共享 LLM 客户端：{key[0]}")
+
+
+def close_all() -> None:
+    """
+    关闭全部缓存的客户端（应用退出时调用）
+    """
+    with _lock:
+        clients = list(_clients.values())
+        async_entries = list(_async_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"关闭 LLM 客户端失败：{e}")
+    for entry in async_entries:
+        _close_async(*entry)
+
+
+async def aclose_all() -> None:
+    """
+    在事件循环内关闭全部缓存的客户端（供 lifespan 退出时调用）
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        async_entries = [entry for entry in _async_clients.values() if entry[1] is loop]
+        for key in [k for k, entry in _async_clients.items() if entry[1] is loop]:
+            _async_clients.pop(key)
+    for client, _ in async_entries:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"关闭异步 LLM 客户端失败：{e}")
+    close_all()
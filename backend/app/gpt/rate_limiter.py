@@ -0,0 +1,253 @@
+"""
+rate_limiter.py — 按供应商的 LLM 限流与重试
+
+- 令牌桶：每个供应商分别限制每分钟请求数（rpm）与每分钟 token 数（tpm）
+- 并发上限：每个供应商同时在途的请求数（max_concurrency），同步 / 异步调用共用；
+  排队的调用按先来后到等待，槽位释放时直接交给队首，不轮询
+- 重试：遇到 429 / 5xx / 连接错误时按带抖动的指数退避重试，优先遵守 Retry-After
+
+限流参数来自 Provider 表的 rpm / tpm / max_concurrency 字段，为空表示不限制；
+重试参数可通过环境变量配置：
+- LLM_MAX_RETRIES：最大重试次数（默认 4）
+- LLM_RETRY_BASE_DELAY：退避基数，秒（默认 1）
+- LLM_RETRY_MAX_DELAY：单次等待上限，秒（默认 60）
+- LLM_ROUTED_MAX_RETRIES：配置了备用供应商时单个供应商内的重试次数（默认 0，失败即切换）
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+import openai
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 单张图片的 token 估算值
+_IMAGE_TOKEN_ESTIMATE = 1000
+
+
+class TokenBucket:
+    """
+    每分钟补充 per_minute 个令牌的令牌桶，允许预占（余额为负时返回需要等待的时间）
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        # 单次请求超过桶容量时按容量计，避免永远等不到
+        self.tokens -= min(amount, self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _SlotWaiter:
+    """
+    排队等待并发槽位的调用；granted 表示槽位已由释放方直接转交
+    """
+
+    def __init__(self, wake: Callable[[], None]):
+        self.wake = wake
+        self.granted = False
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ProviderLimiter:
+    def __init__(self, provider_id: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        self.provider_id = provider_id
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._in_flight = 0
+        self._waiters: Deque[_SlotWaiter] = deque()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            wait = 0.0
+            if self._requests:
+                wait = max(wait, self._requests.reserve(1))
+            if self._tokens:
+                wait = max(wait, self._tokens.reserve(tokens))
+            return wait
+
+    def _try_acquire_slot(self) -> bool:
+        """
+        需持有 self._lock；有空闲槽位且无人排队时占用一个
+        """
+        if self.max_concurrency and (self._in_flight >= self.max_concurrency or self._waiters):
+            return False
+        self._in_flight += 1
+        return True
+
+    def _release_locked(self) -> None:
+        if self._waiters:
+            # 槽位直接转交给队首，在途数不变
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            waiter.wake()
+            return
+        self._in_flight = max(0, self._in_flight - 1)
+
+    def release(self) -> None:
+        with self._lock:
+            self._release_locked()
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """
+        用响应中的实际 token 数修正预估值
+        """
+        if not self._tokens or actual is None:
+            return
+        with self._lock:
+            self._tokens.adjust(actual - estimated)
+
+    def acquire(self, tokens: int, on_wait: Optional[Callable[[str], None]] = None) -> None:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            notify(on_wait, f"触发供应商限流，等待 {wait:.1f}s")
+            time.sleep(wait)
+        self._acquire_slot(on_wait)
+
+    def _acquire_slot(self, on_wait: Optional[Callable[[str], None]] = None) -> None:
+        """
+        占用一个并发槽位（不消耗 rpm / tpm 配额），满了则排队阻塞
+        """
+        with self._lock:
+            if self._try_acquire_slot():
+                return
+            granted = threading.Event()
+            self._waiters.append(_SlotWaiter(granted.set))
+        notify(on_wait, f"供应商并发已满（{self.max_concurrency}），排队等待中")
+        granted.wait()
+
+    async def aacquire(self, tokens: int, on_wait: Optional[Callable[[str], None]] = None) -> None:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            notify(on_wait, f"触发供应商限流，等待 {wait:.1f}s")
+            await asyncio.sleep(wait)
+        await self._aacquire_slot(on_wait)
+
+    async def _aacquire_slot(self, on_wait: Optional[Callable[[str], None]] = None) -> None:
+        """
+        _acquire_slot 的异步版本；等待期间被取消时交还已转交的槽位或退出队列
+        """
+        with self._lock:
+            if self._try_acquire_slot():
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiter = _SlotWaiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+            self._waiters.append(waiter)
+        notify(on_wait, f"供应商并发已满（{self.max_concurrency}），排队等待中")
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider_id: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                max_concurrency: Optional[int] = None) -> ProviderLimiter:
+    """
+    获取供应商对应的限流器，配置变化时重建
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider_id)
+        if limiter is None or (limiter.rpm, limiter.tpm, limiter.max_concurrency) != (rpm, tpm, max_concurrency):
+            limiter = ProviderLimiter(provider_id, rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+            _limiters[provider_id] = limiter
+        return limiter
+
+
+def estimate_tokens(messages: list) -> int:
+    """
+    粗略估算请求 token 数：中文约 1 字 1 token，英文约 4 字符 1 token，这里统一按 2 字符计
+    """
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images += 1
+    return chars // 2 + images * _IMAGE_TOKEN_ESTIMATE
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def retry_delay(attempt: int, exc: Exception) -> float:
+    """
+    计算第 attempt 次重试前的等待时间：优先 Retry-After，否则带抖动的指数退避
+    """
+    max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", 60))
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    base = float(os.getenv("LLM_RETRY_BASE_DELAY", 1))
+    delay = min(max_delay, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def max_retries() -> int:
+    return int(os.getenv("LLM_MAX_RETRIES", 4))
+
+
+def routed_max_retries() -> int:
+    return int(os.getenv("LLM_ROUTED_MAX_RETRIES", 0))
+
+
+def notify(on_wait: Optional[Callable[[str], None]], message: str) -> None:
+    logger.info(message)
+    if on_wait:
+        try:
+            on_wait(message)
+        except Exception as e:
+            logger.warning(f"限流进度回调失败：{e}")
@@ -0,0 +1,137 @@
+"""
+response_cache.py — 磁盘持久化的 LLM 响应缓存
+
+以 (messages, model, temperature, base_url) 的哈希为键缓存 LLM 回复，
+相同转写 / 风格 / 格式 / 模型的重复生成直接命中缓存，不再重复调用 LLM。
+支持 TTL 过期与按总大小的 LRU 淘汰，可通过环境变量配置：
+- LLM_CACHE_ENABLED：是否启用（默认 true）
+- LLM_CACHE_TTL：缓存有效期，秒（默认 7 天）
+- LLM_CACHE_MAX_BYTES：缓存总大小上限，字节（默认 200MB）
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.utils.logger import get_logger
+from app.utils.path_helper import get_app_dir
+
+logger = get_logger(__name__)
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: str, ttl: float, max_bytes: int):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(messages: list, model: str, temperature: Optional[float], base_url: str) -> str:
+        payload = json.dumps(
+            {"messages": messages, "model": model, "temperature": temperature, "base_url": base_url},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                return row[0]
+            if row:
+                # 已过期
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 按最近访问时间淘汰最久未使用的条目
+        rows = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+        logger.info(f"LLM 缓存淘汰 {len(evicted)} 条记录")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+
+
+def get_response_cache() -> LLMResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    db_path=os.path.join(get_app_dir("llm_cache"), "llm_cache.db"),
+                    ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+                    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 200 * 1024 * 1024)),
+                )
+    return _cache
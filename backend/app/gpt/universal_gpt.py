@@ -1,20 +1,48 @@
+import asyncio
+import time
+
+import openai
+
 from app.gpt.base import GPT
-from app.gpt.prompt_builder import generate_base_prompt
+from app.gpt import rate_limiter, response_cache
+from app.gpt.llm_router import latency_tracker, ttft_tracker
+from app.gpt.prompt_builder import generate_base_prompt, generate_prefix_prompt, use_prefix_layout
+from app.gpt.usage import build_usage_record, extract_usage, prompt_cache_tracker
 from app.models.gpt_model import GPTSource
 from app.gpt.prompt import BASE_PROMPT, AI_SUM, SCREENSHOT, LINK
 from app.gpt.utils import fix_markdown
 from app.models.transcriber_model import TranscriptSegment
 from datetime import timedelta
-from typing import List
+from typing import Callable, List, Optional
 
 
 class UniversalGPT(GPT):
-    def __init__(self, client, model: str, temperature: float = 0.7):
+    def __init__(self, client, model: str, temperature: float = 0.7,
+                 async_client_factory: Optional[Callable] = None,
+                 limiter: Optional[rate_limiter.ProviderLimiter] = None,
+                 provider_id: Optional[str] = None):
         self.client = client
         self.model = model
         self.temperature = temperature
         self.screenshot = False
         self.link = False
+        self._async_client_factory = async_client_factory
+        self.limiter = limiter
+        self.provider_id = provider_id
+        # 单次调用内的最大重试次数，None 表示按 LLM_MAX_RETRIES；由 RoutedGPT 调低，让路由负责切换
+        self.max_retries: Optional[int] = None
+        # 本实例发起的每次 LLM 调用的用量记录，由调用方汇总到任务结果 / 数据库
+        self.usage_log: List[dict] = []
+
+    @property
+    def served_by(self) -> dict:
+        return {"provider_id": self.provider_id, "model_name": self.model}
+
+    @property
+    def async_client(self):
+        if self._async_client_factory is None:
+            raise RuntimeError("当前 GPT 实例未配置异步客户端")
+        return self._async_client_factory()
 
     def _format_time(self, seconds: float) -> str:
         return str(timedelta(seconds=int(seconds)))[2:]
@@ -29,6 +57,8 @@ class UniversalGPT(GPT):
         return [TranscriptSegment(**seg) if isinstance(seg, dict) else seg for seg in segments]
 
     def create_messages(self, segments: List[TranscriptSegment], **kwargs):
+        if use_prefix_layout():
+            return self._create_prefix_messages(segments, **kwargs)
 
         content_text = generate_base_prompt(
             title=kwargs.get('title'),
@@ -61,15 +91,42 @@ class UniversalGPT(GPT):
 
         return messages
 
+    def _create_prefix_messages(self, segments: List[TranscriptSegment], **kwargs):
+        """
+        前缀缓存友好的布局：静态指令放在稳定的 system 消息中，转写与截图放在最后
+        """
+        system_text, user_text = generate_prefix_prompt(
+            title=kwargs.get('title'),
+            segment_text=self._build_segment_text(segments),
+            tags=kwargs.get('tags'),
+            _format=kwargs.get('_format'),
+            style=kwargs.get('style'),
+            extras=kwargs.get('extras'),
+            summary_level=kwargs.get('summary_level'),
+        )
+        content = [{"type": "text", "text": user_text}]
+        for url in kwargs.get('video_img_urls') or []:
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": url,
+                    "detail": "auto"
+                }
+            })
+        return [
+            {"role": "system", "content": system_text},
+            {"role": "user", "content": content},
+        ]
+
     def list_models(self):
         return self.client.models.list()
 
-    def summarize(self, source: GPTSource) -> str:
+    def _build_source_messages(self, source: GPTSource) -> list:
         self.screenshot = source.screenshot
         self.link = source.link
         source.segment = self.ensure_segments_type(source.segment)
 
-        messages = self.create_messages(
+        return self.create_messages(
             source.segment,
             title=source.title,
             tags=source.tags,
@@ -79,10 +136,250 @@ class UniversalGPT(GPT):
             extras=source.extras,
             summary_level=source.summary_level,
         )
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.7
+
+    def summarize(self, source: GPTSource) -> str:
+        messages = self._build_source_messages(source)
+        return self.chat(messages, temperature=self.temperature, use_cache=source.use_cache,
+                         on_wait=source.on_wait)
+
+    async def asummarize(self, source: GPTSource) -> str:
+        messages = self._build_source_messages(source)
+        return await self.achat(messages, temperature=self.temperature, use_cache=source.use_cache,
+                                on_wait=source.on_wait)
+
+    def _cache_key(self, messages: list, temperature: float, use_cache: bool) -> Optional[str]:
+        if not use_cache or not response_cache.is_enabled():
+            return None
+        return response_cache.LLMResponseCache.make_key(
+            messages, self.model, temperature, str(self.client.base_url)
         )
-        return response.choices[0].message.content.strip()
 
+    def _settle(self, estimated: int, usage) -> None:
+        if self.limiter:
+            self.limiter.settle(estimated, getattr(usage, "total_tokens", None))
+        if usage is not None and self.provider_id:
+            prompt_cache_tracker.record(self.provider_id, self.model, extract_usage(usage))
+
+    def _max_retries(self) -> int:
+        return rate_limiter.max_retries() if self.max_retries is None else self.max_retries
+
+    def _release_slot(self) -> None:
+        if self.limiter:
+            self.limiter.release()
+
+    def _track(self, started: float, exc: Optional[BaseException] = None) -> None:
+        """
+        记录供应商延迟与错误率，供路由排序。只有可重试的失败（限流、网络、5xx）算供应商错误；
+        请求本身的问题（其余 4xx）以及客户端断开、取消与供应商健康无关，不记录
+        """
+        if not self.provider_id:
+            return
+        if exc is not None and not (isinstance(exc, Exception) and rate_limiter.is_retryable(exc)):
+            return
+        latency_tracker.record(self.provider_id, self.model, time.perf_counter() - started, exc is None)
+
+    def _log_attempt(self, messages: list, usage, started: float, attempt: int,
+                     exc: Optional[BaseException] = None) -> None:
+        """
+        记录一次请求的用量；失败和被取消的请求同样记录，outcome 为 cancelled 或异常类名
+        """
+        if exc is None:
+            outcome = "ok"
+        elif isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+            outcome = "cancelled"
+        else:
+            outcome = exc.__class__.__name__
+        self.usage_log.append(build_usage_record(
+            self.provider_id, self.model, messages, usage, time.perf_counter() - started, outcome, attempt
+        ))
+
+    def _complete(self, messages: list, temperature: float, on_wait: Optional[Callable] = None):
+        """
+        带限流与重试的同步补全请求
+        """
+        estimated = rate_limiter.estimate_tokens(messages)
+        attempt = 0
+        while True:
+            # 用量记录的耗时含限流等待，延迟统计只算请求本身
+            attempt_started = time.perf_counter()
+            if self.limiter:
+                self.limiter.acquire(estimated, on_wait)
+            started = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                )
+            except Exception as exc:
+                # 先交还并发槽位：退避期间不占用，重试前重新申请
+                self._release_slot()
+                self._track(started, exc)
+                self._log_attempt(messages, None, attempt_started, attempt, exc)
+                if not rate_limiter.is_retryable(exc) or attempt >= self._max_retries():
+                    raise
+                delay = rate_limiter.retry_delay(attempt, exc)
+                rate_limiter.notify(on_wait, f"LLM 请求失败（{exc.__class__.__name__}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException as exc:
+                self._release_slot()
+                self._log_attempt(messages, None, attempt_started, attempt, exc)
+                raise
+            self._release_slot()
+            self._track(started)
+            self._settle(estimated, getattr(response, "usage", None))
+            self._log_attempt(messages, getattr(response, "usage", None), attempt_started, attempt)
+            return response
+
+    async def _acomplete(self, messages: list, temperature: float, on_wait: Optional[Callable] = None):
+        """
+        带限流与重试的异步补全请求
+        """
+        estimated = rate_limiter.estimate_tokens(messages)
+        attempt = 0
+        while True:
+            # 用量记录的耗时含限流等待，延迟统计只算请求本身
+            attempt_started = time.perf_counter()
+            if self.limiter:
+                await self.limiter.aacquire(estimated, on_wait)
+            started = time.perf_counter()
+            try:
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                )
+            except Exception as exc:
+                # 先交还并发槽位：退避期间不占用，重试前重新申请
+                self._release_slot()
+                self._track(started, exc)
+                self._log_attempt(messages, None, attempt_started, attempt, exc)
+                if not rate_limiter.is_retryable(exc) or attempt >= self._max_retries():
+                    raise
+                delay = rate_limiter.retry_delay(attempt, exc)
+                rate_limiter.notify(on_wait, f"LLM 请求失败（{exc.__class__.__name__}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException as exc:
+                self._release_slot()
+                self._log_attempt(messages, None, attempt_started, attempt, exc)
+                raise
+            self._release_slot()
+            self._track(started)
+            self._settle(estimated, getattr(response, "usage", None))
+            self._log_attempt(messages, getattr(response, "usage", None), attempt_started, attempt)
+            return response
+
+    def chat(self, messages: list, temperature: Optional[float] = None, use_cache: bool = True,
+             on_wait: Optional[Callable] = None) -> str:
+        temperature = self.temperature if temperature is None else temperature
+        cache_key = self._cache_key(messages, temperature, use_cache)
+        if cache_key:
+            cached = response_cache.get_response_cache().get(cache_key)
+            if cached is not None:
+                return cached
+
+        response = self._complete(messages, temperature, on_wait)
+        reply = response.choices[0].message.content.strip()
+        if cache_key:
+            response_cache.get_response_cache().set(cache_key, reply)
+        return reply
+
+    async def achat(self, messages: list, temperature: Optional[float] = None, use_cache: bool = True,
+                    on_wait: Optional[Callable] = None) -> str:
+        temperature = self.temperature if temperature is None else temperature
+        cache_key = self._cache_key(messages, temperature, use_cache)
+        if cache_key:
+            # 响应缓存是 sqlite，读写放到线程中执行
+            cached = await asyncio.to_thread(response_cache.get_response_cache().get, cache_key)
+            if cached is not None:
+                return cached
+
+        response = await self._acomplete(messages, temperature, on_wait)
+        reply = response.choices[0].message.content.strip()
+        if cache_key:
+            await asyncio.to_thread(response_cache.get_response_cache().set, cache_key, reply)
+        return reply
+
+    async def astream_chat(self, messages: list, temperature: Optional[float] = None, use_cache: bool = True,
+                           on_wait: Optional[Callable] = None):
+        """
+        流式对话：逐段 yield 模型输出的文本增量。
+        只在收到首个增量之前重试；调用方提前关闭生成器（如客户端断开）时会同时关闭上游连接，停止生成。
+        """
+        temperature = self.temperature if temperature is None else temperature
+        cache_key = self._cache_key(messages, temperature, use_cache)
+        if cache_key:
+            cached = await asyncio.to_thread(response_cache.get_response_cache().get, cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        estimated = rate_limiter.estimate_tokens(messages)
+        attempt = 0
+        # 请求在最后一个分片中附带 usage；不支持该参数的兼容实现退回不带 usage 的请求
+        stream_options = {"include_usage": True}
+        while True:
+            # 用量记录的耗时含限流等待，延迟统计只算请求本身
+            attempt_started = time.perf_counter()
+            if self.limiter:
+                await self.limiter.aacquire(estimated, on_wait)
+            started = time.perf_counter()
+            try:
+                stream = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    **({"stream_options": stream_options} if stream_options else {}),
+                )
+                break
+            except BaseException as exc:
+                # 包括客户端断开导致的取消（CancelledError 不是 Exception），都要交还槽位
+                self._release_slot()
+                self._log_attempt(messages, None, attempt_started, attempt, exc)
+                if not isinstance(exc, Exception):
+                    raise
+                if stream_options and isinstance(exc, openai.BadRequestError) and "stream_options" in str(exc):
+                    stream_options = None
+                    continue
+                self._track(started, exc)
+                if not rate_limiter.is_retryable(exc) or attempt >= self._max_retries():
+                    raise
+                delay = rate_limiter.retry_delay(attempt, exc)
+                rate_limiter.notify(on_wait, f"LLM 请求失败（{exc.__class__.__name__}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        parts = []
+        usage = None
+        error = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if not parts and self.provider_id:
+                    ttft_tracker.record(self.provider_id, self.model, time.perf_counter() - started, ok=True)
+                parts.append(delta)
+                yield delta
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            try:
+                await stream.close()
+            finally:
+                self._release_slot()
+                self._track(started, error)
+                self._settle(estimated, usage)
+                self._log_attempt(messages, usage, attempt_started, attempt, error)
+
+        reply = "".join(parts).strip()
+        if cache_key and reply:
+            await asyncio.to_thread(response_cache.get_response_cache().set, cache_key, reply)
@@ -0,0 +1,108 @@
+"""
+usage.py — 从供应商响应中读取 token 用量与前缀缓存命中，生成单次调用的用量记录
+
+不同供应商的缓存命中字段不同：
+- OpenAI 及兼容实现：usage.prompt_tokens_details.cached_tokens
+- DeepSeek：usage.prompt_cache_hit_tokens
+"""
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def extract_usage(usage) -> dict:
+    """
+    将 SDK 的 usage 对象转换为统一的 dict，缺失字段记为 0
+    """
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "total_tokens": getattr(usage, "total_tokens", None) or 0,
+        "cached_tokens": cached or 0,
+    }
+
+
+def payload_bytes(messages: list) -> int:
+    """
+    请求消息序列化后的字节数（含 base64 图片）
+    """
+    return len(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+
+
+def build_usage_record(provider_id: Optional[str], model: str, messages: list, usage,
+                       wall_time: float, outcome: str = "ok", attempt: int = 0) -> dict:
+    """
+    单次 LLM 请求（每次重试各算一次）的用量记录：token 用量、耗时（含限流等待）、请求体大小与结果。
+    失败的请求同样计入供应商的限流额度并可能按提示 token 计费，因此也要记录
+
+    :param outcome: ok、cancelled 或异常类名
+    :param attempt: 同一次调用内的第几次尝试，从 0 开始
+    """
+    return {
+        "provider_id": provider_id,
+        "model_name": model,
+        **extract_usage(usage),
+        "wall_time": round(wall_time, 3),
+        "payload_bytes": payload_bytes(messages),
+        "outcome": outcome,
+        "attempt": attempt,
+    }
+
+
+def summarize_usage(records: List[dict]) -> dict:
+    """
+    汇总多次调用的用量，附在任务结果中
+    """
+    totals = {"calls": len(records), "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+              "cached_tokens": 0, "wall_time": 0.0, "payload_bytes": 0}
+    for record in records:
+        for key in totals:
+            if key != "calls":
+                totals[key] += record.get(key) or 0
+    totals["failed_calls"] = sum(1 for record in records if record.get("outcome", "ok") != "ok")
+    totals["wall_time"] = round(totals["wall_time"], 3)
+    return {"totals": totals, "calls": records}
+
+
+class PromptCacheTracker:
+    """
+    按 (provider_id, model) 累计请求数、提示 token 与其中命中前缀缓存的 token
+    """
+
+    def __init__(self):
+        self._totals: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider_id: str, model: str, usage: dict) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(
+                (provider_id, model), {"requests": 0, "hit_requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+            )
+            totals["requests"] += 1
+            totals["prompt_tokens"] += usage["prompt_tokens"]
+            totals["cached_tokens"] += usage["cached_tokens"]
+            if usage["cached_tokens"]:
+                totals["hit_requests"] += 1
+
+    def all_stats(self) -> List[dict]:
+        with self._lock:
+            items = [(key, dict(totals)) for key, totals in self._totals.items()]
+        stats = []
+        for (provider_id, model), totals in items:
+            prompt = totals["prompt_tokens"]
+            stats.append({
+                "provider_id": provider_id,
+                "model": model,
+                **totals,
+                "cached_ratio": round(totals["cached_tokens"] / prompt, 4) if prompt else 0.0,
+            })
+        return stats
+
+
+prompt_cache_tracker = PromptCacheTracker()
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List, Union, Optional
+from typing import Callable, List, Union, Optional
 
 from app.models.transcriber_model import TranscriptSegment
 
@@ -16,5 +16,7 @@ class GPTSource:
     _format: Optional[list] = None
     video_img_urls:  Optional[list] = None
     summary_level: Optional[str] = "medium"  # simple / medium / detailed
+    use_cache: Optional[bool] = True  # 是否允许使用 LLM 响应缓存
+    on_wait: Optional[Callable[[str], None]] = None  # 限流 / 重试等待时的进度回调
 
 
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
 from app.models.audio_model import AudioDownloadResult
 from app.models.transcriber_model import TranscriptResult
@@ -9,4 +9,8 @@ from app.models.transcriber_model import TranscriptResult
 class NoteResult:
     markdown: str                  # GPT 总结的 Markdown 内容
     transcript: TranscriptResult                # Whisper 转写结果
-    audio_meta: AudioDownloadResult  # 音频下载的元信息（title、duration、封面等）
\ No newline at end of file
+    audio_meta: AudioDownloadResult  # 音频下载的元信息（title、duration、封面等）
+    video_payload: Optional[dict] = None  # 视频理解网格图的载荷统计（网格数、分辨率、字节数等）
+    served_by: Optional[dict] = None      # 实际生成笔记的供应商与模型 {"provider_id", "model_name"}
+    variants: Optional[List[dict]] = None  # 多风格任务的各风格笔记 [{"style", "markdown", "served_by"}]，markdown 为首个风格
+    usage: Optional[dict] = None  # LLM 用量 {"totals": {...}, "calls": [...]}：token、耗时、请求体大小
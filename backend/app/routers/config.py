@@ -46,6 +46,19 @@ async def sys_check():
     return R.success()
 
 
+@router.get("/llm_cache_stats")
+def llm_cache_stats():
+    from app.gpt.response_cache import get_response_cache, is_enabled
+    return R.success(data={"enabled": is_enabled(), **get_response_cache().stats()})
+
+
+@router.post("/llm_cache_clear")
+def llm_cache_clear():
+    from app.gpt.response_cache import get_response_cache
+    get_response_cache().clear()
+    return R.success(msg="LLM 缓存已清空")
+
+
 # ==================== 下载地址配置 ====================
 
 import json
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from fastapi import APIRouter
 from pydantic import BaseModel
 
@@ -42,6 +44,32 @@ def create_model(data: CreateModelRequest):
         return R.error("模型添加失败")
     return R.success(msg="模型添加成功")
 
+@router.get("/llm_route_stats")
+def llm_route_stats():
+    from app.gpt.llm_router import latency_tracker, ttft_tracker
+    from app.gpt.usage import prompt_cache_tracker
+    return R.success(
+        {
+            "latency": latency_tracker.all_stats(),
+            "ttft": ttft_tracker.all_stats(),
+            "prompt_cache": prompt_cache_tracker.all_stats(),
+        },
+        msg="获取供应商延迟统计成功",
+    )
+
+
+@router.get("/llm_usage")
+def llm_usage(provider_id: Optional[str] = None, model_name: Optional[str] = None):
+    from app.db.llm_usage_dao import get_usage_summary
+    return R.success(get_usage_summary(provider_id, model_name), msg="获取 LLM 用量统计成功")
+
+
+@router.get("/llm_usage/{task_id}")
+def llm_usage_by_task(task_id: str):
+    from app.db.llm_usage_dao import get_usage_by_task
+    return R.success(get_usage_by_task(task_id), msg="获取任务 LLM 用量成功")
+
+
 @router.get("/model_enable/{provider_id}")
 def get_enabled_models_by_provider(provider_id: str):
     try:
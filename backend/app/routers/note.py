@@ -1,22 +1,27 @@
 # app/routers/note.py
+import asyncio
 import json
 import os
+import time
 import uuid
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Union
 from urllib.parse import urlparse
 
 from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
 from pydantic import BaseModel, validator, field_validator
 from dataclasses import asdict
 
+from app.db.llm_usage_dao import insert_llm_usage
 from app.db.video_task_dao import get_task_by_video
+from app.gpt.usage import summarize_usage
 from app.enmus.exception import NoteErrorEnum
 from app.enmus.note_enums import DownloadQuality
 from app.exceptions.note import NoteError
 from app.services.note import NoteGenerator, logger
 from app.utils.response import ResponseWrapper as R
 from app.utils.url_parser import extract_video_id
+from app.utils.note_index import get_note_index, top_k, truncate_history
 from app.validators.video_url_validator import is_supported_video_url
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
@@ -44,12 +49,16 @@ class VideoRequest(BaseModel):
     provider_id: str
     task_id: Optional[str] = None
     format: Optional[list] = []
-    style: str = None
+    style: Union[str, List[str], None] = None  # 传入列表时一次任务生成多个风格的笔记
     extras: Optional[str]=None
     video_understanding: Optional[bool] = False
     video_interval: Optional[int] = 0
     grid_size: Optional[list] = []
     summary_level: Optional[str] = "medium"  # simple / medium / detailed
+    use_cache: Optional[bool] = True  # 是否允许复用 LLM 响应缓存
+    fallback_providers: Optional[list] = []  # [{"provider_id": "...", "model_name": "..."}]，主供应商失败时按顺序切换
+    hedge_after: Optional[float] = None  # 对冲阈值（秒），0 表示按历史 p95
+    progressive: Optional[bool] = False  # 渐进模式：边转写边生成分段草稿，最后整合
 
     @field_validator("video_url")
     def validate_supported_url(cls, v):
@@ -75,16 +84,19 @@ def save_note_to_file(task_id: str, note):
         json.dump(asdict(note), f, ensure_ascii=False, indent=2)
 
 
-def run_note_task(task_id: str, video_url: str, platform: str, quality: DownloadQuality,
+async def run_note_task(task_id: str, video_url: str, platform: str, quality: DownloadQuality,
                   link: bool = False, screenshot: bool = False, model_name: str = None, provider_id: str = None,
                   _format: list = None, style: str = None, extras: str = None, video_understanding: bool = False,
-                  video_interval=0, grid_size=[], summary_level: str = "medium"
+                  video_interval=0, grid_size=[], summary_level: str = "medium", use_cache: bool = True,
+                  fallback_providers: list = None, hedge_after: float = None, progressive: bool = False
                   ):
 
     if not model_name or not provider_id:
         raise HTTPException(status_code=400, detail="请选择模型和提供者")
 
-    note = NoteGenerator().generate(
+    # 构造 NoteGenerator 会初始化转写器（首次可能加载 Whisper 模型），放到线程中执行
+    generator = await asyncio.to_thread(NoteGenerator)
+    note = await generator.agenerate(
         video_url=video_url,
         platform=platform,
         quality=quality,
@@ -100,12 +112,16 @@ def run_note_task(task_id: str, video_url: str, platform: str, quality: Download
         video_interval=video_interval,
         grid_size=grid_size,
         summary_level=summary_level,
+        use_cache=use_cache,
+        fallback_providers=fallback_providers,
+        hedge_after=hedge_after,
+        progressive=progressive,
     )
     logger.info(f"Note generated: {task_id}")
     if not note or not note.markdown:
         logger.warning(f"任务 {task_id} 执行失败，跳过保存")
         return
-    save_note_to_file(task_id, note)
+    await asyncio.to_thread(save_note_to_file, task_id, note)
 
 
 
@@ -148,7 +164,7 @@ def generate_note(data: VideoRequest, background_tasks: BackgroundTasks):
             # 如果传了task_id，说明是重试！
             task_id = data.task_id
             # 更新之前的状态
-            NoteGenerator()._update_status(task_id, TaskStatus.PENDING)
+            NoteGenerator._update_status(task_id, TaskStatus.PENDING)
             logger.info(f"重试模式，复用已有 task_id={task_id}")
         else:
             # 正常新建任务
@@ -157,7 +173,8 @@ def generate_note(data: VideoRequest, background_tasks: BackgroundTasks):
         background_tasks.add_task(run_note_task, task_id, data.video_url, data.platform, data.quality, data.link,
                                   data.screenshot, data.model_name, data.provider_id, data.format, data.style,
                                   data.extras, data.video_understanding, data.video_interval, data.grid_size,
-                                  data.summary_level)
+                                  data.summary_level, data.use_cache, data.fallback_providers,
+                                  data.hedge_after, data.progressive)
         return R.success({"task_id": task_id})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -199,12 +216,17 @@ def get_task_status(task_id: str):
         if status == TaskStatus.FAILED.value:
             return R.error(message or "任务失败", code=500)
 
-        # 处理中状态
-        return R.success({
+        # 处理中状态（渐进模式下附带已生成的分段草稿）
+        data = {
             "status": status,
             "message": message,
             "task_id": task_id
-        })
+        }
+        draft_path = os.path.join(out_dir, f"{task_id}_draft.md")
+        if os.path.exists(draft_path):
+            with open(draft_path, "r", encoding="utf-8") as f:
+                data["draft"] = f.read()
+        return R.success(data)
 
     # 没有状态文件，但有结果
     if os.path.exists(result_path):
@@ -264,9 +286,10 @@ class TextNoteRequest(BaseModel):
     summary_level: Optional[str] = "medium"
     extras: Optional[str] = None
     format: Optional[list] = []
+    use_cache: Optional[bool] = True
 
 
-def run_text_note_task(
+async def run_text_note_task(
     task_id: str,
     source_type: str,
     content: str,
@@ -277,13 +300,14 @@ def run_text_note_task(
     summary_level: str,
     extras: str,
     formats: list,
+    use_cache: bool = True,
 ):
     """后台任务：从文本/文档/URL 生成笔记"""
     from app.utils.text_extractor import extract_text_from_file, extract_text_from_url, text_to_segments
     from app.models.transcriber_model import TranscriptResult
     from app.models.gpt_model import GPTSource
 
-    gen = NoteGenerator()
+    gen = NoteGenerator
 
     try:
         gen._update_status(task_id, TaskStatus.PARSING)
@@ -296,9 +320,9 @@ def run_text_note_task(
             if file_path.startswith('/uploads'):
                 file_path = os.path.join(os.getcwd(), file_path.lstrip('/'))
                 file_path = os.path.normpath(file_path)
-            raw_text = extract_text_from_file(file_path)
+            raw_text = await asyncio.to_thread(extract_text_from_file, file_path)
         elif source_type == "url":
-            raw_text = extract_text_from_url(content)
+            raw_text = await asyncio.to_thread(extract_text_from_url, content)
         else:
             raise ValueError(f"不支持的 source_type: {source_type}")
 
@@ -311,7 +335,7 @@ def run_text_note_task(
 
         # 3. GPT 总结
         gen._update_status(task_id, TaskStatus.SUMMARIZING)
-        gpt = gen._get_gpt(model_name, provider_id)
+        gpt = await asyncio.to_thread(gen._get_gpt, model_name, provider_id)
 
         source = GPTSource(
             title=title,
@@ -324,9 +348,11 @@ def run_text_note_task(
             extras=extras,
             summary_level=summary_level,
             video_img_urls=[],
+            use_cache=use_cache,
+            on_wait=lambda msg: gen._update_status(task_id, TaskStatus.SUMMARIZING, message=msg),
         )
 
-        markdown = gpt.summarize(source)
+        markdown = await gpt.asummarize(source)
 
         # 4-1. 自动提取标题：如果用户没有填标题，从 markdown 第一个 # 标题中提取
         import re as _re
@@ -361,8 +387,10 @@ def run_text_note_task(
                 raw_info={"source_type": source_type},
                 video_path=None,
             ),
+            usage=summarize_usage(gpt.usage_log),
         )
-        save_note_to_file(task_id, note)
+        await asyncio.to_thread(insert_llm_usage, gpt.usage_log, kind="text_note", task_id=task_id)
+        await asyncio.to_thread(save_note_to_file, task_id, note)
         gen._update_status(task_id, TaskStatus.SUCCESS)
         logger.info(f"文本笔记生成成功 (task_id={task_id})")
 
@@ -388,6 +416,7 @@ def generate_note_from_text(data: TextNoteRequest, background_tasks: BackgroundT
             summary_level=data.summary_level,
             extras=data.extras,
             formats=data.format or [],
+            use_cache=data.use_cache,
         )
         return R.success({"task_id": task_id})
     except Exception as e:
@@ -403,61 +432,144 @@ class ChatRequest(BaseModel):
     model_name: str
     provider_id: str
     history: Optional[list] = []  # [{"role": "user", "content": "..."}, ...]
+    use_cache: Optional[bool] = True  # 是否允许复用 LLM 响应缓存
 
 
-@router.post("/chat_with_note")
-def chat_with_note(data: ChatRequest):
-    """基于已有笔记内容进行对话"""
-    try:
-        # 1. 读取笔记
-        out_dir = str(get_note_output_dir())
-        result_path = os.path.join(out_dir, f"{data.task_id}.json")
-        md_path = os.path.join(out_dir, f"{data.task_id}_markdown.md")
-
-        note_content = ""
-        if os.path.exists(md_path):
-            with open(md_path, "r", encoding="utf-8") as f:
-                note_content = f.read()
-        elif os.path.exists(result_path):
-            with open(result_path, "r", encoding="utf-8") as f:
-                result = json.load(f)
-                note_content = result.get("markdown", "")
+def _build_chat_messages(data: ChatRequest):
+    """
+    检索与问题最相关的笔记章节 / 转写片段，拼装对话消息，返回 (messages, citations)
+    """
+    index = get_note_index(data.task_id, str(get_note_output_dir()))
+    if not index or not index.chunks:
+        raise HTTPException(status_code=404, detail="未找到对应笔记内容")
 
-        if not note_content:
-            raise HTTPException(status_code=404, detail="未找到对应笔记内容")
+    chunks = index.search(data.message, top_k())
+    if not chunks:
+        # 问题与内容无词汇重叠（如寒暄、"总结一下"），退回笔记开头的章节
+        chunks = [c for c in index.chunks if c.source == "note"][:top_k()] or index.chunks[:top_k()]
 
-        # 2. 创建 GPT 实例
-        gpt = NoteGenerator()._get_gpt(data.model_name, data.provider_id)
+    context = []
+    for i, chunk in enumerate(chunks, 1):
+        label = "笔记" if chunk.source == "note" else "转写"
+        meta = " / ".join(x for x in (label, chunk.title, chunk.timestamp) if x)
+        context.append(f"[{i}] ({meta})\n{chunk.text}")
+    context_text = "\n\n".join(context)
 
-        # 3. 构建对话
-        system_prompt = f"""你是一个智能笔记助手。以下是用户生成的笔记内容，请基于这些内容回答用户的问题。
+    system_prompt = f"""你是一个智能笔记助手。以下是从用户笔记和视频转写中检索到的相关片段，请基于这些内容回答用户的问题。
 
-## 笔记内容：
-{note_content}
+## 相关内容：
+{context_text}
 
 ## 要求：
-- 回答必须基于笔记内容，不要编造信息
-- 如果笔记中没有相关信息，请如实告知
+- 回答必须基于以上内容，不要编造信息
+- 如果内容中没有相关信息，请如实告知
+- 引用内容时可标注片段中的时间点（如 05:30）
 - 使用 Markdown 格式输出
 - 回答要简洁准确"""
 
-        messages = [{"role": "system", "content": system_prompt}]
-        if data.history:
-            for msg in data.history:
-                messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
-        messages.append({"role": "user", "content": data.message})
-
-        # 4. 调用 LLM
-        response = gpt.client.chat.completions.create(
-            model=gpt.model,
-            messages=messages,
-            temperature=0.5,
-        )
-        reply = response.choices[0].message.content.strip()
-        return R.success({"reply": reply})
+    messages = [{"role": "system", "content": system_prompt}]
+    for msg in truncate_history(data.history):
+        messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
+    messages.append({"role": "user", "content": data.message})
+
+    citations = [c.citation() for c in chunks if c.start is not None]
+    return messages, citations
+
+
+@router.post("/chat_with_note")
+async def chat_with_note(data: ChatRequest):
+    """基于已有笔记内容进行对话（只发送检索到的相关片段）"""
+    try:
+        # 1. 检索相关片段并构建对话
+        messages, citations = await asyncio.to_thread(_build_chat_messages, data)
+
+        # 2. 创建 GPT 实例（查询供应商配置，不需要初始化转写器）
+        gpt = await asyncio.to_thread(NoteGenerator._get_gpt, data.model_name, data.provider_id)
+
+        # 3. 调用 LLM
+        reply = await gpt.achat(messages, temperature=0.5, use_cache=data.use_cache)
+        await asyncio.to_thread(insert_llm_usage, gpt.usage_log, kind="chat", task_id=data.task_id)
+        return R.success({"reply": reply, "citations": citations})
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"笔记对话失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(payload: dict, event: Optional[str] = None) -> str:
+    data = json.dumps(payload, ensure_ascii=False)
+    return f"event: {event}\ndata: {data}\n\n" if event else f"data: {data}\n\n"
+
+
+async def _wait_disconnected(request: Request, interval: float = 0.5) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+async def _until_disconnected(stream, request: Request):
+    """
+    逐段转发 stream；客户端断开时（包括仍在排队等待并发槽位、等待首个分片期间）
+    立即取消上游请求并结束，不必等到下一个分片到达
+    """
+    watcher = asyncio.create_task(_wait_disconnected(request))
+    try:
+        while True:
+            step = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                logger.info("客户端已断开，取消上游流式请求")
+                step.cancel()
+                await asyncio.gather(step, return_exceptions=True)
+                return
+            try:
+                delta = step.result()
+            except StopAsyncIteration:
+                return
+            yield delta
+    finally:
+        watcher.cancel()
+
+
+@router.post("/chat_with_note/stream")
+async def chat_with_note_stream(data: ChatRequest, request: Request):
+    """
+    chat_with_note 的 SSE 流式版本：逐段推送模型输出，客户端断开后立即停止生成
+    事件格式：data: {"delta": "..."}，结束时 data: {"done": true, "citations": [...], "ttft": 秒}
+    """
+    async def event_stream():
+        gpt, stream, relay = None, None, None
+        try:
+            # 检索笔记与查找供应商也可能失败（笔记不存在、供应商或模型未配置），统一以 error 事件返回
+            messages, citations = await asyncio.to_thread(_build_chat_messages, data)
+            gpt = await asyncio.to_thread(NoteGenerator._get_gpt, data.model_name, data.provider_id)
+            started = time.perf_counter()
+            ttft = None
+            stream = gpt.astream_chat(messages, temperature=0.5, use_cache=data.use_cache)
+            relay = _until_disconnected(stream, request)
+            async for delta in relay:
+                if ttft is None:
+                    ttft = round(time.perf_counter() - started, 3)
+                    logger.info(f"笔记对话首 token 耗时 {ttft}s：{data.task_id}")
+                yield _sse({"delta": delta})
+            if await request.is_disconnected():
+                logger.info(f"客户端已断开，停止笔记对话生成：{data.task_id}")
+                return
+            yield _sse({"done": True, "citations": citations, "ttft": ttft})
+        except Exception as e:
+            logger.error(f"流式笔记对话失败: {e}", exc_info=True)
+            yield _sse({"message": str(getattr(e, "detail", e))}, event="error")
+        finally:
+            if relay is not None:
+                await relay.aclose()
+            if stream is not None:
+                await stream.aclose()
+            if gpt is not None:
+                await asyncio.to_thread(insert_llm_usage, gpt.usage_log, kind="chat", task_id=data.task_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
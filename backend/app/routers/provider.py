@@ -7,6 +7,7 @@ from app.models.model_config import ModelConfig
 from app.services.model import ModelService
 from app.utils.response import ResponseWrapper as R
 from app.services.provider import ProviderService
+from app.services import provider_monitor
 
 router = APIRouter()
 
@@ -17,6 +18,9 @@ class ProviderRequest(BaseModel):
     base_url: str
     logo: Optional[str] = None
     type: str
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    max_concurrency: Optional[int] = None
 
 class TestRequest(BaseModel):
     id: str
@@ -28,6 +32,9 @@ class ProviderUpdateRequest(BaseModel):
     logo: Optional[str] = None
     type: Optional[str] = None
     enabled:Optional[int] = None
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    max_concurrency: Optional[int] = None
 
 @router.post("/add_provider")
 def add_provider(data: ProviderRequest):
@@ -37,7 +44,10 @@ def add_provider(data: ProviderRequest):
             api_key=data.api_key,
             base_url=data.base_url,
             logo=data.logo,
-            type_=data.type
+            type_=data.type,
+            rpm=data.rpm,
+            tpm=data.tpm,
+            max_concurrency=data.max_concurrency,
         )
         return R.success(msg='添加模型供应商成功',data=res)
     except Exception as e:
@@ -71,15 +81,18 @@ def get_provider_by_id(id: str):
 @router.post("/update_provider")
 def update_provider(data: ProviderUpdateRequest):
     try:
-        if all(
-            field is None
-            for field in [data.name, data.api_key, data.base_url, data.logo, data.type,data.enabled]
+        # 只取请求中显式给出的字段；限流字段显式传 null 表示清除限制
+        fields = data.model_dump(exclude_unset=True)
+        if not any(
+            value is not None or key in ProviderService.CLEARABLE_FIELDS
+            for key, value in fields.items()
+            if key != 'id'
         ):
             return R.error(msg='请至少填写一个参数')
 
         provider_id =ProviderService.update_provider(
             id=data.id,
-            data=dict(data)
+            data=fields
         )
         return R.success(msg='更新模型供应商成功',data={'id': provider_id})
     except Exception as e:
@@ -90,3 +103,13 @@ def update_provider(data: ProviderUpdateRequest):
 def gpt_connect_test(data: TestRequest):
     ModelService().connect_test(data.id)
     return R.success(msg='连接成功')
+
+
+@router.get('/provider_health')
+def provider_health():
+    return R.success(provider_monitor.get_health(), msg='获取供应商健康状态成功')
+
+
+@router.post('/provider_health/refresh')
+def refresh_provider_health():
+    return R.success(provider_monitor.probe_all(), msg='供应商健康探测完成')
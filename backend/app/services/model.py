@@ -7,6 +7,7 @@ from app.exceptions.provider import ProviderError
 from app.gpt.gpt_factory import GPTFactory
 from app.gpt.provider.OpenAI_compatible_provider import OpenAICompatibleProvider
 from app.models.model_config import ModelConfig
+from app.services import provider_monitor
 from app.services.provider import ProviderService
 from app.utils.logger import get_logger
 
@@ -30,9 +31,8 @@ class ModelService:
             return []
 
         try:
-            config = ModelService._build_model_config(provider)
-            gpt = GPTFactory().from_config(config)
-            models = gpt.list_models()
+            # 读取缓存的模型列表，过期时后台刷新
+            models = provider_monitor.get_models(provider)
             if verbose:
                 print(f"[{provider['name']}] 模型列表: {models}")
             return models
@@ -87,10 +87,8 @@ class ModelService:
             provider = ProviderService.get_provider_by_id(provider_id)
 
             models = ModelService.get_model_list(provider["id"], verbose=verbose)
-            print(type(models))
-            serializable_models = [m.dict() for m in models.data]
             model_list = {
-                "models": serializable_models
+                "models": models
             }
 
             logger.info(f"[{provider['name']}] 获取模型成功")
@@ -107,10 +105,8 @@ class ModelService:
         if provider:
             if not provider.get('api_key'):
                 raise ProviderError(code=ProviderErrorEnum.NOT_FOUND.code, message=ProviderErrorEnum.NOT_FOUND.message)
-            result =  OpenAICompatibleProvider.test_connection(
-                api_key=provider.get('api_key'),
-                base_url=provider.get('base_url')
-            )
+            # 探测结果同时写入健康状态与模型列表缓存
+            result = provider_monitor.probe(provider)["reachable"]
             if result:
                 return True
             else:
@@ -1,10 +1,12 @@
+import asyncio
 import json
 import logging
 import os
 import re
+import tempfile
 from dataclasses import asdict
 from pathlib import Path
-from typing import List, Optional, Tuple, Union, Any
+from typing import Dict, List, Optional, Tuple, Union, Any
 
 from fastapi import HTTPException
 from pydantic import HttpUrl
@@ -15,6 +17,7 @@ from app.downloaders.bilibili_downloader import BilibiliDownloader
 from app.downloaders.douyin_downloader import DouyinDownloader
 from app.downloaders.local_downloader import LocalDownloader
 from app.downloaders.youtube_downloader import YoutubeDownloader
+from app.db.llm_usage_dao import insert_llm_usage
 from app.db.video_task_dao import delete_task_by_video, insert_video_task
 from app.enmus.exception import NoteErrorEnum, ProviderErrorEnum
 from app.enmus.task_status_enums import TaskStatus
@@ -23,6 +26,9 @@ from app.exceptions.note import NoteError
 from app.exceptions.provider import ProviderError
 from app.gpt.base import GPT
 from app.gpt.gpt_factory import GPTFactory
+from app.gpt.llm_router import RouteTarget, RoutedGPT
+from app.gpt.prompt_builder import generate_consolidate_messages
+from app.gpt.usage import summarize_usage
 from app.models.audio_model import AudioDownloadResult
 from app.models.gpt_model import GPTSource
 from app.models.model_config import ModelConfig
@@ -32,9 +38,13 @@ from app.services.constant import SUPPORT_PLATFORM_MAP
 from app.services.provider import ProviderService
 from app.transcriber.base import Transcriber
 from app.transcriber.transcriber_provider import get_transcriber, _transcribers
-from app.utils.note_helper import replace_content_markers
+from app.utils.audio_extract import audio_from_video_enabled
+from app.utils.audio_splitter import split_audio
+from app.utils.image_budget import ImageBudget
+from app.utils.note_helper import Marker, content_link, find_markers, rewrite_markers
 from app.utils.status_code import StatusCode
-from app.utils.video_helper import generate_screenshot
+from app.utils.screenshot import extract_screenshots
+from app.utils.media_info import get_duration
 from app.utils.video_reader import VideoReader
 
 # ------------------ 环境变量与全局配置 ------------------
@@ -53,6 +63,9 @@ IMAGE_OUTPUT_DIR = os.getenv("OUT_DIR", "./static/screenshots")
 # 图片基础 URL（用于生成 Markdown 中的图片链接，需前端静态目录对应）
 IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "/static/screenshots")
 
+# 本地用 ffmpeg 解码、能直接读取 m4a / ogg 的转写器；其余（bcut、kuaishou）按 mp3 上传
+LOCAL_DECODE_TRANSCRIBERS = {"fast-whisper", "mlx-whisper", "groq"}
+
 # 日志配置
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -71,12 +84,24 @@ class NoteGenerator:
         self.transcriber: Transcriber = self._init_transcriber()
         self.video_path: Optional[Path] = None
         self.video_img_urls=[]
+        self.video_payload: Optional[dict] = None
         logger.info("NoteGenerator 初始化完成")
 
 
     # ---------------- 公有方法 ----------------
 
     def generate(
+        self,
+        video_url: Union[str, HttpUrl],
+        platform: str,
+        **kwargs,
+    ) -> NoteResult | None:
+        """
+        agenerate 的同步入口，供脚本等无事件循环的场景使用，参数同 agenerate。
+        """
+        return asyncio.run(self.agenerate(video_url=video_url, platform=platform, **kwargs))
+
+    async def agenerate(
         self,
         video_url: Union[str, HttpUrl],
         platform: str,
@@ -87,16 +112,21 @@ class NoteGenerator:
         link: bool = False,
         screenshot: bool = False,
         _format: Optional[List[str]] = None,
-        style: Optional[str] = None,
+        style: Optional[Union[str, List[str]]] = None,
         extras: Optional[str] = None,
         output_path: Optional[str] = None,
         video_understanding: bool = False,
         video_interval: int = 0,
         grid_size: Optional[List[int]] = None,
         summary_level: Optional[str] = "medium",
+        use_cache: bool = True,
+        fallback_providers: Optional[List[dict]] = None,
+        hedge_after: Optional[float] = None,
+        progressive: bool = False,
     ) -> NoteResult | None:
         """
-        主流程：按步骤依次下载、转写、GPT 总结、截图/链接处理、存库、返回 NoteResult。
+        主流程（异步）：按步骤依次下载、转写、GPT 总结、截图/链接处理、存库、返回 NoteResult。
+        下载、转写、截图等阻塞步骤放到线程中执行，等待 LLM 响应时不占用线程。
 
         :param video_url: 视频或音频链接
         :param platform: 平台名称，对应 SUPPORT_PLATFORM_MAP 中的键
@@ -107,12 +137,18 @@ class NoteGenerator:
         :param link: 是否在笔记中插入视频片段链接
         :param screenshot: 是否在笔记中替换 Screenshot 标记为图片
         :param _format: 包含 'link' 或 'screenshot' 等字符串的列表，决定后续处理
-        :param style: GPT 生成笔记的风格
+        :param style: GPT 生成笔记的风格；传入列表时基于同一份转写并发生成多个风格的笔记
         :param extras: 额外参数，传递给 GPT
         :param output_path: 下载输出目录（可选）
         :param video_understanding: 是否需要视频拼图理解（生成缩略图）
         :param video_interval: 视频帧截取间隔（秒），仅在 video_understanding 为 True 时生效
         :param grid_size: 生成缩略图时的网格大小，如 [3, 3]
+        :param summary_level: 总结详细程度
+        :param use_cache: 是否允许复用 LLM 响应缓存
+        :param fallback_providers: 备用供应商列表，如 [{"provider_id": "...", "model_name": "..."}]，主供应商失败时按顺序切换
+        :param hedge_after: 对冲阈值（秒），主供应商超时未返回时并发请求下一个；0 表示按历史 p95
+        :param progressive: 渐进模式，边转写边生成分段草稿（任务状态中可见），最后整合为完整笔记；
+                            仅对单风格、无视频理解且需要音频转写的任务生效
         :return: NoteResult 对象，包含 markdown 文本、转写结果和音频元信息
         """
         if grid_size is None:
@@ -125,16 +161,19 @@ class NoteGenerator:
             # 获取下载器与 GPT 实例
 
             downloader = self._get_downloader(platform)
-            gpt = self._get_gpt(model_name, provider_id)
+            # 读取供应商配置要查数据库，放到线程中执行，不阻塞事件循环
+            gpt = await asyncio.to_thread(self._get_gpt, model_name, provider_id, fallback_providers, hedge_after)
 
             # 缓存文件路径
             _out_dir = get_note_output_dir()
             audio_cache_file = _out_dir / f"{task_id}_audio.json"
             transcript_cache_file = _out_dir / f"{task_id}_transcript.json"
+            # 主笔记（截图 / 链接替换后的最终结果）；模型原始输出按风格另存，单风格与多风格一致
             markdown_cache_file = _out_dir / f"{task_id}_markdown.md"
-            print(audio_cache_file)
+            logger.debug(f"音频缓存文件：{audio_cache_file}")
             # 1. 下载音频/视频
-            audio_meta = self._download_media(
+            audio_meta = await asyncio.to_thread(
+                self._download_media,
                 downloader=downloader,
                 video_url=video_url,
                 quality=quality,
@@ -148,50 +187,117 @@ class NoteGenerator:
                 grid_size=grid_size,
             )
 
+            styles = (list(dict.fromkeys(style)) or [None]) if isinstance(style, list) else [style]
+
+            def raw_markdown_file(variant_style: Optional[str]) -> Path:
+                if len(styles) == 1:
+                    return _out_dir / f"{task_id}_markdown_raw.md"
+                return _out_dir / f"{task_id}_markdown_{variant_style}.md"
+
             # 2. 获取字幕/转写文字
             # 优先尝试获取平台字幕，没有再 fallback 到音频转写
-            transcript = self._get_transcript(
-                downloader=downloader,
-                video_url=video_url,
-                audio_file=audio_meta.file_path,
-                transcript_cache_file=transcript_cache_file,
-                status_phase=TaskStatus.TRANSCRIBING,
-                task_id=task_id,
-            )
-
-            # 3. GPT 总结
-            markdown = self._summarize_text(
-                audio_meta=audio_meta,
-                transcript=transcript,
-                gpt=gpt,
-                markdown_cache_file=markdown_cache_file,
-                link=link,
-                screenshot=screenshot,
-                formats=_format or [],
-                style=style,
-                extras=extras,
-                video_img_urls=self.video_img_urls,
-                summary_level=summary_level,
-            )
+            progressive_markdown = None
+            if progressive and not video_understanding and len(styles) == 1 and not transcript_cache_file.exists():
+                # 渐进模式：边转写边生成分段草稿，最后整合
+                transcript, progressive_markdown = await self._progressive_notes(
+                    downloader=downloader,
+                    video_url=video_url,
+                    audio_meta=audio_meta,
+                    gpt=gpt,
+                    task_id=task_id,
+                    transcript_cache_file=transcript_cache_file,
+                    markdown_cache_file=raw_markdown_file(styles[0]),
+                    link=link,
+                    screenshot=screenshot,
+                    formats=_format or [],
+                    style=styles[0],
+                    extras=extras,
+                    summary_level=summary_level,
+                    use_cache=use_cache,
+                )
+            else:
+                transcript = await asyncio.to_thread(
+                    self._get_transcript,
+                    downloader=downloader,
+                    video_url=video_url,
+                    audio_file=audio_meta.file_path,
+                    transcript_cache_file=transcript_cache_file,
+                    status_phase=TaskStatus.TRANSCRIBING,
+                    task_id=task_id,
+                )
 
-            # 4. 截图 & 链接替换
-            if _format:
-                markdown = self._post_process_markdown(
-                    markdown=markdown,
-                    video_path=self.video_path,
-                    formats=_format,
+            # 3. GPT 总结（多个风格时基于同一份转写并发生成）
+            gpts = [gpt] + [
+                await asyncio.to_thread(self._get_gpt, model_name, provider_id, fallback_providers, hedge_after)
+                for _ in styles[1:]
+            ]
+            results = [progressive_markdown] if progressive_markdown is not None else await asyncio.gather(*[
+                self._summarize_text(
                     audio_meta=audio_meta,
-                    platform=platform,
+                    transcript=transcript,
+                    gpt=variant_gpt,
+                    markdown_cache_file=raw_markdown_file(variant_style),
+                    link=link,
+                    screenshot=screenshot,
+                    formats=_format or [],
+                    style=variant_style,
+                    extras=extras,
+                    video_img_urls=self.video_img_urls,
+                    summary_level=summary_level,
+                    use_cache=use_cache,
+                    # 多风格时单个风格失败不代表任务失败，由汇总处判断是否全部失败
+                    report_failure=len(styles) == 1,
                 )
+                for variant_style, variant_gpt in zip(styles, gpts)
+            ], return_exceptions=True)
+
+            variants = []
+            for variant_style, variant_gpt, result in zip(styles, gpts, results):
+                if isinstance(result, Exception):
+                    if len(styles) == 1:
+                        raise result
+                    logger.warning(f"风格 {variant_style} 的笔记生成失败：{result}")
+                    continue
+                # 4. 截图 & 链接替换
+                if _format:
+                    result = await asyncio.to_thread(
+                        self._post_process_markdown,
+                        markdown=result,
+                        video_path=self.video_path,
+                        formats=_format,
+                        audio_meta=audio_meta,
+                        platform=platform,
+                    )
+                variants.append({
+                    "style": variant_style,
+                    "markdown": result,
+                    "served_by": getattr(variant_gpt, "served_by", None),
+                })
+            if not variants:
+                raise results[0]
+
+            markdown = variants[0]["markdown"]
+            # 首个风格作为主笔记，供对话检索、索引读取
+            await asyncio.to_thread(markdown_cache_file.write_text, markdown, encoding="utf-8")
 
             # 5. 保存记录到数据库
             self._update_status(task_id, TaskStatus.SAVING)
-            self._save_metadata(video_id=audio_meta.video_id, platform=platform, task_id=task_id)
+            await asyncio.to_thread(self._save_metadata, video_id=audio_meta.video_id, platform=platform, task_id=task_id)
+            usage_records = [record for variant_gpt in gpts for record in getattr(variant_gpt, "usage_log", [])]
+            await asyncio.to_thread(insert_llm_usage, usage_records, kind="note", task_id=task_id)
 
             # 6. 完成
             self._update_status(task_id, TaskStatus.SUCCESS)
             logger.info(f"笔记生成成功 (task_id={task_id})")
-            return NoteResult(markdown=markdown, transcript=transcript, audio_meta=audio_meta)
+            return NoteResult(
+                markdown=markdown,
+                transcript=transcript,
+                audio_meta=audio_meta,
+                video_payload=self.video_payload,
+                served_by=variants[0]["served_by"],
+                variants=variants if len(styles) > 1 else None,
+                usage=summarize_usage(usage_records),
+            )
 
         except Exception as exc:
             logger.error(f"生成笔记流程异常 (task_id={task_id})：{exc}", exc_info=True)
@@ -223,13 +329,40 @@ class NoteGenerator:
         logger.info(f"使用转写器：{self.transcriber_type}")
         return get_transcriber(transcriber_type=self.transcriber_type)
 
-    def _get_gpt(self, model_name: Optional[str], provider_id: Optional[str]) -> GPT:
+    @classmethod
+    def _get_gpt(
+        cls,
+        model_name: Optional[str],
+        provider_id: Optional[str],
+        fallback_providers: Optional[List[dict]] = None,
+        hedge_after: Optional[float] = None,
+    ) -> GPT:
         """
-        根据 provider_id 获取对应的 GPT 实例
+        根据 provider_id 获取对应的 GPT 实例；指定备用供应商时返回带故障转移的 RoutedGPT
         :param model_name: GPT 模型名称
         :param provider_id: 供应商 ID
+        :param fallback_providers: 备用供应商列表 [{"provider_id": ..., "model_name": ...}]
+        :param hedge_after: 对冲阈值（秒）
         :return: GPT 实例
         """
+        gpt = cls._build_gpt(model_name, provider_id)
+        if not fallback_providers:
+            return gpt
+
+        targets = [RouteTarget(provider_id=provider_id, model_name=model_name, gpt=gpt)]
+        for fallback in fallback_providers:
+            try:
+                targets.append(RouteTarget(
+                    provider_id=fallback["provider_id"],
+                    model_name=fallback["model_name"],
+                    gpt=cls._build_gpt(fallback["model_name"], fallback["provider_id"]),
+                ))
+            except Exception as e:
+                logger.warning(f"跳过无效的备用供应商 {fallback}：{e}")
+        return RoutedGPT(targets, hedge_after=hedge_after)
+
+    @staticmethod
+    def _build_gpt(model_name: Optional[str], provider_id: Optional[str]) -> GPT:
         provider = ProviderService.get_provider_by_id(provider_id)
         if not provider:
             logger.error(f"[get_gpt] 未找到模型供应商: provider_id={provider_id}")
@@ -241,6 +374,10 @@ class NoteGenerator:
             model_name=model_name,
             provider=provider["type"],
             name=provider["name"],
+            provider_id=provider["id"],
+            rpm=provider.get("rpm"),
+            tpm=provider.get("tpm"),
+            max_concurrency=provider.get("max_concurrency"),
         )
         return GPTFactory().from_config(config)
 
@@ -267,7 +404,8 @@ class NoteGenerator:
         logger.info(f"使用下载器：{downloader_cls.__class__}")
         return instance
 
-    def _update_status(self, task_id: Optional[str], status: Union[str, TaskStatus], message: Optional[str] = None):
+    @staticmethod
+    def _update_status(task_id: Optional[str], status: Union[str, TaskStatus], message: Optional[str] = None):
         """
         创建或更新 {task_id}.status.json，记录当前任务状态
 
@@ -332,7 +470,7 @@ class NoteGenerator:
     ) -> AudioDownloadResult | None:
         """
         1. 检查音频缓存；若不存在，则根据需要下载音频或视频（若需截图/可视化）。
-        2. 如果需要视频，则先下载视频并生成缩略图集，再下载音频。
+        2. 如果需要视频，则先下载视频并生成缩略图集；视频含音轨时直接从中取音频，否则再下载音频。
         3. 返回 AudioDownloadResult
 
         :param downloader: Downloader 实例
@@ -364,14 +502,18 @@ class NoteGenerator:
 
                 # 若指定了 grid_size，则生成缩略图
                 if grid_size:
-                    self.video_img_urls=VideoReader(
+                    reader = VideoReader(
                         video_path=str(self.video_path),
                         grid_size=tuple(grid_size),
                         frame_interval=video_interval,
                         unit_width=1280,
                         unit_height=720,
                         save_quality=90,
-                    ).run()
+                        budget=ImageBudget.from_env(),
+                        task_id=task_id,
+                    )
+                    self.video_img_urls = reader.run()
+                    self.video_payload = reader.payload_stats
                 else:
                     logger.info("未指定 grid_size，跳过缩略图生成")
             except Exception as exc:
@@ -389,13 +531,26 @@ class NoteGenerator:
                 logger.warning(f"读取音频缓存失败，将重新下载：{e}")
         # 下载音频
         try:
-            logger.info("开始下载音频")
-            audio = downloader.download(
-                video_url=video_url,
-                quality=quality,
-                output_dir=output_path,
-                need_video=need_video,
-            )
+            audio = None
+            if self.video_path and audio_from_video_enabled():
+                # 视频已在本地，直接从中取音轨，不再下载一遍音频
+                try:
+                    audio = downloader.audio_from_video(
+                        video_url=video_url,
+                        video_path=str(self.video_path),
+                        output_dir=output_path,
+                        copy=self.transcriber_type in LOCAL_DECODE_TRANSCRIBERS,
+                    )
+                except Exception as e:
+                    logger.warning(f"从本地视频取音频失败，改为下载音频：{e}")
+            if audio is None:
+                logger.info("开始下载音频")
+                audio = downloader.download(
+                    video_url=video_url,
+                    quality=quality,
+                    output_dir=output_path,
+                    need_video=need_video,
+                )
             # 缓存 audio 元信息到本地 JSON
             audio_cache_file.write_text(json.dumps(asdict(audio), ensure_ascii=False, indent=2), encoding="utf-8")
             logger.info(f"音频下载并缓存成功 ({audio_cache_file})")
@@ -502,7 +657,7 @@ class NoteGenerator:
             self._handle_exception(task_id, exc)
             raise
 
-    def _summarize_text(
+    async def _summarize_text(
         self,
         audio_meta: AudioDownloadResult,
         transcript: TranscriptResult,
@@ -515,11 +670,14 @@ class NoteGenerator:
         extras: Optional[str],
             video_img_urls: List[str],
         summary_level: Optional[str] = "medium",
+        use_cache: bool = True,
+        report_failure: bool = True,
     ) -> str | None:
         """
         调用 GPT 对转写结果进行总结，生成 Markdown 文本并缓存。
+        report_failure 为 False 时失败只抛出异常，不把任务状态写为 FAILED（多风格并发生成时使用）
         """
-        task_id = markdown_cache_file.stem
+        task_id = markdown_cache_file.stem.split("_")[0]
         self._update_status(task_id, TaskStatus.SUMMARIZING)
 
         source = GPTSource(
@@ -533,18 +691,165 @@ class NoteGenerator:
             style=style,
             extras=extras,
             summary_level=summary_level,
+            use_cache=use_cache,
+            # 限流 / 重试等待写入任务状态，前端轮询可见
+            on_wait=lambda msg: self._update_status(task_id, TaskStatus.SUMMARIZING, message=msg),
         )
 
         try:
-            markdown = gpt.summarize(source)
-            markdown_cache_file.write_text(markdown, encoding="utf-8")
+            markdown = await gpt.asummarize(source)
+            await asyncio.to_thread(markdown_cache_file.write_text, markdown, encoding="utf-8")
             logger.info(f"GPT 总结并缓存成功 ({markdown_cache_file})")
             return markdown
         except Exception as exc:
             logger.error(f"GPT 总结失败：{exc}")
+            if report_failure:
+                self._handle_exception(task_id, exc)
+            raise
+
+    async def _progressive_notes(
+        self,
+        downloader: Downloader,
+        video_url: str,
+        audio_meta: AudioDownloadResult,
+        gpt: GPT,
+        task_id: str,
+        transcript_cache_file: Path,
+        markdown_cache_file: Path,
+        link: bool,
+        screenshot: bool,
+        formats: List[str],
+        style: Optional[str],
+        extras: Optional[str],
+        summary_level: Optional[str] = "medium",
+        use_cache: bool = True,
+    ) -> Tuple[TranscriptResult, Optional[str]]:
+        """
+        渐进式转写 + 总结：音频按 PROGRESSIVE_CHUNK_MINUTES 分段，每段转写完成后立即并发生成该段草稿，
+        转写下一段的同时等待 LLM；已完成的连续草稿写入 {task_id}_draft.md 供前端展示，
+        全部完成后把草稿整合为最终笔记。
+        平台有字幕或音频只有一段时退回普通流程，返回 (transcript, None)。
+        """
+        self._update_status(task_id, TaskStatus.TRANSCRIBING)
+        try:
+            transcript = await asyncio.to_thread(downloader.download_subtitles, video_url)
+            if transcript and transcript.segments:
+                logger.info(f"成功获取平台字幕，共 {len(transcript.segments)} 段，跳过渐进转写")
+                await asyncio.to_thread(
+                    transcript_cache_file.write_text,
+                    json.dumps(asdict(transcript), ensure_ascii=False, indent=2), encoding="utf-8",
+                )
+                return transcript, None
+        except Exception as e:
+            logger.warning(f"获取平台字幕失败: {e}，将使用音频转写")
+
+        chunk_seconds = int(float(os.getenv("PROGRESSIVE_CHUNK_MINUTES", 10)) * 60)
+        draft_file = get_note_output_dir() / f"{task_id}_draft.md"
+        with tempfile.TemporaryDirectory(prefix=f"{task_id}_parts_") as parts_dir:
+            try:
+                duration = await asyncio.to_thread(get_duration, audio_meta.file_path)
+            except Exception as e:
+                logger.warning(f"读取音频时长失败：{e}")
+                duration = 0
+            # 时长已知且不超过一段时无需切分
+            if duration and duration <= chunk_seconds:
+                chunks = [(audio_meta.file_path, 0.0)]
+            else:
+                chunks = await asyncio.to_thread(split_audio, audio_meta.file_path, chunk_seconds, parts_dir)
+            if len(chunks) <= 1:
+                transcript = await asyncio.to_thread(
+                    self._transcribe_audio,
+                    audio_file=audio_meta.file_path,
+                    transcript_cache_file=transcript_cache_file,
+                    status_phase=TaskStatus.TRANSCRIBING,
+                )
+                return transcript, None
+
+            segments: List[TranscriptSegment] = []
+            language = None
+            drafts: List[asyncio.Task] = []
+            starts: List[str] = []
+            published = 0
+
+            def publish(_=None):
+                # 把按顺序连续完成的分段草稿写入草稿文件
+                nonlocal published
+                done = 0
+                for draft in drafts:
+                    if not draft.done() or draft.cancelled() or draft.exception() is not None:
+                        break
+                    done += 1
+                if done > published:
+                    published = done
+                    draft_file.write_text("\n\n".join(d.result() for d in drafts[:done]), encoding="utf-8")
+                    self._update_status(task_id, TaskStatus.TRANSCRIBING, message=f"已生成前 {done}/{len(chunks)} 段草稿")
+
+            try:
+                for index, (chunk_path, offset) in enumerate(chunks):
+                    self._update_status(task_id, TaskStatus.TRANSCRIBING, message=f"正在转写第 {index + 1}/{len(chunks)} 段")
+                    part = await asyncio.to_thread(self.transcriber.transcript, file_path=chunk_path)
+                    if part is None:
+                        raise Exception(f"第 {index + 1} 段音频转写失败")
+                    language = language or part.language
+                    part_segments = [
+                        TranscriptSegment(start=seg.start + offset, end=seg.end + offset, text=seg.text)
+                        for seg in part.segments
+                    ]
+                    segments.extend(part_segments)
+                    starts.append(self._format_offset(offset))
+
+                    source = GPTSource(
+                        title=audio_meta.title,
+                        segment=part_segments,
+                        tags=audio_meta.raw_info.get("tags", []),
+                        screenshot=screenshot,
+                        link=link,
+                        # 目录与 AI 总结面向全文，留到整合阶段生成
+                        _format=[f for f in formats if f not in ("toc", "summary")],
+                        style=style,
+                        extras=f"{extras or ''}\n这是视频的第 {index + 1}/{len(chunks)} 部分（自 {starts[-1]} 起），只整理这一部分的内容。",
+                        summary_level=summary_level,
+                        video_img_urls=[],
+                        use_cache=use_cache,
+                        on_wait=lambda msg: self._update_status(task_id, TaskStatus.TRANSCRIBING, message=msg),
+                    )
+                    draft = asyncio.create_task(gpt.asummarize(source))
+                    draft.add_done_callback(publish)
+                    drafts.append(draft)
+            except Exception:
+                for draft in drafts:
+                    draft.cancel()
+                raise
+
+        full_text = " ".join(seg.text for seg in segments)
+        transcript = TranscriptResult(language=language, full_text=full_text, segments=segments)
+        await asyncio.to_thread(
+            transcript_cache_file.write_text,
+            json.dumps(asdict(transcript), ensure_ascii=False, indent=2), encoding="utf-8",
+        )
+
+        self._update_status(task_id, TaskStatus.SUMMARIZING, message="等待分段草稿完成")
+        try:
+            texts = await asyncio.gather(*drafts)
+        except Exception as exc:
+            for draft in drafts:
+                draft.cancel()
             self._handle_exception(task_id, exc)
             raise
 
+        self._update_status(task_id, TaskStatus.SUMMARIZING, message="正在整合分段草稿")
+        messages = generate_consolidate_messages(audio_meta.title, list(zip(starts, texts)), formats, style, extras)
+        markdown = await gpt.achat(messages, use_cache=use_cache)
+        await asyncio.to_thread(markdown_cache_file.write_text, markdown, encoding="utf-8")
+        draft_file.unlink(missing_ok=True)
+        logger.info(f"渐进式笔记整合完成 ({markdown_cache_file})")
+        return transcript, markdown
+
+    @staticmethod
+    def _format_offset(seconds: float) -> str:
+        minutes, secs = divmod(int(seconds), 60)
+        return f"{minutes:02d}:{secs:02d}"
+
     def _post_process_markdown(
         self,
         markdown: str,
@@ -563,59 +868,62 @@ class NoteGenerator:
         :param platform: 平台标识，用于链接替换
         :return: 处理后的 Markdown 字符串
         """
+        markers = find_markers(markdown)
+        if not markers:
+            return markdown
+
+        # 先批量解析所有标记，再一次性拼接；单个标记失败只影响它自己
+        replacements: Dict[int, str] = {}
         if "screenshot" in formats and video_path:
-            try:
-                markdown = self._insert_screenshots(markdown, video_path)
-            except Exception as exc:
-                logger.warning("截图插入失败，跳过该步骤")
+            replacements.update(self._resolve_screenshots(markers, video_path))
 
         if "link" in formats:
-            try:
-                markdown = replace_content_markers(markdown, video_id=audio_meta.video_id, platform=platform)
-            except Exception as e:
-                logger.warning(f"链接插入失败，跳过该步骤：{e}")
-
-        return markdown
-
-    def _insert_screenshots(self, markdown: str, video_path: Path) -> str | None | Any:
+            for index, marker in enumerate(markers):
+                if marker.kind != "Content":
+                    continue
+                try:
+                    replacements[index] = content_link(marker.seconds, video_id=audio_meta.video_id, platform=platform)
+                except Exception as e:
+                    logger.warning(f"链接插入失败 (timestamp={marker.label})，保留为纯文本：{e}")
+                    replacements[index] = f"({marker.label})"
+
+        return rewrite_markers(markdown, markers, replacements)
+
+    def _resolve_screenshots(self, markers: List[Marker], video_path: Path) -> Dict[int, str]:
         """
-        扫描 Markdown 文本中所有 Screenshot 标记，并替换为实际生成的截图链接。
+        为所有 Screenshot 标记批量生成截图，同一时间点只截一次，已截过的直接复用缓存。
+        截图失败的标记替换为空，不影响其余标记与整篇笔记。
 
-        :param markdown: 含有 *Screenshot-mm:ss 或 Screenshot-[mm:ss] 标记的 Markdown 文本
+        :param markers: find_markers 返回的全部标记
         :param video_path: 本地视频文件路径
-        :return: 替换后的 Markdown 字符串
-        """
-        matches: List[Tuple[str, int]] = self._extract_screenshot_timestamps(markdown)
-        for idx, (marker, ts) in enumerate(matches):
-            try:
-                img_path = generate_screenshot(str(video_path), str(IMAGE_OUTPUT_DIR), ts, idx)
-                filename = Path(img_path).name
-                # 构建前端可访问的 URL，例如 /static/screenshots/{filename}
-                img_url = f"{IMAGE_BASE_URL.rstrip('/')}/{filename}"
-                markdown = markdown.replace(marker, f"![]({img_url})", 1)
-            except Exception as exc:
-                logger.error(f"生成截图失败 (timestamp={ts})：{exc}")
-                # self._handle_exception(task_id, exc)
-                return None
-        return markdown
-
-    @staticmethod
-    def _extract_screenshot_timestamps(markdown: str) -> List[Tuple[str, int]]:
+        :return: {标记下标: 替换文本}
         """
-        从 Markdown 文本中提取所有 '*Screenshot-mm:ss' 或 'Screenshot-[mm:ss]' 标记，
-        返回 [(原始标记文本, 时间戳秒数), ...] 列表。
-
-        :param markdown: 原始 Markdown 文本
-        :return: 标记与对应时间戳秒数的列表
-        """
-        pattern = r"(?:\*Screenshot-(\d{2}):(\d{2})|Screenshot-\[(\d{2}):(\d{2})\])"
-        results: List[Tuple[str, int]] = []
-        for match in re.finditer(pattern, markdown):
-            mm = match.group(1) or match.group(3)
-            ss = match.group(2) or match.group(4)
-            total_seconds = int(mm) * 60 + int(ss)
-            results.append((match.group(0), total_seconds))
-        return results
+        shots = [(index, marker) for index, marker in enumerate(markers) if marker.kind == "Screenshot"]
+        if not shots:
+            return {}
+        try:
+            images = extract_screenshots(str(video_path), str(IMAGE_OUTPUT_DIR), [m.seconds for _, m in shots])
+        except Exception as exc:
+            logger.error(f"批量截图失败，跳过全部截图：{exc}")
+            images = {}
+
+        def url(path: str) -> str:
+            # 构建前端可访问的 URL，例如 /static/screenshots/{filename}
+            return f"{IMAGE_BASE_URL.rstrip('/')}/{Path(path).name}"
+
+        replacements: Dict[int, str] = {}
+        for index, marker in shots:
+            shot = images.get(marker.seconds)
+            if not shot:
+                logger.error(f"生成截图失败 (timestamp={marker.label})，跳过该截图")
+                replacements[index] = ""
+                continue
+            # 有衍生图时正文内嵌小图，点击打开原图
+            if shot.thumb:
+                replacements[index] = f"[![]({url(shot.thumb)})]({url(shot.path)})"
+            else:
+                replacements[index] = f"![]({url(shot.path)})"
+        return replacements
 
     def _save_metadata(self, video_id: str, platform: str, task_id: str) -> None:
         """
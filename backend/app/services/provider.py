@@ -11,10 +11,14 @@ from app.db.provider_dao import (
     delete_provider, get_enabled_providers,
 )
 from app.gpt.gpt_factory import GPTFactory
+from app.gpt.provider import client_cache
+from app.services import provider_monitor
 from app.models.model_config import ModelConfig
 
 
 class ProviderService:
+    # 可以通过显式传 None 清除的字段（限流配置，None 表示不限制）
+    CLEARABLE_FIELDS = ('rpm', 'tpm', 'max_concurrency')
 
     @staticmethod
     def serialize_provider(row: Provider) -> dict:
@@ -29,6 +33,9 @@ class ProviderService:
             "enabled": row.get("enabled"),
             "base_url": row.get("base_url"),
             "api_key": row.get("api_key"),
+            "rpm": row.get("rpm"),
+            "tpm": row.get("tpm"),
+            "max_concurrency": row.get("max_concurrency"),
             "created_at": jsonable_encoder(row.get("created_at")),
             # "name": row[1],
             # "logo": row[2],
@@ -52,6 +59,9 @@ class ProviderService:
             "enabled": row.get("enabled"),
             "base_url": row.get("base_url"),
             "api_key":  ProviderService.mask_key(row.get("api_key")),
+            "rpm": row.get("rpm"),
+            "tpm": row.get("tpm"),
+            "max_concurrency": row.get("max_concurrency"),
             "created_at": jsonable_encoder(row.get("created_at")),
 
             # "id": row[0],
@@ -69,11 +79,13 @@ class ProviderService:
             return '*' * len(key)
         return key[:4] + '*' * (len(key) - 8) + key[-4:]
     @staticmethod
-    def add_provider( name: str, api_key: str, base_url: str, logo: str, type_: str, enabled: int = 1):
+    def add_provider( name: str, api_key: str, base_url: str, logo: str, type_: str, enabled: int = 1,
+                      rpm: int = None, tpm: int = None, max_concurrency: int = None):
         try:
             id = uuid().lower()
             logo='custom'
-            return insert_provider(id, name, api_key, base_url, logo, type_, enabled)
+            return insert_provider(id, name, api_key, base_url, logo, type_, enabled,
+                                   rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
         except Exception as  e:
             print('创建模式失败',e)
     @staticmethod
@@ -86,6 +98,9 @@ class ProviderService:
             "api_key": p.api_key,
             "base_url": p.base_url,
             "enabled": p.enabled,
+            "rpm": p.rpm,
+            "tpm": p.tpm,
+            "max_concurrency": p.max_concurrency,
             "created_at": p.created_at,
         }
     @staticmethod
@@ -119,10 +134,21 @@ class ProviderService:
     @staticmethod
     def update_provider(id: str, data: dict)->str | None:
         try:
-        # 过滤掉空值
-            filtered_data = {k: v for k, v in data.items() if v is not None and k != 'id'}
+        # 过滤掉空值；限流字段为 None 时表示清除
+            filtered_data = {
+                k: v for k, v in data.items()
+                if k != 'id' and (v is not None or k in ProviderService.CLEARABLE_FIELDS)
+            }
             print('更新模型供应商',filtered_data)
+            old = get_provider_by_id(id)
             update_provider(id, **filtered_data)
+            # 凭据变更时移除旧的共享客户端
+            if old and (
+                filtered_data.get('api_key', old.api_key) != old.api_key
+                or filtered_data.get('base_url', old.base_url) != old.base_url
+            ):
+                client_cache.invalidate(old.api_key, old.base_url)
+                provider_monitor.invalidate(id)
             return id
 
         except Exception as e:
@@ -131,4 +157,8 @@ class ProviderService:
 
     @staticmethod
     def delete_provider(id: str):
+        old = get_provider_by_id(id)
+        if old:
+            client_cache.invalidate(old.api_key, old.base_url)
+            provider_monitor.invalidate(id)
         return delete_provider(id)
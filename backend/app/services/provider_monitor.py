@@ -0,0 +1,137 @@
+"""
+provider_monitor.py — 供应商模型列表缓存与健康探测
+
+- 模型列表按供应商缓存，TTL 内直接返回；过期后先返回旧数据，并在后台线程刷新
+- 健康探测：定期对启用的供应商请求 /models，记录可达性与延迟，设置页与路由直接读取缓存结果
+可通过环境变量配置：
+- MODEL_LIST_TTL：模型列表缓存有效期，秒（默认 600）
+- PROVIDER_HEALTH_INTERVAL：健康探测间隔，秒（默认 300，0 表示关闭定期探测）
+- PROVIDER_PROBE_TIMEOUT：单次探测超时，秒（默认 10）
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.db.provider_dao import get_enabled_providers
+from app.gpt.provider import client_cache
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# provider_id -> {"models": [...], "fetched_at": float}
+_model_lists: Dict[str, dict] = {}
+# provider_id -> 最近一次探测结果
+_health: Dict[str, dict] = {}
+_refreshing: set = set()
+_lock = threading.Lock()
+
+
+def _model_list_ttl() -> float:
+    return float(os.getenv("MODEL_LIST_TTL", 600))
+
+
+def probe(provider: dict) -> dict:
+    """
+    请求一次供应商的 /models：更新健康状态，成功时顺带刷新模型列表缓存
+    """
+    provider_id = provider["id"]
+    client = client_cache.get_client(api_key=provider["api_key"], base_url=provider["base_url"])
+    started = time.perf_counter()
+    models = None
+    try:
+        page = client.with_options(timeout=float(os.getenv("PROVIDER_PROBE_TIMEOUT", 10))).models.list()
+        models = [m.model_dump() for m in page.data]
+        result = {"reachable": True, "error": None}
+    except Exception as e:
+        result = {"reachable": False, "error": str(e)}
+
+    result.update({
+        "provider_id": provider_id,
+        "name": provider.get("name"),
+        "latency": round(time.perf_counter() - started, 3),
+        "checked_at": time.time(),
+    })
+    with _lock:
+        _health[provider_id] = result
+        if models is not None:
+            _model_lists[provider_id] = {"models": models, "fetched_at": time.time()}
+    if not result["reachable"]:
+        logger.warning(f"供应商 {provider.get('name')} 不可达：{result['error']}")
+    return result
+
+
+def _background_refresh(provider: dict) -> None:
+    provider_id = provider["id"]
+    with _lock:
+        if provider_id in _refreshing:
+            return
+        _refreshing.add(provider_id)
+
+    def run():
+        try:
+            probe(provider)
+        finally:
+            with _lock:
+                _refreshing.discard(provider_id)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_models(provider: dict) -> List[dict]:
+    """
+    获取供应商模型列表：新鲜缓存直接返回；过期缓存先返回并后台刷新；没有缓存时同步请求
+    """
+    with _lock:
+        entry = _model_lists.get(provider["id"])
+    if entry is not None:
+        if time.time() - entry["fetched_at"] > _model_list_ttl():
+            _background_refresh(provider)
+        return entry["models"]
+
+    result = probe(provider)
+    if not result["reachable"]:
+        raise RuntimeError(result["error"])
+    with _lock:
+        return _model_lists[provider["id"]]["models"]
+
+
+def get_health(provider_id: Optional[str] = None):
+    with _lock:
+        if provider_id is not None:
+            return _health.get(provider_id)
+        return list(_health.values())
+
+
+def invalidate(provider_id: str) -> None:
+    """
+    供应商配置变更或删除时清除其缓存
+    """
+    with _lock:
+        _model_lists.pop(provider_id, None)
+        _health.pop(provider_id, None)
+
+
+def probe_all() -> List[dict]:
+    results = []
+    for row in get_enabled_providers():
+        if not row.api_key:
+            continue
+        results.append(probe({"id": row.id, "name": row.name, "api_key": row.api_key, "base_url": row.base_url}))
+    return results
+
+
+async def run_health_loop() -> None:
+    """
+    定期探测全部启用的供应商，由 lifespan 启动、退出时取消
+    """
+    interval = float(os.getenv("PROVIDER_HEALTH_INTERVAL", 300))
+    if interval <= 0:
+        return
+    while True:
+        try:
+            await asyncio.to_thread(probe_all)
+        except Exception as e:
+            logger.warning(f"供应商健康探测失败：{e}")
+        await asyncio.sleep(interval)
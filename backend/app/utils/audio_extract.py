@@ -0,0 +1,91 @@
+"""
+audio_extract.py — 从本地视频中取出音轨
+
+需要截图 / 视频理解的任务已经把视频下载到本地，音轨可以直接从视频里取，不必再从平台
+下载一遍音频。能直接封装的编码（mp3 -> .mp3，允许时 aac -> .m4a、opus -> .ogg）只做流复制，
+不重新编码；其余编码转为 mp3。纯视频流（低清模式下载的视频）没有音轨，返回 None，
+由调用方退回网络下载。
+可通过环境变量配置：
+- AUDIO_FROM_VIDEO：是否从已下载的视频中取音轨（默认 true）
+"""
+import os
+import subprocess
+import uuid
+from typing import Optional
+
+from app.utils.logger import get_logger
+from app.utils.media_info import get_media_info
+
+logger = get_logger(__name__)
+
+# 可流复制的音频编码 -> 输出扩展名；mp3 任何转写器都能直接读取
+_COPY_FORMATS = {
+    "mp3": ".mp3",
+    "aac": ".m4a",
+    "opus": ".ogg",
+}
+
+
+def audio_from_video_enabled() -> bool:
+    return os.getenv("AUDIO_FROM_VIDEO", "true").lower() in ("1", "true", "yes")
+
+
+def _find_existing(output_dir: str, stem: str, copy: bool) -> Optional[str]:
+    for ext in (".mp3", ".m4a", ".ogg") if copy else (".mp3",):
+        path = os.path.join(output_dir, stem + ext)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            return path
+    return None
+
+
+def extract_audio(video_path: str, output_dir: str, stem: str, copy: bool = True) -> Optional[str]:
+    """
+    从本地视频中取出首路音轨
+
+    :param video_path: 本地视频文件路径
+    :param output_dir: 音频输出目录
+    :param stem: 输出文件名（不含扩展名），通常为视频 ID
+    :param copy: 是否允许输出 mp3 以外的容器（m4a / ogg）。转写器只接受 mp3 时传 False，
+                 此时只有 mp3 音轨做流复制，其余转码
+    :return: 音频文件路径；视频没有音轨时返回 None
+    """
+    existing = _find_existing(output_dir, stem, copy)
+    if existing:
+        logger.info(f"音频已存在，直接复用：{existing}")
+        return existing
+
+    audio_format = get_media_info(video_path).audio_format
+    if audio_format is None:
+        logger.info(f"视频不含音轨，无法从本地取音频：{video_path}")
+        return None
+
+    codec = audio_format["codec"]
+    ext = _COPY_FORMATS.get(codec)
+    if ext and (copy or ext == ".mp3"):
+        codec_args = ["-c:a", "copy"]
+    else:
+        ext = ".mp3"
+        codec_args = ["-c:a", "libmp3lame", "-b:a", "64k"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, stem + ext)
+    temp_path = os.path.join(output_dir, f".{stem}.{uuid.uuid4().hex}{ext}")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", video_path,
+        "-map", "0:a:0", "-vn", "-sn", "-dn",
+        *codec_args,
+        temp_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        os.replace(temp_path, output_path)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"从视频提取音频失败：{e.stderr.strip()}") from e
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    mode = "流复制" if codec_args[1] == "copy" else "转码"
+    logger.info(f"已从本地视频取出音轨（{codec}，{mode}）：{output_path}")
+    return output_path
@@ -0,0 +1,44 @@
+"""
+audio_splitter.py — 按固定时长切分音频，供渐进式转写逐段处理
+
+使用 ffmpeg segment 复用器一次性流复制切分（不重新编码），并通过 segment_list
+拿到每段的实际起止时间，转写结果按起始时间平移即可拼回完整时间轴。
+"""
+import csv
+import os
+import subprocess
+from typing import List, Tuple
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def split_audio(audio_file: str, chunk_seconds: int, out_dir: str) -> List[Tuple[str, float]]:
+    """
+    :param audio_file: 音频文件路径
+    :param chunk_seconds: 每段时长（秒）
+    :param out_dir: 切分结果目录
+    :return: [(分段文件路径, 起始秒数), ...]，按时间顺序
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ext = os.path.splitext(audio_file)[1] or ".mp3"
+    pattern = os.path.join(out_dir, f"part_%03d{ext}")
+    list_file = os.path.join(out_dir, "segments.csv")
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", audio_file,
+        "-vn", "-map", "0:a:0", "-c", "copy",
+        "-f", "segment", "-segment_time", str(chunk_seconds), "-reset_timestamps", "1",
+        "-segment_list", list_file, "-segment_list_type", "csv",
+        pattern,
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    chunks = []
+    with open(list_file, "r", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            chunks.append((os.path.join(out_dir, row[0]), float(row[1])))
+    logger.info(f"音频切分完成：{audio_file}，共 {len(chunks)} 段")
+    return chunks
@@ -0,0 +1,149 @@
+"""
+image_budget.py — 视频理解网格图的载荷预算
+
+根据总像素 / 总字节 / 视觉 token 预算，为网格图挑选单元分辨率、JPEG 质量和网格数量，
+避免长视频生成几十张 4K 网格图一次性内联进请求。
+预算默认值可通过环境变量配置（为空或 0 表示不限制）：
+- VIDEO_IMG_MAX_PIXELS：所有网格图的总像素上限
+- VIDEO_IMG_MAX_BYTES：所有网格图 base64 后的总字节上限（默认 8MB）
+- VIDEO_IMG_MAX_TOKENS：所有网格图的视觉 token 上限
+"""
+import math
+import os
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple
+
+# 候选单元宽度（16:9），从高到低
+UNIT_WIDTHS = [1280, 960, 854, 640, 480, 320]
+# 候选 JPEG 质量，从高到低
+QUALITIES = [90, 80, 70, 60, 50]
+# 不同 JPEG 质量下每像素的经验字节数（自然画面）
+_BYTES_PER_PIXEL = {90: 0.25, 80: 0.16, 70: 0.12, 60: 0.10, 50: 0.08}
+# base64 膨胀系数
+_BASE64_RATIO = 4 / 3
+# 优先保持的最低 JPEG 质量
+_MIN_PREFERRED_QUALITY = 70
+
+
+@dataclass
+class ImageBudget:
+    max_total_pixels: Optional[int] = None
+    max_total_bytes: Optional[int] = None
+    max_image_tokens: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ImageBudget":
+        def _int(name: str, default: Optional[int] = None) -> Optional[int]:
+            value = os.getenv(name)
+            if value is None or value == "":
+                return default
+            return int(value) or None
+
+        return cls(
+            max_total_pixels=_int("VIDEO_IMG_MAX_PIXELS"),
+            max_total_bytes=_int("VIDEO_IMG_MAX_BYTES", 8 * 1024 * 1024),
+            max_image_tokens=_int("VIDEO_IMG_MAX_TOKENS"),
+        )
+
+
+@dataclass
+class GridPlan:
+    unit_width: int
+    unit_height: int
+    quality: int
+    grid_count: int        # 实际发送的网格数
+    frames_per_grid: int
+    est_bytes: int         # 预估 base64 总字节
+    est_tokens: int        # 预估视觉 token 总数
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def estimate_vision_tokens(width: int, height: int) -> int:
+    """
+    按 OpenAI high detail 规则估算单张图片的视觉 token：
+    先缩放到 2048x2048 以内，再将短边缩到 768，按 512 切块，每块 170 token + 85 基础
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    tiles = math.ceil(w / 512) * math.ceil(h / 512)
+    return 85 + 170 * tiles
+
+
+def estimate_jpeg_bytes(pixels: int, quality: int) -> int:
+    return int(pixels * _BYTES_PER_PIXEL.get(quality, 0.25) * _BASE64_RATIO)
+
+
+def plan_grids(frame_count: int, grid_size: Tuple[int, int], budget: ImageBudget,
+               unit_width: int = 1280, unit_height: int = 720, quality: int = 90) -> GridPlan:
+    """
+    在预算内挑选网格参数：优先保证网格数量（时间覆盖），其次单元分辨率，最后 JPEG 质量。
+
+    :param frame_count: 抽取到的帧数
+    :param grid_size: 网格尺寸 (cols, rows)
+    :param budget: 载荷预算
+    :param unit_width: 单元宽度上限
+    :param unit_height: 单元高度上限
+    :param quality: JPEG 质量上限
+    """
+    cols, rows = grid_size
+    cells = cols * rows
+    wanted = max(1, frame_count // cells)
+    aspect = unit_height / unit_width
+
+    widths = [w for w in UNIT_WIDTHS if w <= unit_width] or [unit_width]
+    if unit_width not in widths:
+        widths.insert(0, unit_width)
+    qualities = [q for q in QUALITIES if q <= quality] or [quality]
+
+    # 先在较高质量下逐级降低分辨率，仍放不下时才在最小分辨率上继续压质量
+    candidates = [(w, q) for w in widths for q in qualities if q >= _MIN_PREFERRED_QUALITY]
+    candidates += [(widths[-1], q) for q in qualities if q < _MIN_PREFERRED_QUALITY]
+
+    best: Optional[GridPlan] = None
+    plan: Optional[GridPlan] = None
+    for width, q in candidates:
+        height = int(round(width * aspect / 2)) * 2
+        grid_pixels = width * cols * height * rows
+        grid_tokens = estimate_vision_tokens(width * cols, height * rows)
+        grid_bytes = estimate_jpeg_bytes(grid_pixels, q)
+        allowed = wanted
+        if budget.max_total_pixels:
+            allowed = min(allowed, budget.max_total_pixels // grid_pixels)
+        if budget.max_total_bytes:
+            allowed = min(allowed, budget.max_total_bytes // grid_bytes)
+        if budget.max_image_tokens:
+            allowed = min(allowed, budget.max_image_tokens // grid_tokens)
+        plan = GridPlan(
+            unit_width=width,
+            unit_height=height,
+            quality=q,
+            grid_count=max(1, allowed),
+            frames_per_grid=cells,
+            est_bytes=grid_bytes * max(1, allowed),
+            est_tokens=grid_tokens * max(1, allowed),
+        )
+        if allowed >= wanted:
+            return plan
+        if allowed >= 1 and (best is None or plan.grid_count > best.grid_count):
+            best = plan
+
+    if best is None:
+        # 最低配置也放不下一张，仍保留一张最小网格
+        best = plan
+    return best
+
+
+def subsample_evenly(items: List, count: int) -> List:
+    """
+    从 items 中均匀挑选 count 个元素，保持原顺序，用于在网格数受限时保留整段视频的时间覆盖
+    """
+    if count >= len(items):
+        return list(items)
+    if count <= 0:
+        return []
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
@@ -0,0 +1,91 @@
+"""
+keyframes.py — 基于感知哈希（dHash）的关键帧挑选
+
+幻灯片类视频按固定间隔截帧会得到大量几乎相同的画面，既浪费网格空间也浪费视觉 token。
+这里先对低分辨率灰度帧批量计算 dHash，再按与上一张保留帧的汉明距离去重，
+并用最少 / 最多帧数兜底。
+可通过环境变量配置：
+- VIDEO_FRAME_SELECTION：interval（固定间隔，默认）或 keyframe（去重后的关键帧）
+- VIDEO_KEYFRAME_THRESHOLD：判定为不同画面的最小汉明距离（0-64，默认 10）
+- VIDEO_KEYFRAME_MIN：最少保留帧数（默认 9）
+- VIDEO_KEYFRAME_MAX：最多保留帧数（默认 0，表示只受 max_frames 与载荷预算限制）
+"""
+import os
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+# dHash 采样尺寸：宽 9 高 8，相邻列比较得到 8x8=64 位
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+@dataclass
+class KeyframeConfig:
+    threshold: int = 10
+    min_frames: int = 9
+    max_frames: int = 0
+
+    @classmethod
+    def from_env(cls) -> "KeyframeConfig":
+        return cls(
+            threshold=int(os.getenv("VIDEO_KEYFRAME_THRESHOLD", 10)),
+            min_frames=int(os.getenv("VIDEO_KEYFRAME_MIN", 9)),
+            max_frames=int(os.getenv("VIDEO_KEYFRAME_MAX", 0)),
+        )
+
+
+def dhash(frames: np.ndarray) -> np.ndarray:
+    """
+    批量计算 dHash
+
+    :param frames: (N, 8, 9) 的灰度帧
+    :return: (N, 64) 的布尔数组，每行是一帧的哈希位
+    """
+    frames = frames.astype(np.int16)
+    return (frames[:, :, 1:] > frames[:, :, :-1]).reshape(len(frames), -1)
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    哈希位之间的汉明距离，支持广播
+    """
+    return np.count_nonzero(a != b, axis=-1)
+
+
+def select_keyframes(hashes: np.ndarray, config: KeyframeConfig, limit: int) -> List[int]:
+    """
+    挑选画面各不相同的帧
+
+    :param hashes: dhash() 的结果
+    :param config: 去重阈值与最少 / 最多帧数
+    :param limit: 额外的上限（max_frames、载荷预算），取与 config.max_frames 中较小者
+    :return: 按时间顺序的帧下标
+    """
+    total = len(hashes)
+    if total == 0:
+        return []
+
+    # 贪心：与上一张保留帧差异超过阈值才保留，变化分数记为该距离
+    kept = [0]
+    scores = {0: hashes.shape[1]}
+    for i in range(1, total):
+        distance = int(hamming(hashes[i], hashes[kept[-1]]))
+        if distance > config.threshold:
+            kept.append(i)
+            scores[i] = distance
+
+    # 画面过于单一时，在未保留的帧中均匀补齐到最少帧数
+    min_frames = min(config.min_frames, total)
+    if len(kept) < min_frames:
+        rest = [i for i in range(total) if i not in scores]
+        picks = np.linspace(0, len(rest) - 1, min_frames - len(kept)).round().astype(int)
+        kept = sorted(set(kept) | {rest[p] for p in picks})
+
+    # 超出上限时保留变化最大的帧，首帧始终保留
+    max_frames = min(config.max_frames, limit) if config.max_frames > 0 else limit
+    if 0 < max_frames < len(kept):
+        ranked = sorted(kept, key=lambda i: scores.get(i, 0), reverse=True)
+        kept = sorted(ranked[:max_frames])
+    return kept
@@ -0,0 +1,128 @@
+"""
+media_info.py — 媒体文件信息缓存
+
+一次 ffprobe 取得时长、容器格式、各路流信息，按 (绝对路径, 文件大小, 修改时间) 缓存，
+抽帧、截图、分段转写、本地文件导入共用同一份结果，同一文件不会重复探测；文件被替换后
+大小或修改时间变化，自然失效。
+可通过环境变量配置：
+- MEDIA_INFO_CACHE_SIZE：缓存的文件数（默认 256）
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import ffmpeg
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class MediaInfo:
+    path: str
+    size: int
+    mtime: float
+    duration: float                        # 秒，探测不到时为 0
+    format_name: str = ""
+    bit_rate: int = 0
+    streams: List[dict] = field(default_factory=list)
+
+    @property
+    def video(self) -> Optional[dict]:
+        return next((s for s in self.streams if s.get("codec_type") == "video"
+                     and not s.get("disposition", {}).get("attached_pic")), None)
+
+    @property
+    def audio(self) -> Optional[dict]:
+        return next((s for s in self.streams if s.get("codec_type") == "audio"), None)
+
+    @property
+    def has_video(self) -> bool:
+        return self.video is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def audio_format(self) -> Optional[dict]:
+        """
+        首路音频流的编码、采样率、声道数与码率
+        """
+        audio = self.audio
+        if audio is None:
+            return None
+        return {
+            "codec": audio.get("codec_name"),
+            "sample_rate": int(audio.get("sample_rate") or 0),
+            "channels": audio.get("channels"),
+            "bit_rate": int(audio.get("bit_rate") or 0),
+        }
+
+
+_cache: "OrderedDict[Tuple[str, int, float], MediaInfo]" = OrderedDict()
+_lock = threading.Lock()
+# 同一文件并发探测时只让一个线程真正执行 ffprobe
+_probe_locks: Dict[Tuple[str, int, float], threading.Lock] = {}
+
+
+def _cache_key(path: str) -> Tuple[str, int, float]:
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime
+
+
+def _parse(key: Tuple[str, int, float], probe: dict) -> MediaInfo:
+    fmt = probe.get("format", {})
+    streams = probe.get("streams", [])
+    duration = float(fmt.get("duration") or 0)
+    if not duration:
+        duration = max((float(s.get("duration") or 0) for s in streams), default=0.0)
+    return MediaInfo(
+        path=key[0],
+        size=key[1],
+        mtime=key[2],
+        duration=duration,
+        format_name=fmt.get("format_name", ""),
+        bit_rate=int(fmt.get("bit_rate") or 0),
+        streams=streams,
+    )
+
+
+def _store(key: Tuple[str, int, float], info: MediaInfo) -> None:
+    with _lock:
+        _cache[key] = info
+        _cache.move_to_end(key)
+        while len(_cache) > int(os.getenv("MEDIA_INFO_CACHE_SIZE", 256)):
+            old_key, _ = _cache.popitem(last=False)
+            _probe_locks.pop(old_key, None)
+
+
+def get_media_info(path: str) -> MediaInfo:
+    """
+    获取媒体文件信息，命中缓存时不再调用 ffprobe
+    """
+    key = _cache_key(path)
+    with _lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+            return info
+        probe_lock = _probe_locks.setdefault(key, threading.Lock())
+
+    with probe_lock:
+        with _lock:
+            info = _cache.get(key)
+        if info is not None:
+            return info
+        info = _parse(key, ffmpeg.probe(path))
+        _store(key, info)
+        logger.info(f"媒体信息：{path}，时长 {info.duration:.1f}s，{len(info.streams)} 路流")
+        return info
+
+
+def get_duration(path: str) -> float:
+    return get_media_info(path).duration
+
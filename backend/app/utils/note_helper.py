@@ -1,33 +1,86 @@
 import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 
+# 时间戳：mm:ss 或 hh:mm:ss（超过 99 分钟的视频）
+_TS = r"(?:\d{1,2}:)?\d{1,3}:\d{2}"
+# 一次扫描同时匹配 Content / Screenshot 标记，支持以下形式：
+# *Content-04:16*、Content-04:16、*Content-[04:16]、Screenshot-[01:02:03]
+# 只有带前导 * 时才吞掉可选的结尾 *，避免破坏相邻的加粗 / 斜体
+MARKER_PATTERN = re.compile(
+    rf"(?P<star>\*)?(?P<kind>Content|Screenshot)-(?:\[(?P<ts1>{_TS})\]|(?P<ts2>{_TS}))(?(star)\*?)"
+)
 
-import re
 
-import re
+@dataclass
+class Marker:
+    kind: str      # "Content" 或 "Screenshot"
+    seconds: int
+    start: int     # 在 Markdown 中的起止位置
+    end: int
+    text: str      # 原始标记文本
+
+    @property
+    def label(self) -> str:
+        return format_timestamp(self.seconds)
+
+
+def format_timestamp(seconds: int) -> str:
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
 
-def replace_content_markers(markdown: str, video_id: str, platform: str = 'bilibili') -> str:
+
+def parse_timestamp(ts: str) -> int:
+    seconds = 0
+    for part in ts.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def find_markers(markdown: str) -> List[Marker]:
     """
-    替换 *Content-04:16*、Content-04:16 或 Content-[04:16] 为超链接，跳转到对应平台视频的时间位置
+    单次扫描找出所有 Content / Screenshot 标记
     """
-    # 匹配三种形式：*Content-04:16*、Content-04:16、Content-[04:16]
-    pattern = r"(?:\*?)Content-(?:\[(\d{2}):(\d{2})\]|(\d{2}):(\d{2}))"
-
-    def replacer(match):
-        mm = match.group(1) or match.group(3)
-        ss = match.group(2) or match.group(4)
-        total_seconds = int(mm) * 60 + int(ss)
-
-        if platform == 'bilibili':
-            video_id = video_id.replace("_p", "?p=")
-            url = f"https://www.bilibili.com/video/{video_id}&t={total_seconds}"
-        elif platform == 'youtube':
-            url = f"https://www.youtube.com/watch?v={video_id}&t={total_seconds}s"
-        elif platform == 'douyin':
-            url = f"https://www.douyin.com/video/{video_id}"
-            return f"[原片 @ {mm}:{ss}]({url})"
-        else:
-            return f"({mm}:{ss})"
-
-        return f"[原片 @ {mm}:{ss}]({url})"
-
-    return re.sub(pattern, replacer, markdown)
+    return [
+        Marker(
+            kind=match.group("kind"),
+            seconds=parse_timestamp(match.group("ts1") or match.group("ts2")),
+            start=match.start(),
+            end=match.end(),
+            text=match.group(0),
+        )
+        for match in MARKER_PATTERN.finditer(markdown)
+    ]
+
+
+def rewrite_markers(markdown: str, markers: List[Marker], replacements: Dict[int, str]) -> str:
+    """
+    按 markers 的下标把替换结果一次性拼接回 Markdown；没有替换结果的标记保留原文
+    """
+    parts = []
+    cursor = 0
+    for index, marker in enumerate(markers):
+        parts.append(markdown[cursor:marker.start])
+        parts.append(replacements.get(index, marker.text))
+        cursor = marker.end
+    parts.append(markdown[cursor:])
+    return "".join(parts)
+
+
+def content_link(seconds: int, video_id: str, platform: str = 'bilibili') -> str:
+    """
+    生成跳转到对应平台视频时间位置的超链接
+    """
+    label = format_timestamp(seconds)
+    if platform == 'bilibili':
+        video_id = video_id.replace("_p", "?p=")
+        url = f"https://www.bilibili.com/video/{video_id}&t={seconds}"
+    elif platform == 'youtube':
+        url = f"https://www.youtube.com/watch?v={video_id}&t={seconds}s"
+    elif platform == 'douyin':
+        url = f"https://www.douyin.com/video/{video_id}"
+    else:
+        return f"({label})"
+
+    return f"[原片 @ {label}]({url})"
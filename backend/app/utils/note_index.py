@@ -0,0 +1,225 @@
+"""
+note_index.py — 笔记对话的检索索引
+
+把笔记按 Markdown 标题切成章节、把转写按时间窗口合并成片段，建立 BM25 索引，
+对话时只把与问题最相关的 top-k 片段放进上下文，而不是每轮都发送整篇笔记。
+索引按 task_id 缓存在内存中，源文件修改时间变化后自动重建。
+可通过环境变量配置：
+- CHAT_TOP_K：每次检索返回的片段数（默认 6）
+- CHAT_HISTORY_TOKENS：对话历史的 token 预算（默认 2000）
+- CHAT_INDEX_CACHE_SIZE：内存中缓存的索引数量（默认 32）
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from app.gpt.rate_limiter import estimate_tokens
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# BM25 参数
+_K1 = 1.5
+_B = 0.75
+# 转写片段合并的目标长度（字符）
+_TRANSCRIPT_CHUNK_CHARS = 400
+# 笔记章节过长时的切分长度（字符）
+_NOTE_CHUNK_CHARS = 1200
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+")
+# 笔记中的时间标记：*Content-[mm:ss]*、[原片 @ mm:ss](...)、(mm:ss) 等，兼容 hh:mm:ss
+_TIMESTAMP_RE = re.compile(r"(?<!\d)(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?!\d)")
+_WORD_RE = re.compile(r"[a-z0-9]+|[一-鿿]+")
+
+
+@dataclass
+class Chunk:
+    source: str                   # "note" 或 "transcript"
+    text: str
+    title: Optional[str] = None   # 所属章节标题（笔记）
+    start: Optional[float] = None  # 对应视频时间（秒）
+
+    @property
+    def timestamp(self) -> Optional[str]:
+        return format_timestamp(self.start) if self.start is not None else None
+
+    def citation(self) -> dict:
+        data = asdict(self)
+        data.pop("text")
+        data["timestamp"] = self.timestamp
+        return data
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    英文 / 数字按单词切分，中文按单字 + 相邻二元组切分（无需分词词典）
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word[0] >= "一":
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def _first_timestamp(text: str) -> Optional[float]:
+    match = _TIMESTAMP_RE.search(text)
+    if not match:
+        return None
+    h, m, s = match.groups()
+    return int(h or 0) * 3600 + int(m) * 60 + int(s)
+
+
+def split_note(markdown: str) -> List[Chunk]:
+    """
+    按标题切分笔记，过长的章节再按段落切分
+    """
+    sections: List[Tuple[Optional[str], List[str]]] = [(None, [])]
+    for line in markdown.splitlines():
+        if _HEADING_RE.match(line):
+            sections.append((_HEADING_RE.sub("", line).strip(), [line]))
+        else:
+            sections[-1][1].append(line)
+
+    chunks = []
+    for title, lines in sections:
+        buffer = ""
+        for paragraph in "\n".join(lines).split("\n\n"):
+            if buffer and len(buffer) + len(paragraph) > _NOTE_CHUNK_CHARS:
+                chunks.append(Chunk("note", buffer.strip(), title, _first_timestamp(buffer)))
+                buffer = ""
+            buffer += paragraph + "\n\n"
+        if buffer.strip():
+            chunks.append(Chunk("note", buffer.strip(), title, _first_timestamp(buffer)))
+    return chunks
+
+
+def split_transcript(segments: List[dict]) -> List[Chunk]:
+    """
+    将相邻转写分段合并为约 _TRANSCRIPT_CHUNK_CHARS 字的片段，保留起始时间
+    """
+    chunks = []
+    buffer, start = [], None
+    for segment in segments:
+        text = (segment.get("text") or "").strip()
+        if not text:
+            continue
+        if start is None:
+            start = segment.get("start")
+        buffer.append(text)
+        if sum(len(t) for t in buffer) >= _TRANSCRIPT_CHUNK_CHARS:
+            chunks.append(Chunk("transcript", " ".join(buffer), start=start))
+            buffer, start = [], None
+    if buffer:
+        chunks.append(Chunk("transcript", " ".join(buffer), start=start))
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks: List[Chunk]):
+        self.chunks = chunks
+        self._tfs = [Counter(tokenize(chunk.text)) for chunk in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._tfs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        df = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def search(self, query: str, top_k: int) -> List[Chunk]:
+        terms = set(tokenize(query))
+        scores = []
+        for i, tf in enumerate(self._tfs):
+            score = 0.0
+            norm = _K1 * (1 - _B + _B * self._lengths[i] / (self._avg_length or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (_K1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [self.chunks[i] for _, i in scores[:top_k]]
+
+
+_indexes: "OrderedDict[str, Tuple[tuple, BM25Index]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _signature(paths: List[str]) -> tuple:
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+
+def _build_index(md_path: str, result_path: str) -> BM25Index:
+    markdown, segments = "", []
+    if os.path.exists(result_path):
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        markdown = result.get("markdown") or ""
+        segments = (result.get("transcript") or {}).get("segments") or []
+    if os.path.exists(md_path):
+        with open(md_path, "r", encoding="utf-8") as f:
+            markdown = f.read()
+    chunks = split_note(markdown) + split_transcript(segments)
+    return BM25Index(chunks)
+
+
+def get_note_index(task_id: str, out_dir: str) -> Optional[BM25Index]:
+    """
+    获取（或构建）task 对应的检索索引；笔记与转写都不存在时返回 None
+    """
+    md_path = os.path.join(out_dir, f"{task_id}_markdown.md")
+    result_path = os.path.join(out_dir, f"{task_id}.json")
+    signature = _signature([md_path, result_path])
+    if signature == (None, None):
+        return None
+
+    with _lock:
+        entry = _indexes.get(task_id)
+        if entry and entry[0] == signature:
+            _indexes.move_to_end(task_id)
+            return entry[1]
+
+    index = _build_index(md_path, result_path)
+    logger.info(f"构建笔记检索索引：{task_id}，共 {len(index.chunks)} 个片段")
+    with _lock:
+        _indexes[task_id] = (signature, index)
+        _indexes.move_to_end(task_id)
+        while len(_indexes) > int(os.getenv("CHAT_INDEX_CACHE_SIZE", 32)):
+            _indexes.popitem(last=False)
+    return index
+
+
+def truncate_history(history: List[dict], budget: Optional[int] = None) -> List[dict]:
+    """
+    从最近一条开始向前保留对话历史，直到超出 token 预算
+    """
+    if budget is None:
+        budget = int(os.getenv("CHAT_HISTORY_TOKENS", 2000))
+    kept, used = [], 0
+    for message in reversed(history or []):
+        cost = estimate_tokens([message])
+        if used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    return list(reversed(kept))
+
+
+def top_k() -> int:
+    return int(os.getenv("CHAT_TOP_K", 6))
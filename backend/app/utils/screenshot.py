@@ -0,0 +1,244 @@
+"""
+screenshot.py — 批量截图、压缩格式与按视频内容缓存
+
+- 同一时间点只截一次；多个时间点合并到一次 ffmpeg 调用（每个时间点一个快速 seek 的输入），
+  批次之间用小线程池并行
+- 截图按目标格式与质量重新编码，限制最长边，并生成供正文内嵌显示的小尺寸衍生图
+- 文件名取图片内容哈希，内容不变则 URL 不变，可长期缓存；(视频内容 ID, 时间点, 输出参数)
+  到文件名的映射记录在 .index 目录，重新生成同一视频的笔记时直接复用已有截图
+- 单个时间点失败只影响该时间点，结果中记为 None
+可通过环境变量配置：
+- SCREENSHOT_FORMAT：jpeg（默认）、webp 或 avif，当前 Pillow 不支持时退回 jpeg
+- SCREENSHOT_QUALITY：编码质量（默认 80）
+- SCREENSHOT_MAX_DIM：原图最长边（默认 1280，0 表示保持原始分辨率）
+- SCREENSHOT_THUMB_DIM：内嵌显示用衍生图的最长边（默认 640，0 表示不生成）
+- SCREENSHOT_BATCH_SIZE：每次 ffmpeg 调用处理的时间点数（默认 16）
+- SCREENSHOT_WORKERS：并行的 ffmpeg 进程数（默认 2）
+"""
+import hashlib
+import io
+import json
+import os
+import subprocess
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, features
+
+from app.utils.logger import get_logger
+from app.utils.media_info import get_duration
+
+logger = get_logger(__name__)
+
+# 计算内容 ID 时读取的文件头尾字节数
+_FINGERPRINT_BYTES = 1024 * 1024
+# 输出格式 -> (Pillow 编码器, Pillow 特性名, 扩展名)
+_FORMATS = {
+    "jpeg": ("JPEG", None, ".jpg"),
+    "webp": ("WEBP", "webp", ".webp"),
+    "avif": ("AVIF", "avif", ".avif"),
+}
+
+
+@dataclass
+class ScreenshotOptions:
+    format: str = "jpeg"
+    quality: int = 80
+    max_dim: int = 1280
+    thumb_dim: int = 640
+
+    @classmethod
+    def from_env(cls) -> "ScreenshotOptions":
+        fmt = os.getenv("SCREENSHOT_FORMAT", "jpeg").lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        feature = _FORMATS.get(fmt, (None, None, None))[1]
+        if fmt not in _FORMATS or (feature and not features.check(feature)):
+            logger.warning(f"不支持的截图格式 {fmt}，改用 jpeg")
+            fmt = "jpeg"
+        return cls(
+            format=fmt,
+            quality=int(os.getenv("SCREENSHOT_QUALITY", 80)),
+            max_dim=int(os.getenv("SCREENSHOT_MAX_DIM", 1280)),
+            thumb_dim=int(os.getenv("SCREENSHOT_THUMB_DIM", 640)),
+        )
+
+    @property
+    def key(self) -> str:
+        return f"{self.format}_q{self.quality}_m{self.max_dim}_t{self.thumb_dim}"
+
+
+@dataclass
+class Screenshot:
+    path: str                    # 原图路径
+    thumb: Optional[str] = None  # 内嵌显示用衍生图路径，未生成时为 None
+
+
+@lru_cache(maxsize=128)
+def _content_id(path: str, size: int, mtime: float) -> str:
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(_FINGERPRINT_BYTES))
+        if size > _FINGERPRINT_BYTES:
+            f.seek(max(_FINGERPRINT_BYTES, size - _FINGERPRINT_BYTES))
+            digest.update(f.read(_FINGERPRINT_BYTES))
+    return digest.hexdigest()[:16]
+
+
+def video_content_id(video_path: str) -> str:
+    """
+    视频内容 ID：文件大小 + 头尾各 1MB 的哈希。同一视频重新下载到别的路径也能命中缓存
+    """
+    stat = os.stat(video_path)
+    return _content_id(os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def _encode(image: Image.Image, max_dim: int, options: ScreenshotOptions) -> bytes:
+    if max_dim and max(image.size) > max_dim:
+        image = image.copy()
+        image.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format=_FORMATS[options.format][0], quality=options.quality)
+    return buffer.getvalue()
+
+
+def _store(data: bytes, out_dir: Path, options: ScreenshotOptions) -> Path:
+    """
+    以内容哈希命名保存，相同内容只存一份
+    """
+    path = out_dir / f"screenshot_{hashlib.sha1(data).hexdigest()[:16]}{_FORMATS[options.format][2]}"
+    if not path.exists():
+        _atomic_write(path, data)
+    return path
+
+
+def _index_path(out_dir: Path, content_id: str, timestamp: int, options: ScreenshotOptions) -> Path:
+    return out_dir / ".index" / f"{content_id}_{timestamp}_{options.key}.json"
+
+
+def _load_cached(index_path: Path, out_dir: Path) -> Optional[Screenshot]:
+    try:
+        entry = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    path = out_dir / entry["path"]
+    thumb = out_dir / entry["thumb"] if entry.get("thumb") else None
+    if not path.exists() or (thumb is not None and not thumb.exists()):
+        return None
+    return Screenshot(path=str(path), thumb=str(thumb) if thumb else None)
+
+
+def _process_frame(frame_path: str, out_dir: Path, index_path: Path, options: ScreenshotOptions) -> Screenshot:
+    """
+    把 ffmpeg 截出的无损帧编码为目标格式的原图与衍生图，并记录索引
+    """
+    with Image.open(frame_path) as image:
+        image = image.convert("RGB")
+        path = _store(_encode(image, options.max_dim, options), out_dir, options)
+        thumb = None
+        if options.thumb_dim and max(image.size) > options.thumb_dim:
+            thumb = _store(_encode(image, options.thumb_dim, options), out_dir, options)
+    entry = {"path": path.name, "thumb": thumb.name if thumb else None}
+    _atomic_write(index_path, json.dumps(entry).encode("utf-8"))
+    return Screenshot(path=str(path), thumb=str(thumb) if thumb else None)
+
+
+def _extract_batch(video_path: str, batch: List[Tuple[int, Path]], frame_dir: str,
+                   out_dir: Path, options: ScreenshotOptions) -> Dict[int, Optional[Screenshot]]:
+    """
+    一次 ffmpeg 调用截取一批时间点（无损 PNG 中间帧），再逐张编码
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    for timestamp, _ in batch:
+        cmd += ["-ss", str(timestamp), "-i", video_path]
+    frame_paths = []
+    for index, (timestamp, _) in enumerate(batch):
+        frame_path = os.path.join(frame_dir, f"{timestamp}.png")
+        frame_paths.append(frame_path)
+        cmd += ["-map", f"{index}:v:0", "-frames:v", "1", frame_path]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.warning(f"批量截图 ffmpeg 返回 {result.returncode}：{result.stderr.strip()}")
+
+    shots: Dict[int, Optional[Screenshot]] = {}
+    for (timestamp, index_path), frame_path in zip(batch, frame_paths):
+        if not os.path.exists(frame_path) or os.path.getsize(frame_path) == 0:
+            shots[timestamp] = None
+            continue
+        try:
+            shots[timestamp] = _process_frame(frame_path, out_dir, index_path, options)
+        except Exception as e:
+            logger.error(f"截图编码失败 (timestamp={timestamp})：{e}")
+            shots[timestamp] = None
+    return shots
+
+
+def extract_screenshots(video_path: str, output_dir: str, timestamps: Iterable[int],
+                        options: Optional[ScreenshotOptions] = None) -> Dict[int, Optional[Screenshot]]:
+    """
+    批量截图
+
+    :param video_path: 本地视频文件路径
+    :param output_dir: 截图输出目录（同时也是缓存目录）
+    :param timestamps: 时间点（秒），可重复
+    :param options: 输出格式、质量与尺寸，默认读取环境变量
+    :return: {时间点: Screenshot}，失败的时间点为 None
+    """
+    options = options or ScreenshotOptions.from_env()
+    out_dir = Path(output_dir)
+    (out_dir / ".index").mkdir(parents=True, exist_ok=True)
+    content_id = video_content_id(video_path)
+    try:
+        duration = get_duration(video_path)
+    except Exception as e:
+        logger.warning(f"读取视频时长失败，不检查时间点范围：{e}")
+        duration = 0
+
+    shots: Dict[int, Optional[Screenshot]] = {}
+    pending: List[Tuple[int, Path]] = []
+    for timestamp in sorted(set(timestamps)):
+        index_path = _index_path(out_dir, content_id, timestamp, options)
+        if duration and timestamp >= duration:
+            # 超出视频时长的时间点（模型臆造的标记）直接判为失败，不必调用 ffmpeg
+            shots[timestamp] = None
+            continue
+        cached = _load_cached(index_path, out_dir)
+        if cached:
+            shots[timestamp] = cached
+        else:
+            pending.append((timestamp, index_path))
+    cached_count = sum(1 for v in shots.values() if v)
+    if not pending:
+        logger.info(f"截图全部命中缓存：{cached_count} 张")
+        return shots
+
+    batch_size = max(1, int(os.getenv("SCREENSHOT_BATCH_SIZE", 16)))
+    workers = max(1, int(os.getenv("SCREENSHOT_WORKERS", 2)))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    with tempfile.TemporaryDirectory(prefix="screenshots_") as frame_dir:
+        def run(batch: List[Tuple[int, Path]]) -> Dict[int, Optional[Screenshot]]:
+            try:
+                return _extract_batch(video_path, batch, frame_dir, out_dir, options)
+            except Exception as e:
+                logger.error(f"批量截图失败：{e}")
+                return {timestamp: None for timestamp, _ in batch}
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            for result in executor.map(run, batches):
+                shots.update(result)
+    logger.info(f"截图完成：缓存命中 {cached_count} 张，新截取 {len(pending)} 张，"
+                f"失败 {sum(1 for v in shots.values() if v is None)} 张")
+    return shots
@@ -1,142 +1,385 @@
 import base64
+import io
+import math
+import multiprocessing
 import os
-import re
+import shutil
 import subprocess
-import ffmpeg
-from PIL import Image, ImageDraw, ImageFont
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional, Tuple
 
+import numpy as np
+from PIL import Image
+
+from grid_worker import compose_grid, encode_jpeg, format_time, init_grid_worker, load_font, render_grid
+
+from app.utils.image_budget import ImageBudget, plan_grids
+from app.utils.keyframes import HASH_HEIGHT, HASH_WIDTH, KeyframeConfig, dhash, select_keyframes
 from app.utils.logger import get_logger
+from app.utils.media_info import get_duration
 from app.utils.path_helper import get_app_dir
 
 logger = get_logger(__name__)
+
+# 未指定或指定为非正数时的默认截帧间隔（秒）
+DEFAULT_FRAME_INTERVAL = 2
+
+# 网格拼图进程池：多个任务共用，按 (进程数, 字体) 复用
+_grid_pool: Optional[ProcessPoolExecutor] = None
+_grid_pool_key: Optional[Tuple[int, str]] = None
+_grid_pool_lock = threading.Lock()
+_GRID_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def grid_workers() -> int:
+    """
+    网格拼图进程数，VIDEO_GRID_WORKERS 未配置、为 0 或 1 时在当前进程内串行处理（默认）；
+    设为 auto 时按 CPU 核数取值（给 ffmpeg 解码留一个核，最多 4 个）
+    """
+    value = (os.getenv("VIDEO_GRID_WORKERS") or "0").strip().lower()
+    if value == "auto":
+        return min(4, (os.cpu_count() or 1) - 1)
+    return int(value)
+
+
+def get_grid_pool(workers: int, font_path: str) -> ProcessPoolExecutor:
+    """
+    获取共用的网格拼图进程池。服务进程里有 uvicorn 与转写等线程，fork 会把其他线程持有的锁
+    原样复制进子进程，可能导致死锁；因此用 forkserver 启动工作进程（入口模块只在 server
+    进程中导入一次），不支持时（Windows）用 spawn。任务函数放在轻量的 grid_worker 模块中，
+    工作进程不会导入 app 包
+    """
+    global _grid_pool, _grid_pool_key
+    with _grid_pool_lock:
+        if _grid_pool is None or _grid_pool_key != (workers, font_path):
+            if _grid_pool is not None:
+                # 已提交的任务照常完成，只是不再接收新任务
+                _grid_pool.shutdown(wait=False)
+            _grid_pool = ProcessPoolExecutor(max_workers=workers, initializer=init_grid_worker,
+                                             initargs=(font_path,),
+                                             mp_context=multiprocessing.get_context(_GRID_START_METHOD))
+            _grid_pool_key = (workers, font_path)
+        return _grid_pool
+
+
+def discard_grid_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    丢弃已损坏的进程池，下次使用时重建。只在它仍是当前进程池时替换，
+    不取消其中的 future：它们属于其他任务，会各自以 BrokenProcessPool 结束
+    """
+    global _grid_pool, _grid_pool_key
+    with _grid_pool_lock:
+        if _grid_pool is pool:
+            _grid_pool = None
+            _grid_pool_key = None
+    pool.shutdown(wait=False)
+
+
+def shutdown_grid_pool() -> None:
+    """
+    应用退出时关闭网格拼图进程池
+    """
+    global _grid_pool, _grid_pool_key
+    with _grid_pool_lock:
+        if _grid_pool is not None:
+            _grid_pool.shutdown(wait=False, cancel_futures=True)
+        _grid_pool = None
+        _grid_pool_key = None
+
+
 class VideoReader:
     def __init__(self,
                  video_path: str,
                  grid_size=(3, 3),
-                 frame_interval=2,
+                 frame_interval=DEFAULT_FRAME_INTERVAL,
                  unit_width=960,
                  unit_height=540,
                  save_quality=90,
                  font_path="fonts/arial.ttf",
                  frame_dir=None,
-                 grid_dir=None):
+                 grid_dir=None,
+                 budget: ImageBudget = None,
+                 max_frames: int = 1000,
+                 keep_artifacts: bool = None,
+                 frame_selection: str = None,
+                 keyframe_config: KeyframeConfig = None,
+                 task_id: str = None):
         self.video_path = video_path
         self.grid_size = grid_size
-        self.frame_interval = frame_interval
+        self.frame_interval = frame_interval if frame_interval and frame_interval > 0 else DEFAULT_FRAME_INTERVAL
         self.unit_width = unit_width
         self.unit_height = unit_height
         self.save_quality = save_quality
-        self.frame_dir = frame_dir or get_app_dir("output_frames")
-        self.grid_dir = grid_dir or get_app_dir("grid_output")
-        print(f"视频路径：{video_path}",self.frame_dir,self.grid_dir)
+        # 每个任务独立的工作目录，并发任务互不干扰；未显式指定 frame_dir / grid_dir 时使用
+        self.workspace = os.path.join(get_app_dir("video_workspace"), task_id or uuid.uuid4().hex)
+        self.owns_workspace = frame_dir is None and grid_dir is None
+        self.frame_dir = frame_dir or os.path.join(self.workspace, "frames")
+        self.grid_dir = grid_dir or os.path.join(self.workspace, "grids")
         self.font_path = font_path
+        self.budget = budget
+        self.max_frames = max_frames
+        # 是否把帧和网格图写到磁盘（仅用于调试），默认读取 VIDEO_KEEP_ARTIFACTS
+        if keep_artifacts is None:
+            keep_artifacts = os.getenv("VIDEO_KEEP_ARTIFACTS", "false").lower() == "true"
+        self.keep_artifacts = keep_artifacts
+        # interval：固定间隔截帧；keyframe：按感知哈希去重，只保留画面不同的帧
+        self.frame_selection = (frame_selection or os.getenv("VIDEO_FRAME_SELECTION", "interval")).lower()
+        self.keyframe_config = keyframe_config or KeyframeConfig.from_env()
+        # 最近一次 run() 的载荷统计（网格数、分辨率、质量、字节数、token 估算、各阶段耗时）
+        self.payload_stats: dict = {}
+
+    @staticmethod
+    def format_time(seconds: float) -> str:
+        return format_time(seconds)
 
-    def format_time(self, seconds: float) -> str:
-        mm = int(seconds // 60)
-        ss = int(seconds % 60)
-        return f"{mm:02d}_{ss:02d}"
+    def probe_duration(self) -> float:
+        return get_duration(self.video_path)
 
-    def extract_time_from_filename(self, filename: str) -> float:
-        match = re.search(r"frame_(\d{2})_(\d{2})\.jpg", filename)
-        if match:
-            mm, ss = map(int, match.groups())
-            return mm * 60 + ss
-        return float('inf')
+    def plan_frames(self, duration: float) -> int:
+        """
+        根据时长、截帧间隔与载荷预算确定要抽取的帧数；预算放不下时拉大截帧间隔，
+        保证抽到的帧仍均匀覆盖整段视频，同时按预算调整单元分辨率与 JPEG 质量
+        """
+        frame_count = min(self.max_frames, max(1, math.ceil(duration / self.frame_interval)))
+        allowed = self._budget_frames(frame_count)
+        if allowed < frame_count:
+            self.frame_interval = duration / allowed
+            frame_count = allowed
+        return frame_count
 
-    def extract_frames(self, max_frames=1000) -> list[str]:
+    def _budget_frames(self, frame_count: int) -> int:
+        """
+        按载荷预算调整单元分辨率与 JPEG 质量，返回预算允许的帧数
+        """
+        if not self.budget:
+            return frame_count
+        plan = plan_grids(
+            frame_count,
+            self.grid_size,
+            self.budget,
+            unit_width=self.unit_width,
+            unit_height=self.unit_height,
+            quality=self.save_quality,
+        )
+        self.unit_width = plan.unit_width
+        self.unit_height = plan.unit_height
+        self.save_quality = plan.quality
+        self.payload_stats["plan"] = plan.to_dict()
+        logger.info(
+            f"网格载荷预算：{plan.grid_count} 张网格，单元 {plan.unit_width}x{plan.unit_height}，"
+            f"质量 {plan.quality}，预估 {plan.est_bytes / 1024:.0f}KB / {plan.est_tokens} tokens"
+        )
+        return plan.grid_count * plan.frames_per_grid
 
+    def hash_frames(self, frame_count: int) -> np.ndarray:
+        """
+        按截帧间隔解码一遍极小的灰度帧（9x8），批量计算 dHash
+        """
+        vf = f"fps=1/{self.frame_interval:.6f},scale={HASH_WIDTH}:{HASH_HEIGHT}:flags=area"
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", self.video_path,
+               "-vf", vf, "-frames:v", str(frame_count), "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        size = HASH_WIDTH * HASH_HEIGHT
+        count = len(result.stdout) // size
+        frames = np.frombuffer(result.stdout[:count * size], dtype=np.uint8).reshape(count, HASH_HEIGHT, HASH_WIDTH)
+        return dhash(frames)
+
+    def plan_keyframes(self, duration: float) -> List[int]:
+        """
+        关键帧模式：按截帧间隔取候选帧，去掉与上一张保留帧几乎相同的画面，
+        再受 max_frames 与载荷预算约束；返回保留帧在候选帧中的下标
+        """
+        candidates = min(self.max_frames, max(1, math.ceil(duration / self.frame_interval)))
+        hashes = self.hash_frames(candidates)
+        indices = select_keyframes(hashes, self.keyframe_config, self.max_frames)
+        allowed = self._budget_frames(len(indices))
+        if allowed < len(indices):
+            indices = select_keyframes(hashes, self.keyframe_config, allowed)
+        self.payload_stats["candidates"] = len(hashes)
+        logger.info(f"关键帧去重：{len(hashes)} 张候选帧保留 {len(indices)} 张")
+        return indices
+
+    def iter_frames(self, frame_count: int,
+                    indices: Optional[List[int]] = None) -> Iterator[tuple[np.ndarray, float]]:
+        """
+        一次 ffmpeg 解码按 fps=1/interval 抽帧并缩放到网格单元尺寸，以 rawvideo 经管道输出，
+        逐帧读入内存，不落盘
+
+        :param indices: 只输出这些候选帧（关键帧模式），时间点仍按候选帧下标计算
+        :return: 依次产出 (H x W x 3 的 RGB 数组, 时间点秒数)
+        """
+        vf = f"fps=1/{self.frame_interval:.6f}"
+        if indices is not None:
+            vf += ",select='" + "+".join(f"eq(n\\,{i})" for i in indices) + "'"
+            frame_count = len(indices)
+        vf += f",scale={self.unit_width}:{self.unit_height}"
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", self.video_path,
+               "-vf", vf, "-vsync", "passthrough", "-frames:v", str(frame_count),
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+        frame_size = self.unit_width * self.unit_height * 3
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         try:
-            os.makedirs(self.frame_dir, exist_ok=True)
-            duration = float(ffmpeg.probe(self.video_path)["format"]["duration"])
-            timestamps = [i for i in range(0, int(duration), self.frame_interval)][:max_frames]
-
-            image_paths = []
-            for ts in timestamps:
-                time_label = self.format_time(ts)
-                output_path = os.path.join(self.frame_dir, f"frame_{time_label}.jpg")
-                cmd = ["ffmpeg", "-ss", str(ts), "-i", self.video_path, "-frames:v", "1", "-q:v", "2", "-y", output_path,
-                       "-hide_banner", "-loglevel", "error"]
-                subprocess.run(cmd, check=True)
-                image_paths.append(output_path)
-            return image_paths
-        except Exception as e:
-            logger.error(f"分割帧发生错误：{str(e)}")
-            raise ValueError("视频处理失败")
+            index = 0
+            while True:
+                buffer = process.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                frame = np.frombuffer(buffer, dtype=np.uint8).reshape(self.unit_height, self.unit_width, 3)
+                position = indices[index] if indices is not None else index
+                yield frame, position * self.frame_interval
+                index += 1
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            stderr = process.stderr.read().decode("utf-8", errors="ignore").strip()
+            process.stderr.close()
+            if process.wait() != 0 and stderr:
+                logger.error(f"分割帧发生错误：{stderr}")
+
+    def _submit_grid(self, group: List[tuple[np.ndarray, float]], pool: Optional[ProcessPoolExecutor],
+                     font) -> Future:
+        """
+        拼图并编码一组帧：有进程池时提交到池中，否则在当前进程内完成
+        """
+        if pool is not None:
+            return pool.submit(render_grid, group, self.grid_size, self.unit_width, self.unit_height,
+                               self.save_quality)
+        future = Future()
+        future.set_result(encode_jpeg(
+            compose_grid(group, self.grid_size, self.unit_width, self.unit_height, font), self.save_quality
+        ))
+        return future
 
-    def group_images(self) -> list[list[str]]:
-        image_files = [os.path.join(self.frame_dir, f) for f in os.listdir(self.frame_dir) if
-                       f.startswith("frame_") and f.endswith(".jpg")]
-        image_files.sort(key=lambda f: self.extract_time_from_filename(os.path.basename(f)))
-        group_size = self.grid_size[0] * self.grid_size[1]
-        return [image_files[i:i + group_size] for i in range(0, len(image_files), group_size)]
+    def _shrink_to_byte_budget(self, encoded: list[bytes]) -> list[bytes]:
+        """
+        预估偏差导致实际字节超出预算时，逐级降低 JPEG 质量，用已编码的网格图重新编码
+        """
+        if not self.budget or not self.budget.max_total_bytes:
+            return encoded
+        quality = self.save_quality
+        while quality > 30:
+            total = sum(len(data) for data in encoded) * 4 // 3
+            if total <= self.budget.max_total_bytes:
+                break
+            quality -= 10
+            logger.info(f"网格图 {total / 1024:.0f}KB 超出预算，降低质量到 {quality} 重新编码")
+            encoded = [encode_jpeg(Image.open(io.BytesIO(data)), quality) for data in encoded]
+            self.save_quality = quality
+        return encoded
 
-    def concat_images(self, image_paths: list[str], name: str) -> str:
+    def _save_frame(self, frame: np.ndarray, index: int) -> None:
+        """
+        调试用：把单帧写到 frame_dir
+        """
+        os.makedirs(self.frame_dir, exist_ok=True)
+        Image.fromarray(frame).save(os.path.join(self.frame_dir, f"frame_{index:05d}.jpg"), quality=self.save_quality)
+
+    def _save_artifacts(self, encoded: list[bytes]) -> None:
+        """
+        调试用：把网格图写到 grid_dir
+        """
         os.makedirs(self.grid_dir, exist_ok=True)
-        font = ImageFont.truetype(self.font_path, 48) if os.path.exists(self.font_path) else ImageFont.load_default()
-        images = []
-
-        for path in image_paths:
-            img = Image.open(path).convert("RGB").resize((self.unit_width, self.unit_height), Image.Resampling.LANCZOS)
-            timestamp = re.search(r"frame_(\d{2})_(\d{2})\.jpg", os.path.basename(path))
-            time_text = f"{timestamp.group(1)}:{timestamp.group(2)}" if timestamp else ""
-            draw = ImageDraw.Draw(img)
-            draw.text((10, 10), time_text, fill="yellow", font=font, stroke_width=1, stroke_fill="black")
-            images.append(img)
-
-        cols, rows = self.grid_size
-        grid_img = Image.new("RGB", (self.unit_width * cols, self.unit_height * rows), (255, 255, 255))
-
-        for i, img in enumerate(images):
-            x = (i % cols) * self.unit_width
-            y = (i // cols) * self.unit_height
-            grid_img.paste(img, (x, y))
-
-        save_path = os.path.join(self.grid_dir, f"{name}.jpg")
-        grid_img.save(save_path, quality=self.save_quality)
-        return save_path
-
-    def encode_images_to_base64(self, image_paths: list[str]) -> list[str]:
-        base64_images = []
-        for path in image_paths:
-            with open(path, "rb") as img_file:
-                encoded_string = base64.b64encode(img_file.read()).decode("utf-8")
-                base64_images.append(f"data:image/jpeg;base64,{encoded_string}")
-        return base64_images
+        for index, data in enumerate(encoded, start=1):
+            with open(os.path.join(self.grid_dir, f"grid_{index}.jpg"), "wb") as f:
+                f.write(data)
+
+    def cleanup(self) -> None:
+        """
+        删除本任务的工作目录（只处理自己创建的目录，不影响其他任务）
+        """
+        if self.owns_workspace:
+            shutil.rmtree(self.workspace, ignore_errors=True)
+
+    @staticmethod
+    def encode_images_to_base64(images: list[bytes]) -> list[str]:
+        return [f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}" for data in images]
 
     def run(self)->list[str]:
         logger.info("开始提取视频帧...")
+        # 同一任务重跑时先清掉上次的调试产物，避免新旧帧混在一起
+        self.cleanup()
+        pool = None
         try:
-            # 确保目录存在
-            print(self.frame_dir,self.grid_dir)
-            os.makedirs(self.frame_dir, exist_ok=True)
-            os.makedirs(self.grid_dir, exist_ok=True)
-            #清空帧文件夹
-            for file in os.listdir(self.frame_dir):
-                if file.startswith("frame_"):
-                    os.remove(os.path.join(self.frame_dir, file))
-            print(self.frame_dir,self.grid_dir)
-            #清空网格文件夹
-            for file in os.listdir(self.grid_dir):
-                if file.startswith("grid_"):
-                    os.remove(os.path.join(self.grid_dir, file))
-            print(self.frame_dir,self.grid_dir)
-            self.extract_frames()
-            print("2#3",self.frame_dir,self.grid_dir)
-            logger.info("开始拼接网格图...")
-            image_paths = []
-            groups = self.group_images()
-            for idx, group in enumerate(groups, start=1):
-                if len(group) < self.grid_size[0] * self.grid_size[1]:
-                    logger.warning(f"⚠️ 跳过第 {idx} 组，图片不足 {self.grid_size[0] * self.grid_size[1]} 张")
-                    continue
-                out_path = self.concat_images(group, f"grid_{idx}")
-                image_paths.append(out_path)
+            timings = {}
+            self.payload_stats = {}
+
+            started = time.perf_counter()
+            duration = self.probe_duration()
+            if self.frame_selection == "keyframe":
+                indices = self.plan_keyframes(duration)
+                frames = self.iter_frames(len(indices), indices)
+            else:
+                frames = self.iter_frames(self.plan_frames(duration))
+            timings["probe"] = time.perf_counter() - started
+
+            # 边解码边拼图：凑满一组就提交拼图与编码，进程池并行处理，解码不必等待拼图
+            group_size = self.grid_size[0] * self.grid_size[1]
+            workers = grid_workers()
+            pool = get_grid_pool(workers, self.font_path) if workers > 1 else None
+            font = None if pool is not None else load_font(self.font_path)
+            futures, group, frame_total = [], [], 0
+            submit_time = 0.0
+            started = time.perf_counter()
+            for frame, seconds in frames:
+                if self.keep_artifacts:
+                    self._save_frame(frame, frame_total)
+                frame_total += 1
+                group.append((frame, seconds))
+                if len(group) == group_size:
+                    submitted = time.perf_counter()
+                    futures.append(self._submit_grid(group, pool, font))
+                    submit_time += time.perf_counter() - submitted
+                    group = []
+            if group and self.frame_selection == "keyframe":
+                # 关键帧本就稀少，不足一组时留白拼成最后一张网格
+                submitted = time.perf_counter()
+                futures.append(self._submit_grid(group, pool, font))
+                submit_time += time.perf_counter() - submitted
+            elif group:
+                logger.warning(f"⚠️ 跳过最后 {len(group)} 帧，不足一组 {group_size} 张")
+            timings["extract"] = time.perf_counter() - started - submit_time
+
+            # 按提交顺序取回结果，保证网格与时间顺序一致
+            started = time.perf_counter()
+            encoded = [future.result() for future in futures]
+            timings["compose"] = submit_time + time.perf_counter() - started
 
             logger.info("📤 开始编码图像...")
-            urls = self.encode_images_to_base64(image_paths)
+            started = time.perf_counter()
+            encoded = self._shrink_to_byte_budget(encoded)
+            urls = self.encode_images_to_base64(encoded)
+            timings["encode"] = time.perf_counter() - started
+            if self.keep_artifacts:
+                self._save_artifacts(encoded)
+
+            self.payload_stats.update({
+                "frame_selection": self.frame_selection,
+                "frame_count": frame_total,
+                "frame_interval": round(self.frame_interval, 3),
+                "grid_count": len(urls),
+                "unit_width": self.unit_width,
+                "unit_height": self.unit_height,
+                "quality": self.save_quality,
+                "grid_workers": workers if pool is not None else 1,
+                "payload_bytes": sum(len(u) for u in urls),
+                "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+            })
+            logger.info(
+                f"网格图载荷：{len(urls)} 张，共 {self.payload_stats['payload_bytes'] / 1024:.0f}KB，"
+                f"耗时 {self.payload_stats['timings']}"
+            )
             return urls
         except Exception as e:
             logger.error(f"发生错误：{str(e)}")
+            if isinstance(e, BrokenProcessPool) and pool is not None:
+                # 工作进程异常退出后进程池不可再用，下次重建
+                discard_grid_pool(pool)
             raise ValueError("视频处理失败")
-
-
+        finally:
+            if not self.keep_artifacts:
+                self.cleanup()
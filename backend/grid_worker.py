@@ -0,0 +1,62 @@
+"""
+grid_worker.py — 网格拼图进程池的工作函数
+
+工作进程以 spawn / forkserver 启动时会导入任务函数所在的模块。这里只依赖 numpy 与 Pillow，
+不导入 app 包（app/__init__ 会加载全部路由、转写器与数据库），也不导入 main，
+工作进程启动时不会重复执行服务的初始化逻辑。
+"""
+import io
+import os
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 进程池工作进程内的字体，每个进程只加载一次
+_worker_font = None
+
+
+def load_font(font_path: str):
+    return ImageFont.truetype(font_path, 48) if os.path.exists(font_path) else ImageFont.load_default()
+
+
+def format_time(seconds: float) -> str:
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def compose_grid(frames: List[tuple[np.ndarray, float]], grid_size: Tuple[int, int],
+                 unit_width: int, unit_height: int, font) -> Image.Image:
+    """
+    把一组帧按行优先拼成网格，并在每个单元左上角标注时间点
+    """
+    cols, rows = grid_size
+    grid_img = Image.new("RGB", (unit_width * cols, unit_height * rows), (255, 255, 255))
+    draw = ImageDraw.Draw(grid_img)
+    for i, (frame, seconds) in enumerate(frames):
+        x = (i % cols) * unit_width
+        y = (i // cols) * unit_height
+        grid_img.paste(Image.fromarray(frame), (x, y))
+        draw.text((x + 10, y + 10), format_time(seconds), fill="yellow", font=font,
+                  stroke_width=1, stroke_fill="black")
+    return grid_img
+
+
+def encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def init_grid_worker(font_path: str) -> None:
+    global _worker_font
+    _worker_font = load_font(font_path)
+
+
+def render_grid(frames: List[tuple[np.ndarray, float]], grid_size: Tuple[int, int],
+                unit_width: int, unit_height: int, quality: int) -> bytes:
+    """
+    进程池任务：拼一张网格并编码为 JPEG
+    """
+    return encode_jpeg(compose_grid(frames, grid_size, unit_width, unit_height, _worker_font), quality)
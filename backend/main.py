@@ -1,4 +1,12 @@
+import multiprocessing
+
+if __name__ == "__main__":
+    # 打包后的可执行文件中，进程池工作进程会重新执行入口；必须在导入应用、初始化服务之前处理
+    multiprocessing.freeze_support()
+
+import asyncio
 import os
+import re
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -10,9 +18,12 @@ from dotenv import load_dotenv
 from app.db.init_db import init_db
 from app.db.provider_dao import seed_default_providers
 from app.exceptions.exception_handlers import register_exception_handlers
+from app.gpt.provider.client_cache import aclose_all as close_llm_clients
+from app.services.provider_monitor import run_health_loop as run_provider_health_loop
 # from app.db.model_dao import init_model_table
 # from app.db.provider_dao import init_provider_table
 from app.utils.logger import get_logger
+from app.utils.video_reader import shutdown_grid_pool
 from app import create_app
 from app.transcriber.transcriber_provider import get_transcriber
 from app.utils.env_checker import ensure_optimal_runtime
@@ -53,7 +64,11 @@ async def lifespan(app: FastAPI):
         device=os.environ.get("WHISPER_DEVICE", "cpu")
     )
     seed_default_providers()
+    health_task = asyncio.create_task(run_provider_health_loop())
     yield
+    health_task.cancel()
+    await close_llm_clients()
+    shutdown_grid_pool()
 
 app = create_app(lifespan=lifespan)
 origins = [
@@ -67,8 +82,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 截图以内容哈希命名，内容不变 URL 就不变，允许浏览器长期缓存
+_HASHED_SCREENSHOT = re.compile(r"/screenshot_[0-9a-f]{16}\.(?:jpg|webp|avif)$")
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    在静态文件挂载内给哈希命名的截图加长期缓存头；不用 HTTP 中间件，
+    以免 BaseHTTPMiddleware 包住其他路由的 SSE 流式响应
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _HASHED_SCREENSHOT.search(scope["path"]):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
 register_exception_handlers(app)
-app.mount(static_path, StaticFiles(directory=static_dir), name="static")
+app.mount(static_path, CachedStaticFiles(directory=static_dir), name="static")
 app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 让 tests 在任意目录下运行时都能 import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+from app.utils import video_reader
+
+
+class FakePool:
+    def __init__(self):
+        self.shutdown_calls = []
+
+    def shutdown(self, **kwargs):
+        self.shutdown_calls.append(kwargs)
+
+
+def test_discard_replaces_current_pool_without_cancelling_futures(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(video_reader, "_grid_pool", pool)
+    monkeypatch.setattr(video_reader, "_grid_pool_key", (2, "font"))
+
+    video_reader.discard_grid_pool(pool)
+
+    assert video_reader._grid_pool is None
+    assert pool.shutdown_calls == [{"wait": False}]
+
+
+def test_discard_keeps_a_pool_already_rebuilt_by_another_task(monkeypatch):
+    stale, current = FakePool(), FakePool()
+    monkeypatch.setattr(video_reader, "_grid_pool", current)
+    monkeypatch.setattr(video_reader, "_grid_pool_key", (2, "font"))
+
+    video_reader.discard_grid_pool(stale)
+
+    assert video_reader._grid_pool is current
+    assert current.shutdown_calls == []
+
+
+def test_grid_pool_does_not_fork_the_server_process():
+    assert video_reader._GRID_START_METHOD in ("forkserver", "spawn")
+
+
+def test_grid_workers_default_to_serial(monkeypatch):
+    monkeypatch.delenv("VIDEO_GRID_WORKERS", raising=False)
+    assert video_reader.grid_workers() == 0
+    monkeypatch.setenv("VIDEO_GRID_WORKERS", "")
+    assert video_reader.grid_workers() == 0
+    monkeypatch.setenv("VIDEO_GRID_WORKERS", "3")
+    assert video_reader.grid_workers() == 3
+    monkeypatch.setenv("VIDEO_GRID_WORKERS", "auto")
+    assert 0 <= video_reader.grid_workers() <= 4
+
+
+def test_worker_module_does_not_import_the_app_package():
+    code = "import sys, grid_worker; print('app' in sys.modules or 'main' in sys.modules)"
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
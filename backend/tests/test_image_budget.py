@@ -0,0 +1,42 @@
+from app.utils.image_budget import (
+    ImageBudget, estimate_vision_tokens, plan_grids, subsample_evenly,
+)
+
+
+def test_unlimited_budget_keeps_full_quality():
+    plan = plan_grids(90, (3, 3), ImageBudget())
+    assert (plan.unit_width, plan.unit_height, plan.quality) == (1280, 720, 90)
+    assert plan.grid_count == 10
+
+
+def test_byte_budget_lowers_resolution_before_dropping_grids():
+    budget = ImageBudget(max_total_bytes=4 * 1024 * 1024)
+    plan = plan_grids(90, (3, 3), budget)
+    assert plan.grid_count == 10
+    assert plan.unit_width < 1280
+    assert plan.quality >= 70
+    assert plan.est_bytes <= budget.max_total_bytes
+
+
+def test_tight_budget_drops_grids_but_keeps_one():
+    plan = plan_grids(90, (3, 3), ImageBudget(max_total_bytes=1))
+    assert plan.grid_count == 1
+    assert plan.unit_width == 320
+
+
+def test_token_budget_limits_grid_count():
+    per_grid = estimate_vision_tokens(320 * 3, 180 * 3)
+    plan = plan_grids(90, (3, 3), ImageBudget(max_image_tokens=per_grid * 4), unit_width=320, unit_height=180)
+    assert plan.grid_count == 4
+    assert plan.est_tokens <= per_grid * 4
+
+
+def test_estimate_vision_tokens():
+    assert estimate_vision_tokens(512, 512) == 85 + 170  # 不放大，单块
+    assert estimate_vision_tokens(3840, 2160) == 85 + 170 * 6
+
+
+def test_subsample_evenly_preserves_order_and_coverage():
+    assert subsample_evenly(list(range(10)), 5) == [0, 2, 4, 6, 8]
+    assert subsample_evenly([1, 2], 5) == [1, 2]
+    assert subsample_evenly([1, 2], 0) == []
@@ -0,0 +1,89 @@
+import pytest
+
+from app.downloaders import info_cache
+
+
+class FakeYDL:
+    """记录构造参数与调用次数的 YoutubeDL 替身"""
+    instances = []
+
+    def __init__(self, params):
+        self.params = params
+        self.extract_calls = 0
+        FakeYDL.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False, process=True):
+        self.extract_calls += 1
+        subtitles = {"zh": [{"url": "x"}]} if self.params.get("writesubtitles") else {}
+        return {"id": "v1", "url": url, "subtitles": subtitles}
+
+    def process_ie_result(self, info, download=True):
+        info["processed_with"] = self.params
+        return info
+
+
+@pytest.fixture(autouse=True)
+def fake_ydl(monkeypatch):
+    FakeYDL.instances = []
+    monkeypatch.setattr(info_cache.yt_dlp, "YoutubeDL", FakeYDL)
+    info_cache._cache.clear()
+    info_cache._key_locks.clear()
+    yield
+    info_cache._cache.clear()
+    info_cache._key_locks.clear()
+
+
+def extract_count():
+    return sum(ydl.extract_calls for ydl in FakeYDL.instances)
+
+
+def test_cache_key_uses_url_cookies_and_proxy_only():
+    a = info_cache._cache_key("u", {"format": "bestaudio", "cookiefile": "c.txt", "proxy": "p"})
+    b = info_cache._cache_key("u", {"format": "bv*", "cookiefile": "c.txt", "proxy": "p"})
+    assert a == b == ("u", "c.txt", "p")
+    assert info_cache._cache_key("u", {"cookiefile": "other.txt"}) != a
+    assert info_cache._cache_key("u", {}) == ("u", None, None)
+
+
+def test_metadata_is_extracted_once_per_key():
+    info_cache.extract_info("u", {"format": "bestaudio"})
+    info_cache.extract_info("u", {"format": "bv*"})
+    assert extract_count() == 1
+    info_cache.extract_info("u", {"format": "bv*", "proxy": "p"})
+    assert extract_count() == 2
+
+
+def test_subtitles_survive_a_prior_download_call():
+    # 先下载音频（未开启字幕），再取字幕：缓存结果里必须仍有字幕列表
+    info_cache.extract_info("u", {"format": "bestaudio"})
+    info = info_cache.extract_info("u", {"writesubtitles": True, "skip_download": True})
+    assert extract_count() == 1
+    assert info["subtitles"]
+
+
+def test_each_call_processes_with_its_own_options():
+    first = info_cache.extract_info("u", {"format": "bestaudio"})
+    second = info_cache.extract_info("u", {"format": "bv*"})
+    assert first["processed_with"]["format"] == "bestaudio"
+    assert second["processed_with"]["format"] == "bv*"
+    assert "writesubtitles" not in first["processed_with"]
+
+
+def test_expired_entries_are_extracted_again(monkeypatch):
+    info_cache.extract_info("u", {})
+    monkeypatch.setenv("YTDLP_INFO_TTL", "0")
+    info_cache.extract_info("u", {})
+    assert extract_count() == 2
+
+
+def test_invalidate_drops_all_keys_for_url():
+    info_cache.extract_info("u", {})
+    info_cache.extract_info("u", {"proxy": "p"})
+    info_cache.invalidate("u")
+    assert info_cache._cache == {}
@@ -0,0 +1,26 @@
+import os
+import shutil
+
+from sqlalchemy import create_engine, inspect
+
+from app.db.engine import Base
+from app.db.init_db import _add_missing_columns
+import app.db.init_db  # noqa: F401  注册全部模型
+
+
+def test_shipped_database_is_migrated_at_runtime(tmp_path):
+    # 仓库中的 bili_note.db 保持原始结构，新表与新列在启动时由 init_db 补齐
+    shipped = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bili_note.db")
+    db_path = tmp_path / "bili_note.db"
+    shutil.copy(shipped, db_path)
+    engine = create_engine(f"sqlite:///{db_path}")
+
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns(engine)
+
+    inspector = inspect(engine)
+    provider_columns = {col["name"] for col in inspector.get_columns("providers")}
+    assert {"rpm", "tpm", "max_concurrency"} <= provider_columns
+    usage_columns = {col["name"] for col in inspector.get_columns("llm_usage")}
+    assert {"outcome", "attempt", "payload_bytes"} <= usage_columns
+    engine.dispose()
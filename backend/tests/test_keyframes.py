@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.utils.keyframes import HASH_HEIGHT, HASH_WIDTH, KeyframeConfig, dhash, hamming, select_keyframes
+
+
+def bits(pattern: int, count: int = 64) -> np.ndarray:
+    # 前 pattern 位为 1 的哈希
+    row = np.zeros(count, dtype=bool)
+    row[:pattern] = True
+    return row
+
+
+def test_dhash_shape_and_identical_frames():
+    frames = np.random.default_rng(0).integers(0, 255, (3, HASH_HEIGHT, HASH_WIDTH), dtype=np.uint8)
+    frames[1] = frames[0]
+    hashes = dhash(frames)
+    assert hashes.shape == (3, 64)
+    assert hamming(hashes[0], hashes[1]) == 0
+
+
+def test_near_duplicates_are_dropped():
+    hashes = np.stack([bits(0), bits(2), bits(30), bits(31), bits(60)])
+    kept = select_keyframes(hashes, KeyframeConfig(threshold=10, min_frames=0), limit=0)
+    assert kept == [0, 2, 4]
+
+
+def test_min_frames_fills_evenly_from_remaining_frames():
+    hashes = np.stack([bits(0)] * 10)
+    kept = select_keyframes(hashes, KeyframeConfig(threshold=10, min_frames=4), limit=0)
+    assert len(kept) == 4
+    assert kept[0] == 0 and kept == sorted(kept)
+
+
+def test_limit_keeps_first_frame_and_largest_changes():
+    hashes = np.stack([bits(0), bits(12), bits(40), bits(52), bits(64)])
+    # 与上一张保留帧的距离依次为 12、28、12、12
+    kept = select_keyframes(hashes, KeyframeConfig(threshold=10, min_frames=0), limit=2)
+    assert kept == [0, 2]
+    kept = select_keyframes(hashes, KeyframeConfig(threshold=10, min_frames=0, max_frames=3), limit=4)
+    assert len(kept) == 3 and {0, 2} <= set(kept)
+
+
+def test_empty_input():
+    assert select_keyframes(np.zeros((0, 64), dtype=bool), KeyframeConfig(), limit=5) == []
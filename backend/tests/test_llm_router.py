@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import openai
+
+from app.gpt.llm_router import LatencyTracker, RouteTarget, RoutedGPT, _percentile
+from app.gpt.universal_gpt import UniversalGPT
+
+
+def rate_limit_error() -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://example.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": "30"}, request=request)
+    return openai.RateLimitError("busy", response=response, body=None)
+
+
+class FakeAsyncClient:
+    def __init__(self, reply=None, error=None):
+        self.calls = 0
+        self.reply = reply
+        self.error = error
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        message = type("M", (), {"content": self.reply})()
+        return type("R", (), {"usage": None, "choices": [type("C", (), {"message": message})()]})()
+
+
+def make_gpt(provider_id, client):
+    sync_client = type("S", (), {"base_url": "http://" + provider_id})()
+    return UniversalGPT(sync_client, "m", async_client_factory=lambda: client, provider_id=provider_id)
+
+
+def test_percentile():
+    assert _percentile([], 0.5) is None
+    assert _percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.5) == 3.0
+    assert _percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.95) == 5.0
+
+
+def test_latency_tracker_stats_and_window():
+    tracker = LatencyTracker(window=4)
+    for latency in (1.0, 2.0, 3.0):
+        tracker.record("p", "m", latency, ok=True)
+    tracker.record("p", "m", 9.0, ok=False)
+    stats = tracker.stats("p", "m")
+    assert stats["count"] == 4
+    assert stats["p50"] == 2.0
+    assert stats["error_rate"] == 0.25
+    tracker.record("p", "m", 4.0, ok=True)  # 挤出最早的样本
+    assert tracker.stats("p", "m")["count"] == 4
+    assert tracker.stats("other", "m") is None
+
+
+def test_routed_targets_fail_over_without_inner_backoff(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTED_MAX_RETRIES", "0")
+    failing = FakeAsyncClient(error=rate_limit_error())
+    healthy = FakeAsyncClient(reply="ok")
+    routed = RoutedGPT([
+        RouteTarget("route-a", "m", make_gpt("route-a", failing)),
+        RouteTarget("route-b", "m", make_gpt("route-b", healthy)),
+    ])
+
+    started = time.perf_counter()
+    reply = asyncio.run(routed.achat([{"role": "user", "content": "hi"}], use_cache=False))
+    assert reply == "ok"
+    # 主供应商返回 Retry-After: 30，但不在其内部等待重试
+    assert time.perf_counter() - started < 5
+    assert failing.calls == 1
+    assert routed.served_by == {"provider_id": "route-b", "model_name": "m"}
+
+
+def test_routed_max_retries_is_configurable(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTED_MAX_RETRIES", "2")
+    monkeypatch.setenv("LLM_MAX_RETRIES", "4")
+    gpt = make_gpt("route-c", FakeAsyncClient(reply="ok"))
+    RoutedGPT([RouteTarget("route-c", "m", gpt)])
+    assert gpt.max_retries == 2
+    assert make_gpt("route-d", FakeAsyncClient(reply="ok"))._max_retries() == 4
+
+
+def test_only_provider_side_failures_count_as_errors(monkeypatch):
+    from app.gpt.llm_router import latency_tracker
+
+    monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+    request = httpx.Request("POST", "https://example.com/v1/chat/completions")
+    bad_request = openai.BadRequestError("context too long", response=httpx.Response(400, request=request), body=None)
+    server_error = openai.InternalServerError("down", response=httpx.Response(503, request=request), body=None)
+
+    for provider_id, error in (("track-400", bad_request), ("track-503", server_error)):
+        gpt = make_gpt(provider_id, FakeAsyncClient(error=error))
+        try:
+            asyncio.run(gpt.achat([{"role": "user", "content": "hi"}], use_cache=False))
+        except openai.APIStatusError:
+            pass
+    assert latency_tracker.stats("track-400", "m") is None
+    assert latency_tracker.stats("track-503", "m")["error_rate"] == 1.0
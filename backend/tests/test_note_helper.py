@@ -0,0 +1,35 @@
+from app.utils.note_helper import content_link, find_markers, rewrite_markers
+
+
+def test_find_markers_supports_all_forms():
+    markdown = "a *Content-04:16* b Content-[01:02:03] c Screenshot-05:00 d *Screenshot-[00:07]"
+    markers = find_markers(markdown)
+    assert [(m.kind, m.seconds) for m in markers] == [
+        ("Content", 256), ("Content", 3723), ("Screenshot", 300), ("Screenshot", 7),
+    ]
+    assert [m.text for m in markers][0] == "*Content-04:16*"
+    assert markers[1].label == "01:02:03"
+
+
+def test_find_markers_keeps_adjacent_emphasis():
+    markdown = "**重点 Content-04:16**"
+    marker = find_markers(markdown)[0]
+    assert marker.text == "Content-04:16"
+    assert markdown[marker.end:] == "**"
+
+
+def test_find_markers_accepts_long_minutes():
+    assert find_markers("Content-123:45")[0].seconds == 123 * 60 + 45
+
+
+def test_rewrite_markers_replaces_selected_and_keeps_the_rest():
+    markdown = "开头 *Content-00:10* 中间 Screenshot-00:20 结尾"
+    markers = find_markers(markdown)
+    assert rewrite_markers(markdown, markers, {0: "[link]"}) == "开头 [link] 中间 Screenshot-00:20 结尾"
+    assert rewrite_markers(markdown, markers, {}) == markdown
+
+
+def test_content_link_per_platform():
+    assert content_link(75, "BV1xx_p2") == "[原片 @ 01:15](https://www.bilibili.com/video/BV1xx?p=2&t=75)"
+    assert content_link(75, "abc", "youtube").endswith("(https://www.youtube.com/watch?v=abc&t=75s)")
+    assert content_link(75, "abc", "local") == "(01:15)"
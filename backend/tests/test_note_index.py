@@ -0,0 +1,59 @@
+import json
+import os
+
+from app.utils.note_index import (
+    BM25Index, Chunk, get_note_index, split_note, split_transcript, tokenize, truncate_history,
+)
+
+
+def test_tokenize_mixes_words_and_cjk_bigrams():
+    assert tokenize("GPU 加速") == ["gpu", "加", "速", "加速"]
+
+
+def test_split_note_by_heading_with_timestamps():
+    markdown = "前言\n\n## 安装 *Content-[01:05]\n\n步骤一\n\n## 配置\n\n修改参数"
+    chunks = split_note(markdown)
+    assert [c.title for c in chunks] == [None, "安装 *Content-[01:05]", "配置"]
+    assert chunks[1].start == 65
+    assert chunks[1].timestamp == "01:05"
+
+
+def test_split_transcript_merges_segments_and_keeps_start():
+    segments = [{"start": 10, "text": "a" * 300}, {"start": 20, "text": "b" * 200}, {"start": 30, "text": "c"}]
+    chunks = split_transcript(segments)
+    assert [c.start for c in chunks] == [10, 30]
+
+
+def test_bm25_ranks_relevant_chunks_first():
+    index = BM25Index([
+        Chunk("note", "安装 Python 与依赖"),
+        Chunk("note", "配置 CUDA 加速 GPU 推理"),
+        Chunk("transcript", "今天天气不错", start=5),
+    ])
+    results = index.search("怎么开启 GPU 加速", top_k=2)
+    assert results[0].text == "配置 CUDA 加速 GPU 推理"
+    assert all("GPU" in c.text or "加" in c.text for c in results)
+    assert index.search("完全无关", top_k=3) == []
+
+
+def test_get_note_index_rebuilds_when_the_note_changes(tmp_path):
+    md = tmp_path / "t1_markdown.md"
+    md.write_text("## 第一版\n\n旧内容", encoding="utf-8")
+    (tmp_path / "t1.json").write_text(json.dumps({"transcript": {"segments": [{"start": 1, "text": "转写"}]}}),
+                                      encoding="utf-8")
+    first = get_note_index("t1", str(tmp_path))
+    assert get_note_index("t1", str(tmp_path)) is first
+
+    md.write_text("## 第二版\n\n新内容", encoding="utf-8")
+    stat = os.stat(md)
+    os.utime(md, (stat.st_atime, stat.st_mtime + 10))
+    second = get_note_index("t1", str(tmp_path))
+    assert second is not first
+    assert second.search("新内容", top_k=1)[0].title == "第二版"
+    assert get_note_index("missing", str(tmp_path)) is None
+
+
+def test_truncate_history_keeps_most_recent_messages():
+    history = [{"role": "user", "content": str(i) * 400} for i in range(5)]
+    kept = truncate_history(history, budget=450)
+    assert kept == history[-2:]  # 每条约 200 token
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from app.enmus.task_status_enums import TaskStatus
+from app.models.audio_model import AudioDownloadResult
+from app.models.transcriber_model import TranscriptResult, TranscriptSegment
+from app.services.note import NoteGenerator
+
+
+class FailingGPT:
+    async def asummarize(self, source):
+        raise RuntimeError("boom")
+
+
+def summarize(tmp_path, monkeypatch, report_failure):
+    statuses = []
+    monkeypatch.setattr(NoteGenerator, "_update_status",
+                        staticmethod(lambda task_id, status, message=None: statuses.append(status)))
+    generator = object.__new__(NoteGenerator)
+    audio = AudioDownloadResult(file_path="a.mp3", title="t", duration=1, cover_url=None, platform="local",
+                                video_id="v", raw_info={})
+    transcript = TranscriptResult(language="zh", full_text="x", segments=[TranscriptSegment(0, 1, "x")])
+    with pytest.raises(RuntimeError):
+        asyncio.run(generator._summarize_text(
+            audio_meta=audio, transcript=transcript, gpt=FailingGPT(),
+            markdown_cache_file=tmp_path / "task_markdown_a.md", link=False, screenshot=False,
+            formats=[], style="a", extras=None, video_img_urls=[], report_failure=report_failure,
+        ))
+    return statuses
+
+
+def test_variant_failure_does_not_mark_the_task_failed(tmp_path, monkeypatch):
+    assert TaskStatus.FAILED not in summarize(tmp_path, monkeypatch, report_failure=False)
+
+
+def test_single_style_failure_marks_the_task_failed(tmp_path, monkeypatch):
+    assert summarize(tmp_path, monkeypatch, report_failure=True)[-1] == TaskStatus.FAILED
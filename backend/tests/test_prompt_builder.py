@@ -0,0 +1,25 @@
+from app.gpt.prompt import BASE_PROMPT, SYSTEM_PROMPT
+from app.gpt.prompt_builder import generate_base_prompt, generate_prefix_prompt
+
+
+def test_layouts_share_the_same_rules():
+    for rule in ("语言要求：", "输出说明：", "1. **完整信息**", "请始终遵循此规则。"):
+        assert rule in BASE_PROMPT and rule in SYSTEM_PROMPT
+
+
+def test_prefix_system_prompt_does_not_depend_on_the_video_or_level():
+    a_system, a_user = generate_prefix_prompt("A", "00:00 - a", ["x"], ["toc"], "minimal", summary_level="simple")
+    b_system, b_user = generate_prefix_prompt("B", "00:00 - b", ["y"], ["toc"], "minimal", summary_level="detailed")
+    assert a_system == b_system
+    assert "简要总结" in a_user and "详尽总结" in b_user
+
+
+def test_medium_summary_level_adds_nothing():
+    _, user = generate_prefix_prompt("A", "00:00 - a", [], summary_level="medium")
+    assert "总结程度" not in user
+
+
+def test_legacy_prompt_ignores_summary_level():
+    baseline = generate_base_prompt("A", "00:00 - a", ["x"], ["toc"], "minimal", "额外")
+    for level in ("simple", "medium", "detailed"):
+        assert generate_base_prompt("A", "00:00 - a", ["x"], ["toc"], "minimal", "额外", summary_level=level) == baseline
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.gpt import rate_limiter
+from app.gpt.rate_limiter import ProviderLimiter, TokenBucket
+
+
+def make_status_error(status: int, headers: dict = None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://example.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    cls = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return cls("error", response=response, body=None)
+
+
+def test_token_bucket_allows_capacity_then_asks_to_wait():
+    bucket = TokenBucket(60)  # 每秒补充 1 个
+    assert bucket.reserve(60) == 0.0
+    wait = bucket.reserve(3)
+    assert wait == pytest.approx(3.0, abs=0.1)
+
+
+def test_token_bucket_caps_oversized_requests_at_capacity():
+    bucket = TokenBucket(10)
+    assert bucket.reserve(1000) == 0.0
+    assert bucket.tokens == pytest.approx(0.0, abs=0.01)
+
+
+def test_token_bucket_adjust_returns_overestimate():
+    bucket = TokenBucket(100)
+    bucket.reserve(80)
+    bucket.adjust(-50)  # 实际比预估少 50
+    assert bucket.tokens == pytest.approx(70.0, abs=0.1)
+
+
+def test_retry_delay_prefers_retry_after(monkeypatch):
+    monkeypatch.setenv("LLM_RETRY_MAX_DELAY", "60")
+    assert rate_limiter.retry_delay(0, make_status_error(429, {"retry-after": "7"})) == 7.0
+    assert rate_limiter.retry_delay(0, make_status_error(429, {"retry-after": "600"})) == 60.0
+
+
+def test_retry_delay_backs_off_exponentially_with_jitter(monkeypatch):
+    monkeypatch.setenv("LLM_RETRY_BASE_DELAY", "1")
+    monkeypatch.setenv("LLM_RETRY_MAX_DELAY", "10")
+    exc = make_status_error(500)
+    for attempt, full in [(0, 1), (2, 4), (5, 10)]:
+        delay = rate_limiter.retry_delay(attempt, exc)
+        assert full / 2 <= delay <= full
+
+
+def test_is_retryable():
+    assert rate_limiter.is_retryable(make_status_error(429))
+    assert rate_limiter.is_retryable(make_status_error(503))
+    assert not rate_limiter.is_retryable(ValueError("x"))
+
+
+def test_estimate_tokens_counts_text_and_images():
+    messages = [
+        {"role": "system", "content": "a" * 10},
+        {"role": "user", "content": [{"type": "text", "text": "b" * 20},
+                                     {"type": "image_url", "image_url": {"url": "data:"}}]},
+    ]
+    assert rate_limiter.estimate_tokens(messages) == 15 + 1000
+
+
+def test_sync_slots_are_handed_over_in_order():
+    limiter = ProviderLimiter("p", max_concurrency=1)
+    limiter.acquire(0)
+    order = []
+
+    def worker(name):
+        limiter.acquire(0)
+        order.append(name)
+        limiter.release()
+
+    threads = []
+    for name in ("a", "b"):
+        thread = threading.Thread(target=worker, args=(name,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+    assert order == []
+    limiter.release()
+    for thread in threads:
+        thread.join(timeout=2)
+    assert order == ["a", "b"]
+    assert limiter._in_flight == 0
+
+
+def test_async_waiter_is_woken_without_polling():
+    async def scenario():
+        limiter = ProviderLimiter("p", max_concurrency=1)
+        await limiter.aacquire(0)
+        waiter = asyncio.create_task(limiter.aacquire(0))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        limiter.release()
+        await asyncio.wait_for(waiter, 1)
+        assert limiter._in_flight == 1
+        limiter.release()
+        assert limiter._in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_async_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limiter = ProviderLimiter("p", max_concurrency=1)
+        await limiter.aacquire(0)
+        waiter = asyncio.create_task(limiter.aacquire(0))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        assert limiter._in_flight == 0
+        assert not limiter._waiters
+
+    asyncio.run(scenario())
+
+
+def test_slot_is_released_during_retry_backoff(monkeypatch):
+    from app.gpt.universal_gpt import UniversalGPT
+
+    limiter = ProviderLimiter("p", max_concurrency=1)
+    in_flight_during_sleep = []
+
+    class Completions:
+        calls = 0
+
+        def create(self, **kwargs):
+            Completions.calls += 1
+            if Completions.calls == 1:
+                raise make_status_error(429, {"retry-after": "0"})
+            return type("R", (), {"usage": None})()
+
+    client = type("C", (), {"chat": type("Chat", (), {"completions": Completions()})()})()
+    monkeypatch.setattr("app.gpt.universal_gpt.time.sleep", lambda s: in_flight_during_sleep.append(limiter._in_flight))
+    gpt = UniversalGPT(client, "m", limiter=limiter)
+    gpt._complete([{"role": "user", "content": "hi"}], 0.5)
+    assert in_flight_during_sleep == [0]
+    assert limiter._in_flight == 0
+
+
+def test_get_limiter_rebuilds_when_config_changes():
+    a = rate_limiter.get_limiter("test-provider", rpm=10)
+    assert rate_limiter.get_limiter("test-provider", rpm=10) is a
+    b = rate_limiter.get_limiter("test-provider", rpm=None)
+    assert b is not a and b.rpm is None
@@ -0,0 +1,155 @@
+import asyncio
+
+from app.gpt.rate_limiter import ProviderLimiter
+from app.gpt.universal_gpt import UniversalGPT
+
+
+def obj(**kwargs):
+    return type("Obj", (), kwargs)()
+
+
+def chunk(content=None, usage=None):
+    choices = [obj(delta=obj(content=content))] if content is not None else []
+    return obj(choices=choices, usage=usage)
+
+
+class FakeStream:
+    def __init__(self, chunks, hang_after=None):
+        self.chunks = chunks
+        self.hang_after = hang_after
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index, item in enumerate(self.chunks):
+            if self.hang_after is not None and index >= self.hang_after:
+                await asyncio.Event().wait()
+            yield item
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, stream=None, hang=False):
+        self.stream = stream
+        self.hang = hang
+        self.kwargs = None
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        if self.hang:
+            await asyncio.Event().wait()
+        return self.stream
+
+
+def make_gpt(client, limiter):
+    sync_client = obj(base_url="http://stream")
+    return UniversalGPT(sync_client, "m", async_client_factory=lambda: client, limiter=limiter,
+                        provider_id="stream-test")
+
+
+async def consume(gpt):
+    return [delta async for delta in gpt.astream_chat([{"role": "user", "content": "hi"}], use_cache=False)]
+
+
+def test_stream_records_usage_from_final_chunk():
+    usage = obj(prompt_tokens=12, completion_tokens=3, total_tokens=15)
+    client = FakeClient(FakeStream([chunk("a"), chunk("b"), chunk(usage=usage)]))
+    limiter = ProviderLimiter("stream-test", max_concurrency=1)
+    gpt = make_gpt(client, limiter)
+
+    assert asyncio.run(consume(gpt)) == ["a", "b"]
+    assert client.kwargs["stream_options"] == {"include_usage": True}
+    assert gpt.usage_log[-1]["prompt_tokens"] == 12
+    assert gpt.usage_log[-1]["completion_tokens"] == 3
+    assert gpt.usage_log[-1]["outcome"] == "ok"
+    assert limiter._in_flight == 0
+    assert client.stream.closed
+
+
+def test_cancel_before_first_chunk_releases_slot():
+    async def scenario(client, limiter):
+        task = asyncio.create_task(consume(make_gpt(client, limiter)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # 断开发生在建立连接期间
+    limiter = ProviderLimiter("stream-test", max_concurrency=1)
+    asyncio.run(scenario(FakeClient(hang=True), limiter))
+    assert limiter._in_flight == 0
+
+    # 断开发生在等待首个分片期间
+    limiter = ProviderLimiter("stream-test", max_concurrency=1)
+    stream = FakeStream([chunk("a")], hang_after=0)
+    asyncio.run(scenario(FakeClient(stream), limiter))
+    assert limiter._in_flight == 0
+    assert stream.closed
+
+
+def test_client_disconnect_is_not_a_provider_failure():
+    from app.gpt.llm_router import latency_tracker
+
+    async def scenario():
+        gpt = make_gpt(FakeClient(FakeStream([chunk("a"), chunk("b")])), None)
+        gpt.provider_id = "stream-disconnect"
+        stream = gpt.astream_chat([{"role": "user", "content": "hi"}], use_cache=False)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()  # 客户端关闭对话面板
+        return gpt
+
+    gpt = asyncio.run(scenario())
+    assert gpt.usage_log[-1]["outcome"] == "cancelled"
+    assert latency_tracker.stats("stream-disconnect", "m") is None
+
+
+def test_relay_cancels_upstream_when_client_leaves_before_first_chunk():
+    from app.routers.note import _until_disconnected
+
+    class LeavingRequest:
+        calls = 0
+
+        async def is_disconnected(self):
+            LeavingRequest.calls += 1
+            return LeavingRequest.calls > 1
+
+    async def scenario(limiter):
+        stream = FakeStream([chunk("a")], hang_after=0)
+        gpt = make_gpt(FakeClient(stream), limiter)
+        relay = _until_disconnected(gpt.astream_chat([{"role": "user", "content": "hi"}], use_cache=False),
+                                    LeavingRequest())
+        return [delta async for delta in relay], stream
+
+    limiter = ProviderLimiter("stream-test", max_concurrency=1)
+    deltas, stream = asyncio.run(asyncio.wait_for(scenario(limiter), 5))
+    assert deltas == []
+    assert limiter._in_flight == 0
+    assert stream.closed
+
+
+def test_stream_route_reports_setup_errors_as_sse(monkeypatch):
+    from fastapi import FastAPI, HTTPException
+    from fastapi.testclient import TestClient
+
+    from app.routers import note as note_router
+
+    def missing_note(data):
+        raise HTTPException(status_code=404, detail="未找到对应笔记内容")
+
+    monkeypatch.setattr(note_router, "_build_chat_messages", missing_note)
+    app = FastAPI()
+    app.include_router(note_router.router, prefix="/api")
+    response = TestClient(app).post("/api/chat_with_note/stream", json={
+        "task_id": "t", "message": "hi", "model_name": "m", "provider_id": "p",
+    })
+    assert response.status_code == 200
+    assert response.text.startswith("event: error")
+    assert "未找到对应笔记内容" in response.text
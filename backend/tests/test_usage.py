@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.gpt.usage import build_usage_record, summarize_usage
+from app.gpt.universal_gpt import UniversalGPT
+
+
+def obj(**kwargs):
+    return type("Obj", (), kwargs)()
+
+
+def server_error() -> openai.InternalServerError:
+    request = httpx.Request("POST", "https://example.com/v1/chat/completions")
+    response = httpx.Response(503, headers={"retry-after": "0"}, request=request)
+    return openai.InternalServerError("busy", response=response, body=None)
+
+
+class FakeAsyncClient:
+    def __init__(self, errors, hang=False):
+        self.errors = list(errors)
+        self.hang = hang
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        if self.hang:
+            await asyncio.Event().wait()
+        usage = obj(prompt_tokens=10, completion_tokens=2, total_tokens=12)
+        return obj(usage=usage, choices=[obj(message=obj(content="ok"))])
+
+
+def make_gpt(client):
+    return UniversalGPT(obj(base_url="http://usage"), "m", async_client_factory=lambda: client,
+                        provider_id="usage-test")
+
+
+def test_every_attempt_is_recorded_with_its_outcome(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_RETRIES", "2")
+    gpt = make_gpt(FakeAsyncClient([server_error()]))
+    assert asyncio.run(gpt.achat([{"role": "user", "content": "hi"}], use_cache=False)) == "ok"
+
+    assert [(r["attempt"], r["outcome"]) for r in gpt.usage_log] == [(0, "InternalServerError"), (1, "ok")]
+    assert gpt.usage_log[1]["prompt_tokens"] == 10
+    assert gpt.usage_log[0]["payload_bytes"] == gpt.usage_log[1]["payload_bytes"] > 0
+
+
+def test_final_failure_is_recorded(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+    gpt = make_gpt(FakeAsyncClient([server_error()]))
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(gpt.achat([{"role": "user", "content": "hi"}], use_cache=False))
+    assert [r["outcome"] for r in gpt.usage_log] == ["InternalServerError"]
+
+
+def test_cancelled_request_is_recorded():
+    gpt = make_gpt(FakeAsyncClient([], hang=True))
+
+    async def scenario():
+        task = asyncio.create_task(gpt.achat([{"role": "user", "content": "hi"}], use_cache=False))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert [r["outcome"] for r in gpt.usage_log] == ["cancelled"]
+
+
+def test_summarize_usage_counts_failed_calls():
+    records = [
+        build_usage_record("p", "m", [], None, 0.5, outcome="RateLimitError"),
+        build_usage_record("p", "m", [], obj(prompt_tokens=5, completion_tokens=1, total_tokens=6), 1.0,
+                           attempt=1),
+    ]
+    totals = summarize_usage(records)["totals"]
+    assert totals["calls"] == 2
+    assert totals["failed_calls"] == 1
+    assert totals["prompt_tokens"] == 5
+    assert totals["wall_time"] == 1.5